@@ -0,0 +1,189 @@
+"""
+Asynchronous activity log for THEO Clothing Inventory
+
+Routes hand activity entries to ActivityLogger.log(), which only appends them
+to an in-process queue. A background thread writes queued entries to the
+activities collection in WriteBatch commits, once BATCH_SIZE entries are
+waiting or FLUSH_INTERVAL seconds have passed. Entries that cannot be written
+(Firestore unreachable, or the queue is full) are appended to a local spill
+file and replayed after the next successful flush. Whatever is queued at
+interpreter exit is flushed by an atexit hook.
+"""
+
+import atexit
+import os
+import queue
+import threading
+import time
+
+from local_firestore import decode_document, encode_document
+
+BATCH_SIZE = 100
+FLUSH_INTERVAL = 2.0  # seconds
+MAX_QUEUE_SIZE = 10000
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class ActivityLogger:
+    """Queue activity entries and write them to Firestore in batches"""
+
+    def __init__(self, db, spill_path, collection='activities', batch_size=BATCH_SIZE,
+                 flush_interval=FLUSH_INTERVAL, max_queue_size=MAX_QUEUE_SIZE, on_flush=None):
+        self.db = db
+        self.spill_path = spill_path
+        self.collection = collection
+        self.batch_size = min(batch_size, 500)
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._spill_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def _replay_path(self, pid=None):
+        # Per process, so workers sharing the spill file never replay the same entries
+        return f"{self.spill_path}.{pid or os.getpid()}.replay"
+
+    def _recover_replays(self):
+        """Return entries from replays cut short by a process that has since exited"""
+        folder = os.path.dirname(os.path.abspath(self.spill_path))
+        prefix = os.path.basename(self.spill_path) + '.'
+        for filename in os.listdir(folder):
+            pid = filename[len(prefix):-len('.replay')]
+            if not (filename.startswith(prefix) and filename.endswith('.replay') and pid.isdigit()):
+                continue
+            if int(pid) != os.getpid() and _process_alive(int(pid)):
+                continue
+            path = os.path.join(folder, filename)
+            with open(path, encoding='utf-8') as replay:
+                self._spill([decode_document(line) for line in replay if line.strip()])
+            os.remove(path)
+
+    def start(self):
+        self._recover_replays()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='activity-log', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def log(self, activity_data):
+        """Queue one entry; never blocks the request"""
+        try:
+            self._queue.put_nowait(activity_data)
+        except queue.Full:
+            # Bounded buffer: once full, entries go straight to the spill file
+            self._spill([activity_data])
+
+    def _drain(self):
+        entries = []
+        while len(entries) < self.batch_size:
+            try:
+                entries.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return entries
+
+    def _write(self, entries):
+        collection = self.db.collection(self.collection)
+        batch = self.db.batch()
+        for entry in entries:
+            batch.set(collection.document(), entry)
+        batch.commit()
+
+    def _flush_entries(self, entries):
+        """Write entries; on failure keep them in the spill file. Returns success"""
+        if not entries:
+            return True
+        try:
+            self._write(entries)
+        except Exception as e:
+            print(f"Activity log write failed, spilling {len(entries)} entries: {e}")
+            self._spill(entries)
+            return False
+        if self.on_flush:
+            try:
+                self.on_flush()
+            except Exception as e:
+                print(f"Activity log flush callback failed: {e}")
+        return True
+
+    def flush(self):
+        """Write everything queued now, then replay the spill file"""
+        with self._flush_lock:
+            written = True
+            while written:
+                entries = self._drain()
+                if not entries:
+                    break
+                written = self._flush_entries(entries)
+            if written:
+                self._replay_spill()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                # Idle: a good moment to retry spilled entries
+                with self._flush_lock:
+                    self._replay_spill()
+                continue
+            # Give a burst of writes up to flush_interval to fill the batch
+            deadline = time.monotonic() + self.flush_interval
+            entries = [first]
+            while len(entries) < self.batch_size and not self._stopping.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    entries.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            with self._flush_lock:
+                if self._flush_entries(entries):
+                    self._replay_spill()
+
+    def _spill(self, entries):
+        with self._spill_lock:
+            with open(self.spill_path, 'a', encoding='utf-8') as spill:
+                for entry in entries:
+                    spill.write(encode_document(entry) + '\n')
+
+    def _replay_spill(self):
+        """Write spilled entries back to Firestore; keeps the file if that fails"""
+        with self._spill_lock:
+            if not os.path.exists(self.spill_path):
+                return
+            replay_path = self._replay_path()
+            os.replace(self.spill_path, replay_path)
+        with open(replay_path, encoding='utf-8') as replay:
+            entries = [decode_document(line) for line in replay if line.strip()]
+        try:
+            for start in range(0, len(entries), self.batch_size):
+                self._write(entries[start:start + self.batch_size])
+        except Exception as e:
+            print(f"Activity log replay failed, keeping spill file: {e}")
+            self._spill(entries[start:])
+        else:
+            if entries:
+                print(f"Replayed {len(entries)} spilled activity entries")
+                if self.on_flush:
+                    self.on_flush()
+        os.remove(replay_path)
+
+    def close(self):
+        """Stop the background thread and flush what is left"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
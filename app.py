@@ -1,14 +1,35 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, send_file
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, send_file, g
+from flask import has_request_context
 from flask_cors import CORS
-import firebase_admin
-from firebase_admin import credentials, firestore, storage
 import os
 import re
 import unicodedata
 from functools import wraps
 import time
 import logging
+from collections import OrderedDict
 from config import config
+import local_firestore
+import cache_backend
+import snapshot_cache
+from activity_log import ActivityLogger
+from barcode_index import BarcodeIndex
+from batch_writer import BatchWriter
+from bulk_delete import BulkDeleter
+from customer_index import CustomerIndex
+from customer_summary import CustomerSummaries, sale_key
+from dashboard_stats import DashboardStats, usage_key
+from job_queue import JobQueue
+from local_storage import LocalBucket
+from excel_streaming import fit_column_widths, send_xlsx, write_xlsx, xlsx_file
+from returns_index import ReturnsIndex
+from passwords import PasswordHasher
+from qr_codes import QRPipeline, new_barcode, render_qr_png, upload_qr_png
+from sales_grouping import SalesGrouper, group_sales
+import metrics
+import startup
+from firestore_tracing import RequestTrace, TracedClient
+from user_principals import PrincipalCache
 
 def secure_filename(filename):
     """Secure a filename for storage."""
@@ -19,16 +40,14 @@ def secure_filename(filename):
     filename = re.sub(r'[^\w\s-]', '', filename)
     filename = re.sub(r'[-\s]+', '-', filename)
     return filename.strip('-')
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
 import uuid
-import qrcode
-from PIL import Image
+import hashlib
+import hmac
 import io
 import base64
-import openpyxl
-from openpyxl import Workbook
-import io
+import threading
 from functools import wraps
 
 app = Flask(__name__)
@@ -55,42 +74,111 @@ def check_firebase():
         return False
     return True
 
-# Performance monitoring decorator
-def performance_monitor(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        start_time = time.time()
-        result = f(*args, **kwargs)
-        end_time = time.time()
-        print(f"Function {f.__name__} took {end_time - start_time:.4f} seconds")
-        return result
-    return decorated_function
+# Request metrics: latency per route and requests in flight (see metrics.py)
+def request_route():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+@app.before_request
+def start_request_metrics():
+    if not app.config.get('METRICS_ENABLED'):
+        return
+    g.metrics_start = time.perf_counter()
+    metrics.REQUESTS_IN_FLIGHT.labels(request_route()).inc()
+
+@app.after_request
+def note_response_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return
+    route = request_route()
+    metrics.REQUESTS_IN_FLIGHT.labels(route).dec()
+    # Requests that raised never reach after_request
+    status = g.pop('metrics_status', 500)
+    metrics.REQUEST_LATENCY.labels(route, request.method, status).observe(time.perf_counter() - start)
+
+# Per-request Firestore usage (see firestore_tracing.RequestTrace); calls made
+# from background threads and thread pools are not attributed to a request
+@app.before_request
+def start_firestore_trace():
+    if app.config.get('FIRESTORE_TRACING'):
+        g.firestore_trace = RequestTrace()
+
+def record_request_firestore(operation, collection, documents, seconds):
+    if has_request_context():
+        trace = g.get('firestore_trace')
+        if trace is not None:
+            trace.record(operation, collection, documents, seconds)
+
+@app.after_request
+def report_firestore_trace(response):
+    trace = g.pop('firestore_trace', None)
+    if trace is None:
+        return response
+    response.headers['X-Firestore-Usage'] = trace.summary()
+    budget = app.config.get('FIRESTORE_READ_BUDGET')
+    if budget and trace.reads > budget:
+        print(f"WARNING: {request.method} {request.path} read {trace.reads} Firestore documents "
+              f"(budget {budget}) in {trace.calls} calls: {trace.breakdown()}")
+    return response
+
+def record_cache_lookup(cache_key, result):
+    if app.config.get('METRICS_ENABLED'):
+        metrics.CACHE_REQUESTS.labels(cache_key, result).inc()
 
 # Enhanced cache for frequently accessed data
-cache = {
-    'products': {'data': None, 'timestamp': 0},
-    'categories': {'data': None, 'timestamp': 0},
-    'sizes': {'data': None, 'timestamp': 0},
-    'colors': {'data': None, 'timestamp': 0},
-    'customers': {'data': None, 'timestamp': 0},
-    'sales_orders': {'data': None, 'timestamp': 0},
-    'production_orders': {'data': None, 'timestamp': 0},
-    'users': {'data': None, 'timestamp': 0},
-    'dashboard_stats': {'data': None, 'timestamp': 0},
-    'recent_activities': {'data': None, 'timestamp': 0}
-}
+# Each worker keeps local copies; the shared backend carries a version per key so an
+# invalidation in one worker reaches all of them (see cache_backend.py)
+cache = cache_backend.VersionedCache(
+    cache_backend.create_backend(
+        app.config.get('CACHE_BACKEND', 'local'),
+        sqlite_path=app.config.get('CACHE_SQLITE_PATH'),
+        redis_url=app.config.get('CACHE_REDIS_URL')
+    ),
+    [
+        'products',
+        'categories',
+        'sizes',
+        'colors',
+        'customers',
+        'sales_orders',
+        'production_orders',
+        'users',
+        'dashboard_stats',
+        'recent_activities',
+        'product_pages',
+        'product_count'
+    ],
+    # Page cursors are mutated in place by get_products_page, so stay per worker
+    local_only=['product_pages'],
+    max_staleness=app.config.get('CACHE_MAX_STALENESS', 0),
+    observer=record_cache_lookup
+)
 
 CACHE_DURATION = 300  # 5 minutes for better performance
 QUICK_CACHE_DURATION = 60  # 1 minute for frequently changing data
 
+# Reference collections mirrored by on_snapshot listeners when CACHE_LISTENERS is on
+LISTENER_COLLECTIONS = ['categories', 'sizes', 'colors', 'products']
+listener_cache = snapshot_cache.SnapshotCache()
+
 # Helper function to get cached data
 def get_cached_data(cache_key, fetch_function, duration=CACHE_DURATION):
-    current_time = time.time()
-    if (cache[cache_key]['data'] is None or 
-        current_time - cache[cache_key]['timestamp'] > duration):
-        cache[cache_key]['data'] = fetch_function()
-        cache[cache_key]['timestamp'] = current_time
-    return cache[cache_key]['data']
+    # Listener mirrors are kept current by Firestore, so they skip the TTL cache
+    mirrored = listener_cache.get(cache_key)
+    if mirrored is not None:
+        record_cache_lookup(cache_key, 'listener')
+        return mirrored
+    return cache.get(cache_key, fetch_function, duration)
+
+# Invalidate cache entries in every worker
+def invalidate_cache(*cache_keys):
+    for cache_key in cache_keys:
+        cache.invalidate(cache_key)
 
 # Optimized database query helper
 def get_products_optimized(limit=None, order_by=None):
@@ -106,15 +194,110 @@ def get_products_optimized(limit=None, order_by=None):
     products = products_ref.get()
     return [{'id': product.id, **product.to_dict()} for product in products]
 
+def get_cached_products():
+    """Every product (with its id) from the products cache"""
+    def fetch_products():
+        return [{'id': product.id, **product.to_dict()} for product in db.collection('products').get()]
+    
+    return get_cached_data('products', fetch_products)
+
+# Date filters for the exports
+def parse_date_range(args):
+    """Read ?date=YYYY-MM-DD or ?from=/?to= (inclusive days) into (start, end, label)
+
+    start/end bound a half-open [start, end) range and are None when open-ended;
+    label is used in export filenames ('' when unfiltered).
+    """
+    def parse_day(name):
+        value = (args.get(name) or '').strip()
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, '%Y-%m-%d')
+        except ValueError:
+            raise ValueError(f"Invalid {name} date '{value}', expected YYYY-MM-DD")
+    
+    day = parse_day('date')
+    if day:
+        return day, day + timedelta(days=1), day.strftime('%Y-%m-%d')
+    
+    start, last = parse_day('from'), parse_day('to')
+    end = last + timedelta(days=1) if last else None
+    if start and end and start >= end:
+        raise ValueError('The from date must not be after the to date')
+    if not start and not end:
+        return None, None, ''
+    label = f"{start.strftime('%Y-%m-%d') if start else 'start'}_to_{last.strftime('%Y-%m-%d') if last else 'now'}"
+    return start, end, label
+
+def created_between(collection_name, start, end):
+    """Query for a collection's documents created in [start, end), filtered by Firestore"""
+    query = db.collection(collection_name)
+    if start:
+        query = query.where('created_at', '>=', start)
+    if end:
+        query = query.where('created_at', '<', end)
+    return query
+
+PRODUCTS_PER_PAGE = 20
+PRODUCT_PAGE_CACHE_SIZE = 50  # pages (and their cursors) kept per worker
+
+RETURNS_PAGE_SIZE = 20  # customers per page of the returns report
+MAX_BARCODE_BATCH = 500  # barcodes per /lookup_products_by_barcode request
+IMPORT_CHUNK_SIZE = 500  # rows per WriteBatch commit (Firestore maximum)
+IMPORT_WORKERS = 4  # chunks committed concurrently by excel_import
+
+def get_product_count():
+    """Total number of products from a count aggregation query"""
+    def fetch_count():
+        result = db.collection('products').count(alias='total').get()
+        return result[0][0].value
+    
+    return get_cached_data('product_count', fetch_count)
+
+def get_products_page(page, per_page=PRODUCTS_PER_PAGE):
+    """Fetch one page of products using Firestore cursors
+    
+    Pages are read in document ID order with start_after/limit. Each fetched
+    page is cached together with its last document ID, so page N+1 starts
+    from page N's cursor instead of re-reading pages 1..N.
+    """
+    pages = get_cached_data('product_pages', OrderedDict)
+    if page in pages:
+        pages.move_to_end(page)
+        return pages[page]['products']
+    
+    query = db.collection('products').order_by('__name__')
+    
+    # Continue from the closest earlier page we have a cursor for
+    known_pages = [known for known in pages if known < page]
+    start_page = max(known_pages) if known_pages else 0
+    if start_page:
+        query = query.start_after({'__name__': pages[start_page]['cursor']})
+    skipped = (page - 1 - start_page) * per_page
+    if skipped:
+        query = query.offset(skipped)
+    
+    docs = query.limit(per_page).get()
+    product_list = [{'id': doc.id, **doc.to_dict()} for doc in docs]
+    
+    if product_list:
+        pages[page] = {'products': product_list, 'cursor': product_list[-1]['id']}
+        while len(pages) > PRODUCT_PAGE_CACHE_SIZE:
+            pages.popitem(last=False)
+    
+    return product_list
+
 # Optimized statistics calculation
 def calculate_dashboard_stats():
-    """Calculate dashboard statistics efficiently"""
+    """Dashboard statistics from the summary document (one read)"""
     def fetch_stats():
-        products = get_products_optimized()
-        return {
-            'total_products': len(products),
-            'total_value': sum(p.get('price', 0) for p in products)
-        }
+        stats = dashboard_summary.read()
+        if stats is None:
+            # Summary not built yet: rebuild it from products and sales
+            dashboard_summary.rebuild()
+            stats = dashboard_summary.read()
+        return stats
     
     return get_cached_data('dashboard_stats', fetch_stats, QUICK_CACHE_DURATION)
 
@@ -152,57 +335,93 @@ def parse_item_numbers(item_numbers):
     
     return total_items
 
-# Firebase configuration
-# Prefer service account JSON from environment on Render; fallback to local file or ADC
-service_account_json = os.environ.get('FIREBASE_SERVICE_ACCOUNT_JSON')
-
-firebase_credentials = None
-if service_account_json:
-    try:
-        # Decode base64 if it's base64 encoded
-        if service_account_json.startswith('ewog'):  # Base64 encoded JSON starts with 'ewog'
-            import base64
-            decoded_json = base64.b64decode(service_account_json).decode('utf-8')
-            service_account_info = json.loads(decoded_json)
-        else:
-            # Try parsing as direct JSON
-            service_account_info = json.loads(service_account_json)
-        firebase_credentials = credentials.Certificate(service_account_info)
-        print("Firebase credentials loaded from environment variable")
-    except Exception as e:
-        print(f"Error loading Firebase credentials from environment: {e}")
-        firebase_credentials = None
-
-if firebase_credentials is None:
+# Firebase, the data backend and the services built on it are set up by create_app()
+db = None
+bucket = None
+activity_logger = None
+dashboard_summary = None
+customer_index = None
+barcode_index = None
+user_principals = None
+customer_summaries = None
+returns_index = None
+metrics_store = None
+_initialized = False
+_init_lock = threading.Lock()
+
+def load_firebase_credentials():
+    """Service account credentials from the environment or a local file, or None"""
+    # firebase_admin is slow to import, so it is only loaded when Firestore is used
+    from firebase_admin import credentials
+    
+    # Prefer service account JSON from environment on Render; fallback to local file or ADC
+    service_account_json = os.environ.get('FIREBASE_SERVICE_ACCOUNT_JSON')
+    if service_account_json:
+        try:
+            # Decode base64 if it's base64 encoded
+            if service_account_json.startswith('ewog'):  # Base64 encoded JSON starts with 'ewog'
+                decoded_json = base64.b64decode(service_account_json).decode('utf-8')
+                service_account_info = json.loads(decoded_json)
+            else:
+                # Try parsing as direct JSON
+                service_account_info = json.loads(service_account_json)
+            print("Firebase credentials loaded from environment variable")
+            return credentials.Certificate(service_account_info)
+        except Exception as e:
+            print(f"Error loading Firebase credentials from environment: {e}")
+    
     service_account_file = os.environ.get('FIREBASE_CREDENTIALS_FILE', 'firebase-service-account.json')
     if os.path.exists(service_account_file):
         try:
             firebase_credentials = credentials.Certificate(service_account_file)
             print("Firebase credentials loaded from file")
+            return firebase_credentials
         except Exception as e:
             print(f"Error loading Firebase credentials from file: {e}")
-            firebase_credentials = None
     else:
         print("No Firebase credentials found")
-        firebase_credentials = None
-
-firebase_options = {}
-env_storage_bucket = os.environ.get('FIREBASE_STORAGE_BUCKET')
-config_storage_bucket = app.config.get('FIREBASE_STORAGE_BUCKET')
-resolved_storage_bucket = env_storage_bucket or config_storage_bucket
-
-# Set default bucket name if none specified
-if not resolved_storage_bucket:
-    resolved_storage_bucket = 'inventory-3098f.firebasestorage.app'  # Correct bucket name
-
-if resolved_storage_bucket:
-    firebase_options['storageBucket'] = resolved_storage_bucket
-
-# Initialize Firebase only if credentials are available
-if firebase_credentials:
+    return None
+
+def trace_firestore(client):
+    """Wrap the Firestore client so its calls reach the metrics and the request trace"""
+    observers = []
+    if app.config.get('METRICS_ENABLED'):
+        observers.append(metrics.observe_firestore)
+    if app.config.get('FIRESTORE_TRACING'):
+        observers.append(record_request_firestore)
+    if not observers:
+        return client
+    return TracedClient(client, observers)
+
+def init_firebase():
+    """Connect the configured data backend once; sets and returns the module's db"""
+    global db, bucket
+    if db is not None:
+        return db
+    
+    # Initialize the data backend: a local stand-in when requested, otherwise Firebase
+    data_backend = app.config.get('DATA_BACKEND', 'firestore')
+    if data_backend in ('memory', 'sqlite'):
+        db = trace_firestore(local_firestore.create_client(data_backend, app.config.get('LOCAL_DB_PATH')))
+        # Uploads go to a folder served from /static instead of Firebase Storage
+        bucket = LocalBucket(os.path.join(app.static_folder, 'local_bucket'), '/static/local_bucket')
+        print(f"Using local {data_backend} data backend instead of Firestore")
+        return db
+    
+    firebase_credentials = load_firebase_credentials()
+    if firebase_credentials is None:
+        print("Firebase credentials not available - running without Firebase")
+        return None
+    
+    # Use the storage bucket from the environment or config, or the project default
+    resolved_storage_bucket = (os.environ.get('FIREBASE_STORAGE_BUCKET')
+                               or app.config.get('FIREBASE_STORAGE_BUCKET')
+                               or 'inventory-3098f.firebasestorage.app')
     try:
-        firebase_admin.initialize_app(firebase_credentials, firebase_options or None)
-        db = firestore.client()
+        import firebase_admin
+        from firebase_admin import firestore, storage
+        firebase_admin.initialize_app(firebase_credentials, {'storageBucket': resolved_storage_bucket})
+        db = trace_firestore(firestore.client())
         # Use the resolved bucket name explicitly
         bucket = storage.bucket(resolved_storage_bucket)
         print(f"Firebase initialized successfully with bucket: {resolved_storage_bucket}")
@@ -210,10 +429,148 @@ if firebase_credentials:
         print(f"Error initializing Firebase: {e}")
         db = None
         bucket = None
-else:
-    print("Firebase credentials not available - running without Firebase")
-    db = None
-    bucket = None
+    return db
+
+def log_activity(activity_data):
+    """Queue an activity entry for the background writer"""
+    if activity_logger:
+        activity_logger.log(activity_data)
+
+def run_startup_checks():
+    """One-off checks for a deployment: default admin and the summary documents"""
+    create_default_admin()
+    # Dashboard figures are kept up to date in a summary document as products and sales change
+    try:
+        dashboard_summary.ensure()
+    except Exception as e:
+        print(f"Could not build the dashboard summary: {e}")
+    # Customer history is read from one summary document per customer
+    try:
+        customer_summaries.ensure()
+    except Exception as e:
+        print(f"Could not backfill customer summaries: {e}")
+    # Returned sales are indexed per customer for the returns report
+    try:
+        returns_index.ensure()
+    except Exception as e:
+        print(f"Could not build the returns index: {e}")
+
+def create_app():
+    """Initialize Firebase and the app's services; returns the Flask app
+
+    gunicorn calls this through 'app:create_app()'. When the module is served
+    as 'app:app' instead, the first request calls it. Later calls return the
+    app unchanged.
+    """
+    global activity_logger, dashboard_summary, customer_index, barcode_index, user_principals
+    global customer_summaries, returns_index, metrics_store, _initialized
+    with _init_lock:
+        if _initialized:
+            return app
+        init_firebase()
+        
+        # Every worker flushes its metrics to one SQLite file, which /metrics reads
+        if app.config.get('METRICS_ENABLED'):
+            try:
+                metrics_store = metrics.MetricsStore(
+                    app.config.get('METRICS_DB_PATH', 'metrics.db'),
+                    flush_interval=app.config.get('METRICS_FLUSH_INTERVAL', 5.0)
+                )
+                metrics_store.start()
+            except Exception as e:
+                print(f"Metrics store unavailable: {e}")
+        
+        # Customer autocomplete is answered from an in-memory index built from sales history
+        customer_index = CustomerIndex(db)
+        
+        # Scanner lookups are answered from a barcode map over the cached products
+        barcode_index = BarcodeIndex(db)
+        
+        # Roles and permissions for the auth decorators, cached per worker and
+        # invalidated through the shared cache backend when users change
+        user_principals = PrincipalCache(db, cache.backend)
+        
+        if db:
+            # Activity entries are written in batches by a background thread, off the request path
+            activity_logger = ActivityLogger(
+                db,
+                app.config.get('ACTIVITY_SPILL_PATH', 'activity_spill.jsonl'),
+                flush_interval=app.config.get('ACTIVITY_FLUSH_INTERVAL', 2.0),
+                on_flush=lambda: invalidate_cache('recent_activities')
+            )
+            activity_logger.start()
+            
+            dashboard_summary = DashboardStats(db)
+            customer_summaries = CustomerSummaries(db)
+            returns_index = ReturnsIndex(db)
+            
+            # The in-memory backend starts empty in every process, so it always runs the checks
+            if app.config.get('DATA_BACKEND') == 'memory':
+                run_startup_checks()
+            else:
+                with startup.once_per_deployment('startup_checks') as first:
+                    if first:
+                        run_startup_checks()
+            
+            # Start the listener cache; collections without a listener keep using the TTL cache
+            if app.config.get('CACHE_LISTENERS'):
+                try:
+                    listener_cache.start(db, LISTENER_COLLECTIONS)
+                except Exception as e:
+                    print(f"Listener cache unavailable, using TTL cache: {e}")
+        
+        job_queue.start()
+        _initialized = True
+    return app
+
+@app.before_request
+def ensure_initialized():
+    if not _initialized:
+        create_app()
+
+def commit_sale_change(sale_ref, after=None, updates=None):
+    """Write a sale change with its dashboard, customer and returns updates in one transaction
+
+    The stored sale is read inside the transaction, so a double submit or a
+    concurrent change is applied to the sale as it is when committed.
+    after: the new sale when creating it; updates: fields to update(), or a
+    function taking the stored sale and returning them (None when the sale
+    already has them); with neither, the sale is deleted.
+
+    Returns the stored sale as read before the change ({} when created), or
+    None when nothing was written: the sale does not exist (or already exists
+    when creating) or updates() returned None.
+    """
+    from firebase_admin import firestore
+    
+    @firestore.transactional
+    def apply(transaction):
+        # Firestore transactions do all their reads before the first write
+        snapshot = sale_ref.get(transaction=transaction)
+        creating = after is not None and updates is None
+        if snapshot.exists == creating:
+            return None
+        before = snapshot.to_dict() if snapshot.exists else None
+        changes = updates(before) if callable(updates) else updates
+        if callable(updates) and changes is None:
+            return None
+        new_data = {**before, **changes} if changes is not None else after
+        if new_data is not None and new_data.get('customer_key') != sale_key(new_data):
+            # A customer's sales are queried by this normalized key
+            new_data = {**new_data, 'customer_key': sale_key(new_data)}
+            if changes is not None:
+                changes = {**changes, 'customer_key': new_data['customer_key']}
+        writes = customer_summaries.prepare(transaction, sale_ref.id, before, new_data)
+        writes += returns_index.prepare(transaction, sale_ref.id, before, new_data)
+        dashboard_summary.stage_write(transaction, sale_ref, before, new_data, changes)
+        for reference, data, merge in writes:
+            if data is None:
+                transaction.delete(reference)
+            else:
+                transaction.set(reference, data, merge=merge)
+        return before or {}
+    
+    return apply(db.transaction())
 
 # Configuration
 UPLOAD_FOLDER = 'static/uploads'
@@ -223,17 +580,30 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 # Create upload folder if it doesn't exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Background jobs for long imports, exports and QR generation (handlers registered below)
+job_queue = JobQueue(
+    app.config.get('JOBS_DB_PATH', 'jobs.db'),
+    app.config.get('JOBS_FOLDER', 'job_files'),
+    max_workers=app.config.get('JOB_WORKERS', 2)
+)
+
+# Passwords are stored as salted hashes and verified off the request thread
+password_hasher = PasswordHasher(
+    app.config.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000'),
+    max_workers=app.config.get('PASSWORD_HASH_WORKERS', 2)
+)
+
 # Create default admin user if no users exist
 def create_default_admin():
     try:
-        users_ref = db.collection('users')
-        existing_users = users_ref.get()
+        # One document is enough to know whether any user exists
+        existing_users = db.collection('users').limit(1).get()
         
         if not existing_users:
             # Create default admin user
             admin_data = {
                 'username': 'admin',
-                'password': 'admin123',
+                'password_hash': password_hasher.hash('admin123'),
                 'role': 'admin',
                 'permissions': ['view_products', 'add_products', 'edit_products', 'delete_products', 'excel_import', 'view_reports', 'sales_customer'],
                 'created_at': datetime.now(),
@@ -246,17 +616,31 @@ def create_default_admin():
     except Exception as e:
         print(f"Error creating default admin: {e}")
 
-# Create default admin on startup
-create_default_admin()
-
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def current_principal():
+    """The logged-in user's cached principal; keeps the session's role and permissions current
+
+    Returns None (and clears the session) when the user was deleted or deactivated.
+    """
+    principal = user_principals.get(session['user_id'])
+    if principal is None or not principal['active']:
+        session.clear()
+        return None
+    if session.get('role') != principal['role'] or session.get('permissions') != principal['permissions']:
+        session['role'] = principal['role']
+        session['permissions'] = principal['permissions']
+    return principal
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session:
             return redirect(url_for('login'))
+        if current_principal() is None:
+            flash('Your account is no longer active', 'error')
+            return redirect(url_for('login'))
         return f(*args, **kwargs)
     return decorated_function
 
@@ -265,8 +649,11 @@ def admin_required(f):
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session:
             return redirect(url_for('login'))
-        user_doc = db.collection('users').document(session['user_id']).get()
-        if not user_doc.exists or user_doc.to_dict().get('role') != 'admin':
+        principal = current_principal()
+        if principal is None:
+            flash('Your account is no longer active', 'error')
+            return redirect(url_for('login'))
+        if principal['role'] != 'admin':
             flash('Admin access required', 'error')
             return redirect(url_for('dashboard'))
         return f(*args, **kwargs)
@@ -279,8 +666,11 @@ def permission_required(permission):
             if 'user_id' not in session:
                 return redirect(url_for('login'))
             
-            user_permissions = session.get('permissions', [])
-            if permission not in user_permissions:
+            principal = current_principal()
+            if principal is None:
+                flash('Your account is no longer active', 'error')
+                return redirect(url_for('login'))
+            if permission not in principal['permissions']:
                 flash(f'Permission denied: {permission} required', 'error')
                 return redirect(url_for('dashboard'))
             
@@ -312,19 +702,37 @@ def health_check():
             'timestamp': datetime.now().isoformat()
         }), 503
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Metrics of every worker in the Prometheus text format"""
+    if metrics_store is None:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    token = app.config.get('METRICS_TOKEN')
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return app.response_class(metrics_store.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
         
-        # Check user credentials
-        users_ref = db.collection('users')
-        query = users_ref.where('username', '==', username).where('password', '==', password)
-        users = query.get()
-        
-        if users:
-            user = users[0]
+        # Look the user up by username and check the password in-process
+        users = db.collection('users').where('username', '==', username).get()
+        user = None
+        for candidate in users:
+            valid, updates = password_hasher.verify(candidate.to_dict(), password)
+            if valid:
+                user = candidate
+                if updates:
+                    # Replace a plaintext password or outdated hash
+                    candidate.reference.update(updates)
+                break
+        if not users:
+            password_hasher.verify(None, password)
+        
+        if user:
             user_data = user.to_dict()
             session['user_id'] = user.id
             session['username'] = user_data['username']
@@ -345,10 +753,10 @@ def logout():
 
 @app.route('/dashboard')
 @login_required
-@performance_monitor
 def dashboard():
     # Get recent activities (cached for 1 minute for better performance)
     def fetch_activities():
+        from firebase_admin import firestore
         activities_ref = db.collection('activities').order_by('timestamp', direction=firestore.Query.DESCENDING).limit(10)
         return [doc.to_dict() for doc in activities_ref.get()]
     
@@ -361,18 +769,18 @@ def dashboard():
     return render_template('dashboard.html', 
                          total_products=stats['total_products'],
                          total_value=stats['total_value'],
+                         today_sales_count=stats['today_sales_count'],
+                         today_sales_total=stats['today_sales_total'],
+                         pending_deliveries=stats['pending_deliveries'],
+                         return_rate=stats['return_rate'],
                          recent_activities=recent_activities)
 
 @app.route('/products')
 @login_required
-@performance_monitor
 def products():
     # Get pagination parameters
-    page = int(request.args.get('page', 1))
-    per_page = 20  # Show 20 products per page
-    
-    def fetch_products():
-        return get_products_optimized()
+    page = max(int(request.args.get('page', 1)), 1)
+    per_page = PRODUCTS_PER_PAGE
     
     # Get categories for filter dropdown
     def fetch_categories():
@@ -387,14 +795,11 @@ def products():
         
         return category_list
     
-    all_products = get_cached_data('products', fetch_products)
     categories = get_cached_data('categories', fetch_categories)
     
-    # Calculate pagination
-    total_products = len(all_products)
-    start_idx = (page - 1) * per_page
-    end_idx = start_idx + per_page
-    product_list = all_products[start_idx:end_idx]
+    # Only the requested page is read from Firestore; the total comes from a count query
+    total_products = get_product_count()
+    product_list = get_products_page(page, per_page)
     
     # Calculate pagination info
     total_pages = (total_products + per_page - 1) // per_page
@@ -461,23 +866,9 @@ def add_product():
                     # Delete local file
                     os.remove(file_path)
             
-            # Generate barcode
-            barcode_data = f"PROD_{uuid.uuid4().hex[:12].upper()}"
-            qr = qrcode.QRCode(version=1, box_size=10, border=5)
-            qr.add_data(barcode_data)
-            qr.make(fit=True)
-            
-            # Create QR code image
-            qr_img = qr.make_image(fill_color="black", back_color="white")
-            qr_buffer = io.BytesIO()
-            qr_img.save(qr_buffer, format='PNG')
-            qr_buffer.seek(0)
-            
-            # Upload QR code to Firebase Storage
-            qr_blob = bucket.blob(f"barcodes/{barcode_data}.png")
-            qr_blob.upload_from_file(qr_buffer, content_type='image/png')
-            qr_blob.make_public()
-            qr_url = qr_blob.public_url
+            # Generate barcode and its QR code
+            barcode_data = new_barcode()
+            qr_url = upload_qr_png(bucket, barcode_data, render_qr_png(barcode_data))
             
             # Save product to Firestore
             product_data = {
@@ -497,10 +888,12 @@ def add_product():
                 'updated_at': datetime.now()
             }
             
-            doc_ref = db.collection('products').add(product_data)
+            product_ref = db.collection('products').document()
+            dashboard_summary.write(product_ref, after=product_data)
             
             # Invalidate cache
-            cache['products']['data'] = None
+            invalidate_cache('products', 'product_pages', 'product_count', 'dashboard_stats')
+            barcode_index.put(product_ref.id, product_data)
             
             # Log activity
             activity_data = {
@@ -509,7 +902,7 @@ def add_product():
                 'user': session['username'],
                 'timestamp': datetime.now()
             }
-            db.collection('activities').add(activity_data)
+            log_activity(activity_data)
             
             flash('Product added successfully!', 'success')
             return redirect(url_for('products'))
@@ -577,10 +970,14 @@ def edit_product(product_id):
                 'updated_at': datetime.now()
             }
             
-            product_ref.update(product_data)
+            stored = dashboard_summary.write(product_ref, updates=product_data)
+            if stored is None:
+                flash('Product not found', 'error')
+                return redirect(url_for('products'))
             
             # Invalidate cache
-            cache['products']['data'] = None
+            invalidate_cache('products', 'product_pages', 'dashboard_stats')
+            barcode_index.put(product_id, {**stored, **product_data})
             
             # Log activity
             activity_data = {
@@ -589,7 +986,7 @@ def edit_product(product_id):
                 'user': session['username'],
                 'timestamp': datetime.now()
             }
-            db.collection('activities').add(activity_data)
+            log_activity(activity_data)
             
             flash('Product updated successfully!', 'success')
             return redirect(url_for('products'))
@@ -621,12 +1018,10 @@ def edit_product(product_id):
 def lookup_product_by_barcode(barcode):
     """Look up product by barcode"""
     try:
-        products_ref = db.collection('products')
-        product_query = products_ref.where('barcode', '==', barcode).get()
+        barcode_index.refresh(get_cached_products())
+        product_data = barcode_index.get(barcode)
         
-        if product_query:
-            product_data = product_query[0].to_dict()
-            product_data['id'] = product_query[0].id
+        if product_data:
             return jsonify({
                 'success': True,
                 'product': product_data
@@ -642,20 +1037,46 @@ def lookup_product_by_barcode(barcode):
             'message': f'Error looking up product: {str(e)}'
         })
 
+@app.route('/lookup_products_by_barcode', methods=['POST'])
+@login_required
+def lookup_products_by_barcode():
+    """Look up many scanned barcodes at once, e.g. a whole box"""
+    try:
+        data = request.get_json(silent=True) or {}
+        barcodes = data.get('barcodes')
+        if not isinstance(barcodes, list) or not all(isinstance(barcode, str) for barcode in barcodes):
+            return jsonify({'success': False, 'message': 'barcodes must be a list of strings'}), 400
+        if len(barcodes) > MAX_BARCODE_BATCH:
+            return jsonify({
+                'success': False,
+                'message': f'At most {MAX_BARCODE_BATCH} barcodes per request'
+            }), 400
+        
+        barcode_index.refresh(get_cached_products())
+        products = barcode_index.lookup(barcodes)
+        return jsonify({
+            'success': True,
+            'products': products,
+            'missing': [barcode for barcode in dict.fromkeys(barcodes) if barcode not in products]
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error looking up products: {str(e)}'
+        })
+
 @app.route('/delete_product/<product_id>')
 @login_required
 @permission_required('delete_products')
 def delete_product(product_id):
     try:
         product_ref = db.collection('products').document(product_id)
-        product_doc = product_ref.get()
+        product_data = dashboard_summary.write(product_ref)
         
-        if product_doc.exists:
-            product_data = product_doc.to_dict()
-            product_ref.delete()
-            
+        if product_data is not None:
             # Invalidate cache
-            cache['products']['data'] = None
+            invalidate_cache('products', 'product_pages', 'product_count', 'dashboard_stats')
+            barcode_index.remove(product_id)
             
             # Log activity
             activity_data = {
@@ -664,7 +1085,7 @@ def delete_product(product_id):
                 'user': session['username'],
                 'timestamp': datetime.now()
             }
-            db.collection('activities').add(activity_data)
+            log_activity(activity_data)
             
             flash('Product deleted successfully!', 'success')
         else:
@@ -712,7 +1133,7 @@ def create_user():
         # Create new user
         user_data = {
             'username': username,
-            'password': password,
+            'password_hash': password_hasher.hash(password),
             'role': role,
             'permissions': permissions,
             'created_at': datetime.now(),
@@ -728,7 +1149,7 @@ def create_user():
             'user': session['username'],
             'timestamp': datetime.now()
         }
-        db.collection('activities').add(activity_data)
+        log_activity(activity_data)
         
         flash('User created successfully!', 'success')
         
@@ -771,14 +1192,15 @@ def update_user():
             'updated_by': session['username']
         }
         
+        print(f"DEBUG: Update data: {update_data}")
+        
         # Only update password if provided
         if password:
-            update_data['password'] = password
-        
-        print(f"DEBUG: Update data: {update_data}")
+            update_data.update(password_hasher.update_fields(password))
         
         # Update user
         user_ref.update(update_data)
+        user_principals.invalidate(user_id)
         
         # Log activity
         activity_data = {
@@ -787,7 +1209,7 @@ def update_user():
             'user': session['username'],
             'timestamp': datetime.now()
         }
-        db.collection('activities').add(activity_data)
+        log_activity(activity_data)
         
         return jsonify({'success': True, 'message': 'User updated successfully'})
         
@@ -795,63 +1217,51 @@ def update_user():
         print(f"DEBUG: Error updating user: {str(e)}")
         return jsonify({'success': False, 'message': f'Error updating user: {str(e)}'})
 
+def generate_missing_qr_codes_for_products(username, progress=None):
+    """Generate QR codes for products that don't have them; returns the number updated"""
+    # Get all products
+    products_ref = db.collection('products')
+    products = products_ref.get()
+    missing = [product for product in products
+               if not product.to_dict().get('barcode') or not product.to_dict().get('qr_code_url')]
+    
+    if bucket is None:
+        raise Exception('Storage bucket is not available')
+    
+    # Render on a thread pool, upload concurrently and update products in batches
+    pipeline = QRPipeline(db, bucket, progress=progress)
+    updated_count, failed_count = pipeline.run(missing)
+    if failed_count:
+        print(f"QR generation failed for {failed_count} products")
+    
+    if updated_count:
+        invalidate_cache('products', 'product_pages')
+    
+    # Log activity
+    activity_data = {
+        'action': 'Bulk QR Generation',
+        'details': f'Generated QR codes for {updated_count} products',
+        'user': username,
+        'timestamp': datetime.now()
+    }
+    log_activity(activity_data)
+    
+    return updated_count
+
+def run_qr_generation_job(job):
+    updated_count = generate_missing_qr_codes_for_products(job.created_by, job.set_progress)
+    return f'Generated QR codes for {updated_count} products'
+
 @app.route('/admin/generate_missing_qr_codes', methods=['POST'])
 @admin_required
 def generate_missing_qr_codes():
-    """Generate QR codes for products that don't have them"""
+    """Start a background job generating QR codes for products that don't have them"""
     try:
-        # Get all products
-        products_ref = db.collection('products')
-        products = products_ref.get()
-        
-        updated_count = 0
-        bucket = storage.bucket(resolved_storage_bucket)
-        
-        for product in products:
-            product_data = product.to_dict()
-            product_id = product.id
-            
-            # Check if product already has QR code
-            if not product_data.get('barcode') or not product_data.get('qr_code_url'):
-                # Generate barcode
-                barcode_data = f"PROD_{uuid.uuid4().hex[:12].upper()}"
-                qr = qrcode.QRCode(version=1, box_size=10, border=5)
-                qr.add_data(barcode_data)
-                qr.make(fit=True)
-                
-                # Create QR code image
-                qr_img = qr.make_image(fill_color="black", back_color="white")
-                qr_buffer = io.BytesIO()
-                qr_img.save(qr_buffer, format='PNG')
-                qr_buffer.seek(0)
-                
-                # Upload QR code to Firebase Storage
-                qr_blob = bucket.blob(f"barcodes/{barcode_data}.png")
-                qr_blob.upload_from_file(qr_buffer, content_type='image/png')
-                qr_blob.make_public()
-                qr_url = qr_blob.public_url
-                
-                # Update product with barcode and QR code
-                product.reference.update({
-                    'barcode': barcode_data,
-                    'qr_code_url': qr_url,
-                    'updated_at': datetime.now()
-                })
-                
-                updated_count += 1
-        
-        # Log activity
-        activity_data = {
-            'action': 'Bulk QR Generation',
-            'details': f'Generated QR codes for {updated_count} products',
-            'user': session['username'],
-            'timestamp': datetime.now()
-        }
-        db.collection('activities').add(activity_data)
-        
+        job_id = job_queue.submit('generate_missing_qr_codes', created_by=session['username'])
         return jsonify({
             'success': True,
-            'message': f'Generated QR codes for {updated_count} products'
+            'job_id': job_id,
+            'message': 'QR code generation started'
         })
         
     except Exception as e:
@@ -892,6 +1302,7 @@ def delete_user():
         
         # Delete user
         user_ref.delete()
+        user_principals.invalidate(user_id)
         
         # Log activity
         activity_data = {
@@ -900,17 +1311,85 @@ def delete_user():
             'user': session['username'],
             'timestamp': datetime.now()
         }
-        db.collection('activities').add(activity_data)
+        log_activity(activity_data)
         
         return jsonify({'success': True, 'message': 'User deleted successfully'})
         
     except Exception as e:
         return jsonify({'success': False, 'message': f'Error deleting user: {str(e)}'})
 
+# Collections emptied by a hard reset (users are kept for admin access)
+HARD_RESET_COLLECTIONS = [
+    'products',
+    'categories',
+    'sizes',
+    'colors',
+    'customers',
+    'sales_orders',
+    'production_orders',
+    'activities'
+]
+
+def run_hard_reset_job(job):
+    """Delete the reset collections in batches and rebuild the summaries
+
+    An interrupted reset is requeued by the job queue and simply deletes
+    whatever is left.
+    """
+    expected = BulkDeleter(db).count(HARD_RESET_COLLECTIONS)
+    total = sum(count or 0 for count in expected.values())
+    deleted = {collection: 0 for collection in HARD_RESET_COLLECTIONS}
+    
+    def report_progress(collection, collection_deleted, total_deleted):
+        deleted[collection] = collection_deleted
+        remaining = [f'{name} {deleted[name]}/{expected[name]}' for name in HARD_RESET_COLLECTIONS
+                     if expected[name] and deleted[name] < expected[name]]
+        job.set_progress(total_deleted, max(total, total_deleted),
+                         'Deleting ' + ', '.join(remaining) if remaining else 'Rebuilding summaries')
+    
+    job.set_progress(0, total, 'Deleting ' + ', '.join(f'{name} {count}' for name, count in expected.items() if count))
+    deleted_counts = BulkDeleter(db, progress=report_progress).delete(HARD_RESET_COLLECTIONS)
+    
+    # Products and sales are gone; recount the dashboard summary and customers
+    dashboard_summary.rebuild()
+    customer_index.rebuild()
+    customer_summaries.backfill()
+    returns_index.rebuild()
+    
+    # Clear all caches
+    invalidate_cache(*cache)
+    
+    summary = ', '.join(f'{name}: {count}' for name, count in deleted_counts.items())
+    failed = [name for name, count in deleted_counts.items() if not isinstance(count, int)]
+    if failed:
+        # Deleting is idempotent, so starting the reset again finishes the job
+        raise Exception(f'Could not delete {", ".join(failed)}. Run the reset again to finish. Deleted: {summary}')
+    
+    # Create reset activity log
+    log_activity({
+        'action': 'HARD RESET',
+        'details': f'System reset by {job.created_by}. Deleted: {deleted_counts}',
+        'user': job.created_by,
+        'timestamp': datetime.now()
+    })
+    
+    # Log to console for debugging
+    print(f"HARD RESET completed by {job.created_by}")
+    print(f"Deleted counts: {deleted_counts}")
+    
+    return f'Hard reset completed. Deleted {summary}'
+
+def active_hard_reset():
+    """The queued or running hard reset job, or None"""
+    for job in job_queue.list(kind='hard_reset', limit=5):
+        if job['status'] in ('queued', 'running'):
+            return job
+    return None
+
 @app.route('/admin/hard_reset', methods=['POST'])
 @admin_required
 def hard_reset():
-    """Hard reset - delete all data except admin users"""
+    """Hard reset - delete all data except admin users, as a background job"""
     try:
         data = request.get_json()
         confirmation = data.get('confirmation', '')
@@ -919,71 +1398,107 @@ def hard_reset():
         if confirmation != 'RESET ALL DATA':
             return jsonify({'success': False, 'message': 'Invalid confirmation. Type "RESET ALL DATA" to confirm.'})
         
-        # Get current admin user info before reset
-        current_user_id = session.get('user_id')
-        current_username = session.get('username')
+        # A reset that is already under way is reported instead of started twice
+        job = active_hard_reset()
+        if job:
+            return jsonify({'success': True, 'job_id': job['id'], 'message': 'A hard reset is already in progress'})
         
-        # Collections to reset (keep users for admin access)
-        collections_to_reset = [
-            'products',
-            'categories', 
-            'customers',
-            'sales_orders',
-            'production_orders',
-            'activities'
-        ]
-        
-        deleted_counts = {}
-        
-        # Delete all documents from each collection
-        for collection_name in collections_to_reset:
-            try:
-                collection_ref = db.collection(collection_name)
-                docs = collection_ref.get()
-                count = 0
-                
-                for doc in docs:
-                    doc.reference.delete()
-                    count += 1
-                
-                deleted_counts[collection_name] = count
-                print(f"Deleted {count} documents from {collection_name}")
-                
-            except Exception as e:
-                print(f"Error deleting from {collection_name}: {str(e)}")
-                deleted_counts[collection_name] = f"Error: {str(e)}"
-        
-        # Clear all caches
-        for cache_key in cache:
-            cache[cache_key]['data'] = None
-            cache[cache_key]['timestamp'] = 0
-        
-        # Create reset activity log
-        try:
-            activity_data = {
-                'action': 'HARD RESET',
-                'details': f'System reset by {current_username}. Deleted: {deleted_counts}',
-                'user': current_username,
-                'timestamp': datetime.now()
-            }
-            db.collection('activities').add(activity_data)
-        except:
-            pass  # If activities collection was deleted, skip logging
-        
-        # Log to console for debugging
-        print(f"HARD RESET completed by {current_username}")
-        print(f"Deleted counts: {deleted_counts}")
-        
-        return jsonify({
-            'success': True, 
-            'message': 'Hard reset completed successfully!',
-            'deleted_counts': deleted_counts
-        })
+        job_id = job_queue.submit('hard_reset', created_by=session['username'])
+        return jsonify({'success': True, 'job_id': job_id, 'message': 'Hard reset started'})
         
     except Exception as e:
         print(f"Error during hard reset: {str(e)}")
         return jsonify({'success': False, 'message': f'Error during reset: {str(e)}'})
 
+@app.route('/admin/hard_reset/status')
+@admin_required
+def hard_reset_status():
+    """Progress of the current hard reset, or of the most recent one"""
+    jobs = job_queue.list(kind='hard_reset', limit=1)
+    job = active_hard_reset() or (jobs[0] if jobs else None)
+    if not job:
+        return jsonify({'success': True, 'job_id': None, 'status': None})
+    return jsonify(job_summary(job))
+
+def import_products_from_excel(file_bytes, username, progress=None):
+    """Create products from an uploaded workbook; returns a summary message"""
+    import openpyxl
+    start_time = time.perf_counter()
+    workbook = openpyxl.load_workbook(io.BytesIO(file_bytes))
+    sheet = workbook.active
+    
+    # Document ids derive from the file contents and row number, so uploading
+    # the same file again (e.g. after a timeout) only writes the missing rows
+    import_key = hashlib.sha1(file_bytes).hexdigest()[:12]
+    products_ref = db.collection('products')
+    writes = []
+    for row_number, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), 2):
+        if row[0]:  # Check if first column has data
+            product_data = {
+                'name': row[0],
+                'category': row[1] or '',
+                'size': row[2] or '',
+                'color': row[3] or '',
+                'price': float(row[4]) if row[4] else 0.0,
+                'body_size': str(row[5]) if row[5] else '',
+                'waist_size': str(row[6]) if len(row) > 6 and row[6] else '',
+                'length': str(row[7]) if len(row) > 7 and row[7] else '',
+                'description': row[8] if len(row) > 8 and row[8] else '',
+                'created_at': datetime.now(),
+                'updated_at': datetime.now()
+            }
+            
+            # Generate barcode
+            barcode_data = f"PROD_{uuid.uuid4().hex[:12].upper()}"
+            product_data['barcode'] = barcode_data
+            
+            writes.append((products_ref.document(f"imp{import_key}{row_number:06d}"), product_data))
+    
+    saved = {'rows': 0}
+    
+    def report_progress(chunk, completed, total):
+        status = 'ok' if chunk.ok else f'failed: {chunk.error}'
+        print(f"Excel import chunk {completed}/{total} (products {chunk.start + 1}-{chunk.start + chunk.count}): {status}")
+        saved['rows'] += chunk.count if chunk.ok else 0
+        if progress:
+            progress(saved['rows'], len(writes), f'Saved chunk {completed} of {total}')
+    
+    def count_products(batch, chunk):
+        dashboard_summary.stage_created(batch, 'products', [data for _, data in chunk])
+    
+    # Commit in WriteBatch chunks instead of one add() per row; each chunk keeps
+    # one operation free for the dashboard summary update that commits with it
+    writer = BatchWriter(db, chunk_size=IMPORT_CHUNK_SIZE - 1, max_workers=IMPORT_WORKERS,
+                         progress=report_progress, before_commit=count_products)
+    result = writer.create(writes)
+    imported_count = result.written
+    metrics.observe_excel('import', 'Products', imported_count, time.perf_counter() - start_time)
+    
+    # Invalidate cache
+    invalidate_cache('products', 'product_pages', 'product_count', 'dashboard_stats')
+    
+    # Log activity
+    activity_data = {
+        'action': 'Excel Import',
+        'details': f'Imported {imported_count} products from Excel',
+        'user': username,
+        'timestamp': datetime.now()
+    }
+    log_activity(activity_data)
+    
+    if result.failed:
+        failed_rows = sum(chunk.count - chunk.skipped for chunk in result.failed)
+        raise Exception(f'Imported {imported_count} products, but {failed_rows} rows failed to save. '
+                        f'Upload the same file again to retry only the missing rows.')
+    if result.skipped:
+        return f'Successfully imported {imported_count} products ({result.skipped} rows were already imported)!'
+    return f'Successfully imported {imported_count} products!'
+
+def run_excel_import_job(job):
+    with open(os.path.join(job.folder, 'upload.xlsx'), 'rb') as upload:
+        file_bytes = upload.read()
+    return import_products_from_excel(file_bytes, job.created_by, job.set_progress)
+
 @app.route('/excel_import', methods=['GET', 'POST'])
 @login_required
 def excel_import():
@@ -991,102 +1506,54 @@ def excel_import():
         try:
             file = request.files['file']
             if file and file.filename.endswith('.xlsx'):
-                # Read Excel file
-                workbook = openpyxl.load_workbook(file)
-                sheet = workbook.active
-                
-                imported_count = 0
-                for row in sheet.iter_rows(min_row=2, values_only=True):
-                    if row[0]:  # Check if first column has data
-                        product_data = {
-                            'name': row[0],
-                            'category': row[1] or '',
-                            'size': row[2] or '',
-                            'color': row[3] or '',
-                            'price': float(row[4]) if row[4] else 0.0,
-                            'body_size': str(row[5]) if row[5] else '',
-                            'waist_size': str(row[6]) if len(row) > 6 and row[6] else '',
-                            'length': str(row[7]) if len(row) > 7 and row[7] else '',
-                            'description': row[8] if len(row) > 8 and row[8] else '',
-                            'created_at': datetime.now(),
-                            'updated_at': datetime.now()
-                        }
-                        
-                        # Generate barcode
-                        barcode_data = f"PROD_{uuid.uuid4().hex[:12].upper()}"
-                        product_data['barcode'] = barcode_data
-                        
-                        db.collection('products').add(product_data)
-                        imported_count += 1
-                
-                # Log activity
-                activity_data = {
-                    'action': 'Excel Import',
-                    'details': f'Imported {imported_count} products from Excel',
-                    'user': session['username'],
-                    'timestamp': datetime.now()
-                }
-                db.collection('activities').add(activity_data)
-                
-                flash(f'Successfully imported {imported_count} products!', 'success')
+                # The import runs as a background job; the page polls its progress
+                job_id = job_queue.submit('excel_import', created_by=session['username'],
+                                          files={'upload.xlsx': file.read()})
+                return redirect(url_for('excel_import', job=job_id))
             else:
                 flash('Please upload a valid Excel file (.xlsx)', 'error')
                 
         except Exception as e:
             flash(f'Error importing file: {str(e)}', 'error')
     
-    return render_template('excel_import.html')
+    return render_template('excel_import.html', job_id=request.args.get('job'))
 
 @app.route('/excel_export')
 @login_required
 def excel_export():
     try:
-        # Get all products
-        products_ref = db.collection('products')
-        products = products_ref.get()
-        
-        # Create Excel workbook
-        workbook = Workbook()
-        sheet = workbook.active
-        sheet.title = "Products"
-        
-        # Add headers
         headers = ['Name', 'Category', 'Size', 'Color', 'Price', 'Body Size', 'Waist Size', 'Length', 'Description', 'Barcode']
-        for col, header in enumerate(headers, 1):
-            sheet.cell(row=1, column=col, value=header)
         
-        # Add product data
-        for row, product in enumerate(products, 2):
-            product_data = product.to_dict()
-            sheet.cell(row=row, column=1, value=product_data.get('name', ''))
-            sheet.cell(row=row, column=2, value=product_data.get('category', ''))
-            sheet.cell(row=row, column=3, value=product_data.get('size', ''))
-            sheet.cell(row=row, column=4, value=product_data.get('color', ''))
-            sheet.cell(row=row, column=5, value=product_data.get('price', 0))
-            sheet.cell(row=row, column=6, value=product_data.get('body_size', ''))
-            sheet.cell(row=row, column=7, value=product_data.get('waist_size', ''))
-            sheet.cell(row=row, column=8, value=product_data.get('length', ''))
-            sheet.cell(row=row, column=9, value=product_data.get('description', ''))
-            sheet.cell(row=row, column=10, value=product_data.get('barcode', ''))
-        
-        # Save to memory
-        output = io.BytesIO()
-        workbook.save(output)
-        output.seek(0)
+        def product_rows():
+            """Products are streamed from Firestore straight into the write-only sheet"""
+            for product in db.collection('products').stream():
+                product_data = product.to_dict()
+                yield (
+                    product_data.get('name', ''),
+                    product_data.get('category', ''),
+                    product_data.get('size', ''),
+                    product_data.get('color', ''),
+                    product_data.get('price', 0),
+                    product_data.get('body_size', ''),
+                    product_data.get('waist_size', ''),
+                    product_data.get('length', ''),
+                    product_data.get('description', ''),
+                    product_data.get('barcode', '')
+                )
+        
+        output = xlsx_file()
+        product_count = write_xlsx(output, 'Products', headers, product_rows())
         
         # Log activity
         activity_data = {
             'action': 'Excel Export',
-            'details': f'Exported {len(products)} products to Excel',
+            'details': f'Exported {product_count} products to Excel',
             'user': session['username'],
             'timestamp': datetime.now()
         }
-        db.collection('activities').add(activity_data)
+        log_activity(activity_data)
         
-        return output.getvalue(), 200, {
-            'Content-Type': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            'Content-Disposition': 'attachment; filename=products_export.xlsx'
-        }
+        return send_xlsx(output, 'products_export.xlsx')
         
     except Exception as e:
         flash(f'Error exporting file: {str(e)}', 'error')
@@ -1095,7 +1562,6 @@ def excel_export():
 # Production Management Routes
 @app.route('/production')
 @login_required
-@performance_monitor
 def production():
     # Get products from cache
     def fetch_products():
@@ -1169,7 +1635,7 @@ def create_production():
         
         if created_orders:
             # Invalidate cache
-            cache['production_orders']['data'] = None
+            invalidate_cache('production_orders')
             
             # Log activity
             activity_data = {
@@ -1178,7 +1644,7 @@ def create_production():
                 'user': session['username'],
                 'timestamp': datetime.now()
             }
-            db.collection('activities').add(activity_data)
+            log_activity(activity_data)
             
             flash(f'Production order created successfully for {len(created_orders)} product(s)!', 'success')
         else:
@@ -1215,7 +1681,7 @@ def update_production_status(order_id):
                 'user': session['username'],
                 'timestamp': datetime.now()
             }
-            db.collection('activities').add(activity_data)
+            log_activity(activity_data)
             
             flash('Production status updated successfully!', 'success')
         else:
@@ -1230,7 +1696,6 @@ def update_production_status(order_id):
 @app.route('/sales')
 @login_required
 @permission_required('sales_customer')
-@performance_monitor
 def sales():
     # Get products from cache
     def fetch_products():
@@ -1258,53 +1723,6 @@ def sales():
         
         return sales_list
     
-    # Group sales by customer with enhanced consolidation
-    def group_sales_by_customer(sales_list):
-        grouped_sales = {}
-        for sale in sales_list:
-            # Check if this is a new consolidated multiple items order
-            if sale.get('is_multiple_items'):
-                # This is already a consolidated order, treat as single group
-                customer_key = f"{sale['customer_name']}|{sale['customer_phone']}|{sale.get('order_id', sale.get('created_at'))}"
-                grouped_sales[customer_key] = {
-                    'customer_name': sale['customer_name'],
-                    'customer_phone': sale['customer_phone'],
-                    'sold_by': sale['sold_by'],
-                    'created_at': sale['created_at'],
-                    'items': [sale]  # Single consolidated item
-                }
-            else:
-                # Legacy individual items - group by customer and time (within 5 minutes)
-                customer_base_key = f"{sale['customer_name']}|{sale['customer_phone']}"
-                
-                # Find existing group within 5 minutes
-                found_group = False
-                for existing_key in grouped_sales:
-                    if existing_key.startswith(customer_base_key):
-                        existing_group = grouped_sales[existing_key]
-                        # Check if within 5 minutes of each other
-                        time_diff = abs((sale['created_at'] - existing_group['created_at']).total_seconds())
-                        if time_diff <= 300:  # 5 minutes
-                            existing_group['items'].append(sale)
-                            found_group = True
-                            break
-                
-                if not found_group:
-                    # Create new group for this customer/time
-                    customer_key = f"{customer_base_key}|{sale['created_at']}"
-                    grouped_sales[customer_key] = {
-                        'customer_name': sale['customer_name'],
-                        'customer_phone': sale['customer_phone'],
-                        'sold_by': sale['sold_by'],
-                        'created_at': sale['created_at'],
-                        'items': [sale]
-                    }
-        
-        # Convert to list and sort by date (newest first)
-        grouped_list = list(grouped_sales.values())
-        grouped_list.sort(key=lambda x: x['created_at'], reverse=True)
-        return grouped_list
-    
     # Get sizes and colors from cache
     def fetch_sizes():
         sizes_ref = db.collection('sizes')
@@ -1332,7 +1750,8 @@ def sales():
     
     product_list = get_cached_data('products', fetch_products)
     sales_list = get_cached_data('sales_orders', fetch_sales)
-    grouped_sales = group_sales_by_customer(sales_list)
+    # Group sales by customer; legacy single-item sales within 5 minutes share a group
+    grouped_sales = group_sales(sales_list)
     size_list = get_cached_data('sizes', fetch_sizes)
     color_list = get_cached_data('colors', fetch_colors)
     
@@ -1427,11 +1846,12 @@ def create_sale():
                 'created_at': datetime.now()
             }
             
-            db.collection('sales_orders').add(sale_data)
+            sale_ref = db.collection('sales_orders').document()
+            commit_sale_change(sale_ref, after=sale_data)
+            customer_index.note_sale(sale_ref.id, sale_data)
             
             # Invalidate caches
-            cache['sales_orders']['data'] = None
-            cache['products']['data'] = None
+            invalidate_cache('sales_orders', 'products', 'dashboard_stats')
             
             
             # Log activity
@@ -1441,7 +1861,7 @@ def create_sale():
                 'user': session['username'],
                 'timestamp': datetime.now()
             }
-            db.collection('activities').add(activity_data)
+            log_activity(activity_data)
             
             flash(f'Sale completed successfully! Items: {item_numbers} - Total: ৳{total_price}', 'success')
         else:
@@ -1515,7 +1935,7 @@ def add_customer():
             'user': session['username'],
             'timestamp': datetime.now()
         }
-        db.collection('activities').add(activity_data)
+        log_activity(activity_data)
         
         flash('Customer added successfully!', 'success')
         
@@ -1525,9 +1945,19 @@ def add_customer():
     return redirect(url_for('customers'))
 
 # Category Management Routes
+def with_usage(collection, options):
+    """Copies of cached categories/sizes/colors with 'product_count' from the dashboard summary"""
+    try:
+        counts = dashboard_summary.usage(collection) if dashboard_summary else None
+    except Exception as e:
+        print(f"Could not read product usage counts: {e}")
+        counts = None
+    # Without counts (summary not rebuilt yet) the pages leave the column empty
+    return [{**option, 'product_count': counts.get(usage_key(option.get('name', '')), 0) if counts is not None else None}
+            for option in options]
+
 @app.route('/categories')
 @login_required
-@performance_monitor
 def categories():
     def fetch_categories():
         categories_ref = db.collection('categories')
@@ -1542,7 +1972,7 @@ def categories():
         return category_list
     
     category_list = get_cached_data('categories', fetch_categories)
-    return render_template('categories.html', categories=category_list)
+    return render_template('categories.html', categories=with_usage('categories', category_list))
 
 @app.route('/add_category', methods=['POST'])
 @login_required
@@ -1569,7 +1999,7 @@ def add_category():
         db.collection('categories').add(category_data)
         
         # Invalidate cache
-        cache['categories']['data'] = None
+        invalidate_cache('categories')
         
         # Log activity
         activity_data = {
@@ -1578,7 +2008,7 @@ def add_category():
             'user': session['username'],
             'timestamp': datetime.now()
         }
-        db.collection('activities').add(activity_data)
+        log_activity(activity_data)
         
         flash('Category added successfully!', 'success')
         
@@ -1611,7 +2041,7 @@ def add_category_ajax():
         db.collection('categories').add(category_data)
         
         # Invalidate cache
-        cache['categories']['data'] = None
+        invalidate_cache('categories')
         
         # Log activity
         activity_data = {
@@ -1620,7 +2050,7 @@ def add_category_ajax():
             'user': session['username'],
             'timestamp': datetime.now()
         }
-        db.collection('activities').add(activity_data)
+        log_activity(activity_data)
         
         return jsonify({'success': True, 'message': 'Category added successfully!'})
         
@@ -1656,7 +2086,7 @@ def edit_category_ajax(category_id):
         })
         
         # Invalidate cache
-        cache['categories']['data'] = None
+        invalidate_cache('categories')
         
         # Log activity
         activity_data = {
@@ -1665,7 +2095,7 @@ def edit_category_ajax(category_id):
             'user': session['username'],
             'timestamp': datetime.now()
         }
-        db.collection('activities').add(activity_data)
+        log_activity(activity_data)
         
         return jsonify({'success': True, 'message': 'Category updated successfully!'})
         
@@ -1691,7 +2121,7 @@ def sizes():
         return size_list
     
     size_list = get_cached_data('sizes', fetch_sizes)
-    return render_template('sizes.html', sizes=size_list)
+    return render_template('sizes.html', sizes=with_usage('sizes', size_list))
 
 @app.route('/add_size', methods=['POST'])
 @login_required
@@ -1719,7 +2149,7 @@ def add_size():
         db.collection('sizes').add(size_data)
         
         # Invalidate cache
-        cache['sizes']['data'] = None
+        invalidate_cache('sizes')
         
         # Log activity
         activity_data = {
@@ -1728,7 +2158,7 @@ def add_size():
             'user': session['username'],
             'timestamp': datetime.now()
         }
-        db.collection('activities').add(activity_data)
+        log_activity(activity_data)
         
         flash('Size added successfully!', 'success')
         
@@ -1762,7 +2192,7 @@ def add_size_ajax():
         db.collection('sizes').add(size_data)
         
         # Invalidate cache
-        cache['sizes']['data'] = None
+        invalidate_cache('sizes')
         
         # Log activity
         activity_data = {
@@ -1771,7 +2201,7 @@ def add_size_ajax():
             'user': session['username'],
             'timestamp': datetime.now()
         }
-        db.collection('activities').add(activity_data)
+        log_activity(activity_data)
         
         return jsonify({'success': True, 'message': 'Size added successfully!'})
         
@@ -1831,7 +2261,7 @@ def edit_size_ajax(size_id):
         })
         
         # Invalidate cache
-        cache['sizes']['data'] = None
+        invalidate_cache('sizes')
         
         # Log activity
         activity_data = {
@@ -1840,7 +2270,7 @@ def edit_size_ajax(size_id):
             'user': session['username'],
             'timestamp': datetime.now()
         }
-        db.collection('activities').add(activity_data)
+        log_activity(activity_data)
         
         return jsonify({'success': True, 'message': 'Size updated successfully!'})
         
@@ -1861,18 +2291,17 @@ def delete_size_ajax(size_id):
         size_data = size_doc.to_dict()
         size_name = size_data['name']
         
-        # Check if size is being used in products
-        products_ref = db.collection('products')
-        products_using_size = products_ref.where('size', '==', size_name).get()
+        # Check if size is being used in products (usage count from the dashboard summary)
+        products_using_size = dashboard_summary.usage_count('sizes', size_name)
         
         if products_using_size:
-            return jsonify({'success': False, 'message': f'Cannot delete size "{size_name}" as it is being used in {len(products_using_size)} product(s)!'})
+            return jsonify({'success': False, 'message': f'Cannot delete size "{size_name}" as it is being used in {products_using_size} product(s)!'})
         
         # Delete size
         size_ref.delete()
         
         # Invalidate cache
-        cache['sizes']['data'] = None
+        invalidate_cache('sizes')
         
         # Log activity
         activity_data = {
@@ -1881,7 +2310,7 @@ def delete_size_ajax(size_id):
             'user': session['username'],
             'timestamp': datetime.now()
         }
-        db.collection('activities').add(activity_data)
+        log_activity(activity_data)
         
         return jsonify({'success': True, 'message': 'Size deleted successfully!'})
         
@@ -1907,7 +2336,7 @@ def colors():
         return color_list
     
     color_list = get_cached_data('colors', fetch_colors)
-    return render_template('colors.html', colors=color_list)
+    return render_template('colors.html', colors=with_usage('colors', color_list))
 
 @app.route('/add_color', methods=['POST'])
 @login_required
@@ -1935,7 +2364,7 @@ def add_color():
         db.collection('colors').add(color_data)
         
         # Invalidate cache
-        cache['colors']['data'] = None
+        invalidate_cache('colors')
         
         # Log activity
         activity_data = {
@@ -1944,7 +2373,7 @@ def add_color():
             'user': session['username'],
             'timestamp': datetime.now()
         }
-        db.collection('activities').add(activity_data)
+        log_activity(activity_data)
         
         flash('Color added successfully!', 'success')
         
@@ -1978,7 +2407,7 @@ def add_color_ajax():
         db.collection('colors').add(color_data)
         
         # Invalidate cache
-        cache['colors']['data'] = None
+        invalidate_cache('colors')
         
         # Log activity
         activity_data = {
@@ -1987,7 +2416,7 @@ def add_color_ajax():
             'user': session['username'],
             'timestamp': datetime.now()
         }
-        db.collection('activities').add(activity_data)
+        log_activity(activity_data)
         
         return jsonify({'success': True, 'message': 'Color added successfully!'})
         
@@ -2047,7 +2476,7 @@ def edit_color_ajax(color_id):
         })
         
         # Invalidate cache
-        cache['colors']['data'] = None
+        invalidate_cache('colors')
         
         # Log activity
         activity_data = {
@@ -2056,7 +2485,7 @@ def edit_color_ajax(color_id):
             'user': session['username'],
             'timestamp': datetime.now()
         }
-        db.collection('activities').add(activity_data)
+        log_activity(activity_data)
         
         return jsonify({'success': True, 'message': 'Color updated successfully!'})
         
@@ -2077,18 +2506,17 @@ def delete_color_ajax(color_id):
         color_data = color_doc.to_dict()
         color_name = color_data['name']
         
-        # Check if color is being used in products
-        products_ref = db.collection('products')
-        products_using_color = products_ref.where('color', '==', color_name).get()
+        # Check if color is being used in products (usage count from the dashboard summary)
+        products_using_color = dashboard_summary.usage_count('colors', color_name)
         
         if products_using_color:
-            return jsonify({'success': False, 'message': f'Cannot delete color "{color_name}" as it is being used in {len(products_using_color)} product(s)!'})
+            return jsonify({'success': False, 'message': f'Cannot delete color "{color_name}" as it is being used in {products_using_color} product(s)!'})
         
         # Delete color
         color_ref.delete()
         
         # Invalidate cache
-        cache['colors']['data'] = None
+        invalidate_cache('colors')
         
         # Log activity
         activity_data = {
@@ -2097,7 +2525,7 @@ def delete_color_ajax(color_id):
             'user': session['username'],
             'timestamp': datetime.now()
         }
-        db.collection('activities').add(activity_data)
+        log_activity(activity_data)
         
         return jsonify({'success': True, 'message': 'Color deleted successfully!'})
         
@@ -2116,21 +2544,20 @@ def delete_category_ajax(category_id):
         
         category_data = category_doc.to_dict()
         
-        # Check if category is used in products
-        products_ref = db.collection('products')
-        products_using_category = products_ref.where('category', '==', category_data['name']).get()
+        # Check if category is used in products (usage count from the dashboard summary)
+        products_using_category = dashboard_summary.usage_count('categories', category_data['name'])
         
         if products_using_category:
             return jsonify({
                 'success': False, 
-                'message': f'Cannot delete category "{category_data["name"]}" - it is used by {len(products_using_category)} products'
+                'message': f'Cannot delete category "{category_data["name"]}" - it is used by {products_using_category} products'
             })
         
         # Delete category
         category_ref.delete()
         
         # Invalidate cache
-        cache['categories']['data'] = None
+        invalidate_cache('categories')
         
         # Log activity
         activity_data = {
@@ -2139,7 +2566,7 @@ def delete_category_ajax(category_id):
             'user': session['username'],
             'timestamp': datetime.now()
         }
-        db.collection('activities').add(activity_data)
+        log_activity(activity_data)
         
         return jsonify({'success': True, 'message': 'Category deleted successfully!'})
         
@@ -2171,7 +2598,7 @@ def edit_category(category_id):
                 'user': session['username'],
                 'timestamp': datetime.now()
             }
-            db.collection('activities').add(activity_data)
+            log_activity(activity_data)
             
             flash('Category updated successfully!', 'success')
         else:
@@ -2192,12 +2619,11 @@ def delete_category(category_id):
         if category_doc.exists:
             category_data = category_doc.to_dict()
             
-            # Check if category is used in products
-            products_ref = db.collection('products')
-            products_using_category = products_ref.where('category', '==', category_data['name']).get()
+            # Check if category is used in products (usage count from the dashboard summary)
+            products_using_category = dashboard_summary.usage_count('categories', category_data['name'])
             
             if products_using_category:
-                flash(f'Cannot delete category "{category_data["name"]}" - it is used by {len(products_using_category)} products', 'error')
+                flash(f'Cannot delete category "{category_data["name"]}" - it is used by {products_using_category} products', 'error')
                 return redirect(url_for('categories'))
             
             category_ref.delete()
@@ -2209,7 +2635,7 @@ def delete_category(category_id):
                 'user': session['username'],
                 'timestamp': datetime.now()
             }
-            db.collection('activities').add(activity_data)
+            log_activity(activity_data)
             
             flash('Category deleted successfully!', 'success')
         else:
@@ -2221,6 +2647,81 @@ def delete_category(category_id):
     return redirect(url_for('categories'))
 
 # Excel Import for Production
+def import_production_orders_from_excel(file_bytes, username, progress=None):
+    """Create production orders from an uploaded workbook; returns a summary message"""
+    import openpyxl
+    start_time = time.perf_counter()
+    workbook = openpyxl.load_workbook(io.BytesIO(file_bytes))
+    sheet = workbook.active
+    
+    # Same resumable ids as excel_import: a rerun of this file skips rows already saved
+    import_key = hashlib.sha1(file_bytes).hexdigest()[:12]
+    production_ref = db.collection('production_orders')
+    products_by_name = {}
+    writes = []
+    rows = list(sheet.iter_rows(min_row=2, values_only=True))
+    for row_number, row in enumerate(rows, 2):
+        if row[0]:  # Check if first column has data
+            # Find product by name (each name is looked up once per file)
+            if row[0] not in products_by_name:
+                products_ref = db.collection('products')
+                products_by_name[row[0]] = products_ref.where('name', '==', row[0]).limit(1).get()
+            product_query = products_by_name[row[0]]
+            
+            if product_query:
+                product = product_query[0]
+                product_data = product.to_dict()
+                
+                production_data = {
+                    'product_id': product.id,
+                    'product_name': product_data['name'],
+                    'product_category': product_data['category'],
+                    'product_size': product_data['size'],
+                    'product_color': product_data['color'],
+                    'quantity': int(row[1]) if row[1] else 0,
+                    'status': row[2] if row[2] else 'pending',
+                    'notes': row[3] if row[3] else '',
+                    'created_by': username,
+                    'created_at': datetime.now(),
+                    'updated_at': datetime.now()
+                }
+                
+                writes.append((production_ref.document(f"imp{import_key}{row_number:06d}"), production_data))
+        
+        if progress and row_number % 100 == 0:
+            progress(row_number - 1, len(rows), 'Matching products')
+    
+    def report_progress(chunk, completed, total):
+        if progress:
+            progress(completed, total, f'Saved chunk {completed} of {total}')
+    
+    writer = BatchWriter(db, chunk_size=IMPORT_CHUNK_SIZE, max_workers=IMPORT_WORKERS,
+                         progress=report_progress)
+    result = writer.create(writes)
+    imported_count = result.written
+    metrics.observe_excel('import', 'Production Orders', imported_count, time.perf_counter() - start_time)
+    invalidate_cache('production_orders')
+    
+    # Log activity
+    activity_data = {
+        'action': 'Excel Production Import',
+        'details': f'Imported {imported_count} production orders from Excel',
+        'user': username,
+        'timestamp': datetime.now()
+    }
+    log_activity(activity_data)
+    
+    if result.failed:
+        failed_rows = sum(chunk.count - chunk.skipped for chunk in result.failed)
+        raise Exception(f'Imported {imported_count} production orders, but {failed_rows} rows failed to save. '
+                        f'Upload the same file again to retry only the missing rows.')
+    return f'Successfully imported {imported_count} production orders!'
+
+def run_production_import_job(job):
+    with open(os.path.join(job.folder, 'upload.xlsx'), 'rb') as upload:
+        file_bytes = upload.read()
+    return import_production_orders_from_excel(file_bytes, job.created_by, job.set_progress)
+
 @app.route('/excel_import_production', methods=['GET', 'POST'])
 @login_required
 def excel_import_production():
@@ -2228,116 +2729,49 @@ def excel_import_production():
         try:
             file = request.files['file']
             if file and file.filename.endswith('.xlsx'):
-                # Read Excel file
-                workbook = openpyxl.load_workbook(file)
-                sheet = workbook.active
-                
-                imported_count = 0
-                for row in sheet.iter_rows(min_row=2, values_only=True):
-                    if row[0]:  # Check if first column has data
-                        # Find product by name
-                        products_ref = db.collection('products')
-                        product_query = products_ref.where('name', '==', row[0]).get()
-                        
-                        if product_query:
-                            product = product_query[0]
-                            product_data = product.to_dict()
-                            
-                            production_data = {
-                                'product_id': product.id,
-                                'product_name': product_data['name'],
-                                'product_category': product_data['category'],
-                                'product_size': product_data['size'],
-                                'product_color': product_data['color'],
-                                'quantity': int(row[1]) if row[1] else 0,
-                                'status': row[2] if row[2] else 'pending',
-                                'notes': row[3] if row[3] else '',
-                                'created_by': session['username'],
-                                'created_at': datetime.now(),
-                                'updated_at': datetime.now()
-                            }
-                            
-                            db.collection('production_orders').add(production_data)
-                            imported_count += 1
-                
-                # Log activity
-                activity_data = {
-                    'action': 'Excel Production Import',
-                    'details': f'Imported {imported_count} production orders from Excel',
-                    'user': session['username'],
-                    'timestamp': datetime.now()
-                }
-                db.collection('activities').add(activity_data)
-                
-                flash(f'Successfully imported {imported_count} production orders!', 'success')
+                job_id = job_queue.submit('excel_import_production', created_by=session['username'],
+                                          files={'upload.xlsx': file.read()})
+                return redirect(url_for('excel_import_production', job=job_id))
             else:
                 flash('Please upload a valid Excel file (.xlsx)', 'error')
                 
         except Exception as e:
             flash(f'Error importing file: {str(e)}', 'error')
     
-    return render_template('excel_import_production.html')
+    return render_template('excel_import_production.html', job_id=request.args.get('job'))
 
 # Excel Export for Production Records
 @app.route('/excel_export_production')
 @login_required
 def excel_export_production():
     try:
-        # Get date filter
-        date_filter = request.args.get('date', '')
+        # Get date filter; only orders in the range are read from Firestore
+        start, end, date_label = parse_date_range(request.args)
         
-        # Get production orders
-        production_ref = db.collection('production_orders')
-        production_orders = production_ref.get()
+        headers = ['Product Name', 'Category', 'Size', 'Color', 'Quantity', 'Status', 'Notes', 'Created By', 'Created Date', 'Updated Date']
         
-        # Filter by date if provided
-        filtered_orders = []
-        for order in production_orders:
-            order_data = order.to_dict()
-            if date_filter:
-                order_date = order_data.get('created_at', datetime.now())
-                if isinstance(order_date, datetime):
-                    if order_date.strftime('%Y-%m-%d') != date_filter:
-                        continue
-            order_data['id'] = order.id
-            filtered_orders.append(order_data)
+        def production_rows():
+            for order in created_between('production_orders', start, end).stream():
+                order = order.to_dict()
+                yield (
+                    order.get('product_name', ''),
+                    order.get('product_category', ''),
+                    order.get('product_size', ''),
+                    order.get('product_color', ''),
+                    order.get('quantity', 0),
+                    order.get('status', ''),
+                    order.get('notes', ''),
+                    order.get('created_by', ''),
+                    order.get('created_at', '').strftime('%Y-%m-%d %H:%M') if order.get('created_at') else '',
+                    order.get('updated_at', '').strftime('%Y-%m-%d %H:%M') if order.get('updated_at') else ''
+                )
         
-        # Create Excel workbook
-        workbook = openpyxl.Workbook()
-        sheet = workbook.active
-        sheet.title = "Production Records"
+        output = xlsx_file()
+        write_xlsx(output, 'Production Records', headers, production_rows())
         
-        # Headers
-        headers = ['Product Name', 'Category', 'Size', 'Color', 'Quantity', 'Status', 'Notes', 'Created By', 'Created Date', 'Updated Date']
-        for col, header in enumerate(headers, 1):
-            sheet.cell(row=1, column=col, value=header)
-        
-        # Data
-        for row, order in enumerate(filtered_orders, 2):
-            sheet.cell(row=row, column=1, value=order.get('product_name', ''))
-            sheet.cell(row=row, column=2, value=order.get('product_category', ''))
-            sheet.cell(row=row, column=3, value=order.get('product_size', ''))
-            sheet.cell(row=row, column=4, value=order.get('product_color', ''))
-            sheet.cell(row=row, column=5, value=order.get('quantity', 0))
-            sheet.cell(row=row, column=6, value=order.get('status', ''))
-            sheet.cell(row=row, column=7, value=order.get('notes', ''))
-            sheet.cell(row=row, column=8, value=order.get('created_by', ''))
-            sheet.cell(row=row, column=9, value=order.get('created_at', '').strftime('%Y-%m-%d %H:%M') if order.get('created_at') else '')
-            sheet.cell(row=row, column=10, value=order.get('updated_at', '').strftime('%Y-%m-%d %H:%M') if order.get('updated_at') else '')
-        
-        # Save to BytesIO
-        output = io.BytesIO()
-        workbook.save(output)
-        output.seek(0)
-        
-        filename = f'production_records_{date_filter if date_filter else "all"}.xlsx'
-        
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
-        )
+        filename = f'production_records_{date_label if date_label else "all"}.xlsx'
+        
+        return send_xlsx(output, filename)
         
     except Exception as e:
         flash(f'Error exporting production records: {str(e)}', 'error')
@@ -2349,72 +2783,28 @@ def excel_export_production():
 @permission_required('sales_customer')
 def excel_export_sales():
     try:
-        # Get date filter
-        date_filter = request.args.get('date', '')
-        
-        # Get sales orders
-        sales_ref = db.collection('sales_orders')
-        sales_orders = sales_ref.get()
+        # Get date filter; only orders in the range are read from Firestore
+        start, end, date_label = parse_date_range(request.args)
         
-        # Filter by date if provided
-        filtered_orders = []
-        for order in sales_orders:
+        # Group sales by customer while streaming; each group keeps only its
+        # product descriptions and totals, not the orders themselves
+        grouper = SalesGrouper(window=None, split_multiple_items=False, keep_items=False)
+        for order in created_between('sales_orders', start, end).stream():
             order_data = order.to_dict()
-            if date_filter:
-                order_date = order_data.get('created_at', datetime.now())
-                if isinstance(order_date, datetime):
-                    if order_date.strftime('%Y-%m-%d') != date_filter:
-                        continue
-            filtered_orders.append(order_data)
-        
-        # Create Excel workbook
-        workbook = openpyxl.Workbook()
-        sheet = workbook.active
-        sheet.title = "Sales Delivery"
-        
-        # Headers - Consolidated format
-        headers = ['Customer Name', 'Phone', 'Address', 'All Products', 'Total Items', 'Total Amount', 'Sale Date', 'Sold By']
-        for col, header in enumerate(headers, 1):
-            sheet.cell(row=1, column=col, value=header)
-        
-        # Group sales by customer and consolidate all their items
-        grouped_sales = {}
-        for order_data in filtered_orders:
-            customer_key = f"{order_data.get('customer_name', '')}|{order_data.get('customer_phone', '')}"
-            if customer_key not in grouped_sales:
-                grouped_sales[customer_key] = {
-                    'customer_name': order_data.get('customer_name', ''),
-                    'customer_phone': order_data.get('customer_phone', ''),
-                    'customer_address': order_data.get('customer_address', ''),
-                    'sold_by': order_data.get('sold_by', ''),
-                    'created_at': order_data.get('created_at', ''),
-                    'items': [],
-                    'total_amount': 0,
-                    'total_items': 0
-                }
+            
+            customer_group = grouper.add(order_data)
+            customer_group.setdefault('product_list', [])
+            customer_group['total_amount'] = customer_group.get('total_amount', 0) + order_data.get('total_price', 0)
             
             # Handle both consolidated multiple items and individual items
             if order_data.get('is_multiple_items'):
-                # This is a consolidated multiple items order
-                grouped_sales[customer_key]['items'].extend(order_data.get('items', []))
-                grouped_sales[customer_key]['total_amount'] += order_data.get('total_price', 0)
-                grouped_sales[customer_key]['total_items'] += order_data.get('total_quantity', 0)
+                order_items = order_data.get('items', [])
+                customer_group['total_items'] = customer_group.get('total_items', 0) + order_data.get('total_quantity', 0)
             else:
-                # This is a single item order
-                grouped_sales[customer_key]['items'].append(order_data)
-                grouped_sales[customer_key]['total_amount'] += order_data.get('total_price', 0)
-                grouped_sales[customer_key]['total_items'] += max(order_data.get('quantity', 0), 1)
-        
-        # Sort by date (newest first)
-        grouped_list = list(grouped_sales.values())
-        grouped_list.sort(key=lambda x: x['created_at'], reverse=True)
-        
-        # Data - One row per customer with all their products
-        row = 2
-        for customer_group in grouped_list:
-            # Build consolidated product list
-            product_list = []
-            for item in customer_group['items']:
+                order_items = [order_data]
+                customer_group['total_items'] = customer_group.get('total_items', 0) + max(order_data.get('quantity', 0), 1)
+            
+            for item in order_items:
                 if isinstance(item, dict):
                     # Handle both consolidated items and regular items
                     product_name = item.get('product_name', '')
@@ -2432,39 +2822,186 @@ def excel_export_sales():
                             details.append(product_color)
                         product_desc += f" ({', '.join(details)})"
                     product_desc += f" x{quantity}"
-                    product_list.append(product_desc)
-            
-            # Customer information
-            sheet.cell(row=row, column=1, value=customer_group['customer_name'])
-            sheet.cell(row=row, column=2, value=customer_group['customer_phone'])
-            sheet.cell(row=row, column=3, value=customer_group['customer_address'])
-            sheet.cell(row=row, column=4, value='; '.join(product_list))  # All products in one cell
-            sheet.cell(row=row, column=5, value=customer_group['total_items'])
-            sheet.cell(row=row, column=6, value=customer_group['total_amount'])
-            sheet.cell(row=row, column=7, value=customer_group['created_at'].strftime('%Y-%m-%d %H:%M') if customer_group['created_at'] else '')
-            sheet.cell(row=row, column=8, value=customer_group['sold_by'])
-            
-            row += 1
-        
-        # Save to BytesIO
-        output = io.BytesIO()
-        workbook.save(output)
-        output.seek(0)
-        
-        filename = f'sales_delivery_{date_filter if date_filter else "all"}.xlsx'
-        
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
+                    customer_group['product_list'].append(product_desc)
+        
+        # Headers - Consolidated format
+        headers = ['Customer Name', 'Phone', 'Address', 'All Products', 'Total Items', 'Total Amount', 'Sale Date', 'Sold By']
+        
+        # Data - One row per customer with all their products (newest first)
+        rows = (
+            (
+                customer_group['customer_name'],
+                customer_group['customer_phone'],
+                customer_group['customer_address'],
+                '; '.join(customer_group['product_list']),  # All products in one cell
+                customer_group['total_items'],
+                customer_group['total_amount'],
+                customer_group['created_at'].strftime('%Y-%m-%d %H:%M') if customer_group['created_at'] else '',
+                customer_group['sold_by']
+            )
+            for customer_group in grouper.groups()
         )
+        output = xlsx_file()
+        write_xlsx(output, 'Sales Delivery', headers, rows)
+        
+        filename = f'sales_delivery_{date_label if date_label else "all"}.xlsx'
+        
+        return send_xlsx(output, filename)
         
     except Exception as e:
         flash(f'Error exporting sales: {str(e)}', 'error')
         return redirect(url_for('sales'))
 
 # Excel Export for Delivery (Only Delivered Items)
+def build_delivery_export(output, args):
+    """Write the delivery workbook to output; returns (filename, order count), or None if nothing was delivered
+
+    args holds the date filter (date, or from/to) as in the request query string.
+    """
+    start, end, date_label = parse_date_range(args)
+    
+    def delivery_items(order_data):
+        """Flatten an order into items carrying the parent delivery charge"""
+        # Handle both consolidated multiple items and individual items
+        if order_data.get('is_multiple_items'):
+            # This is a consolidated multiple items order
+            # Add the parent order's delivery charge to each item
+            parent_delivery_charge = order_data.get('delivery_charge', 0)
+            for item in order_data.get('items', []):
+                # Create a copy of the item with parent delivery info
+                item_copy = item.copy()
+                item_copy['parent_delivery_charge'] = parent_delivery_charge
+                item_copy['is_from_multiple_items'] = True
+                yield item_copy
+        else:
+            # This is a single item order
+            # Add delivery info directly to the item
+            order_data['parent_delivery_charge'] = order_data.get('delivery_charge', 0)
+            order_data['is_from_multiple_items'] = False
+            yield order_data
+    
+    def item_columns(item):
+        """Delivery location, product and price columns for one item"""
+        # Get delivery charge from parent order
+        parent_delivery_charge = item.get('parent_delivery_charge', 0)
+        
+        # Determine delivery location based on delivery charge
+        if parent_delivery_charge == 80:
+            delivery_location = "Inside Dhaka"
+        elif parent_delivery_charge == 130:
+            delivery_location = "Outside Dhaka"
+        elif parent_delivery_charge == 0:
+            delivery_location = "No Delivery"
+        else:
+            delivery_location = f"Custom ({parent_delivery_charge}৳)"
+        
+        # Price information - separate product price, delivery charge, and total
+        # Handle different data structures for single vs multiple items
+        if item.get('is_from_multiple_items'):
+            # This is from a multiple items order - calculate product price
+            product_price = item.get('product_price', 0) * item.get('quantity', 1)
+            # Show parent delivery charge for delivery team reference
+            item_delivery_charge = parent_delivery_charge
+            # For multiple items, show product price + delivery charge for total
+            item_total_price = product_price + parent_delivery_charge
+        else:
+            # This is a single item order - get price directly
+            product_price = item.get('product_total', 0)
+            if product_price == 0:  # Fallback for older data
+                product_price = item.get('total_price', 0) - parent_delivery_charge
+            item_delivery_charge = parent_delivery_charge
+            item_total_price = item.get('total_price', 0)
+        
+        return (
+            delivery_location,
+            item.get('product_name', ''),
+            item.get('product_size', ''),
+            item.get('product_color', ''),
+            item.get('quantity', item.get('item_numbers', 1)),
+            product_price,
+            item_delivery_charge,
+            item_total_price
+        )
+    
+    # Group delivered sales by customer while streaming; groups keep only their item columns
+    grouper = SalesGrouper(window=None, split_multiple_items=False, keep_items=False)
+    order_count = 0
+    # The date range is filtered by Firestore; delivered stays a local check so the
+    # query needs no composite index
+    for order in created_between('sales_orders', start, end).stream():
+        order_data = order.to_dict()
+        
+        # Only include delivered items
+        if not order_data.get('delivered', False):
+            continue
+        
+        order_count += 1
+        customer_group = grouper.add(order_data)
+        customer_rows = customer_group.setdefault('item_rows', [])
+        for item in delivery_items(order_data):
+            if isinstance(item, dict):
+                customer_rows.append(item_columns(item))
+    
+    if not order_count:
+        return None
+    
+    # Headers for delivery export
+    headers = ['Customer Name', 'Phone', 'Address', 'Delivery Location', 'Product Name', 'Size', 'Color', 'Quantity', 'Product Price', 'Delivery Charge', 'Total Price', 'Delivery Date', 'Sold By']
+    groups = grouper.groups(sort_field='delivered_at')
+    
+    def delivery_rows():
+        """One row per item for detailed delivery list (newest delivery first)"""
+        for customer_group in groups:
+            # Delivery information
+            delivery_date = customer_group['delivered_at']
+            if delivery_date:
+                if isinstance(delivery_date, datetime):
+                    delivery_date = delivery_date.strftime('%Y-%m-%d %H:%M')
+                else:
+                    delivery_date = str(delivery_date)
+            else:
+                delivery_date = ''
+            
+            for columns in customer_group['item_rows']:
+                yield (
+                    customer_group['customer_name'],
+                    customer_group['customer_phone'],
+                    customer_group['customer_address'],
+                    *columns,
+                    delivery_date,
+                    customer_group['sold_by']
+                )
+    
+    # Column widths are fitted in a first pass, since write-only sheets cannot be resized later
+    write_xlsx(output, 'Go for Delivery', headers, delivery_rows(),
+               column_widths=fit_column_widths(headers, delivery_rows()))
+    
+    # Generate filename
+    current_date = datetime.now().strftime('%Y-%m-%d')
+    filename = f'delivery_export_{date_label if date_label else current_date}.xlsx'
+    
+    return filename, order_count
+
+def log_delivery_export(order_count, username):
+    activity_data = {
+        'action': 'Delivery Export',
+        'details': f'Exported {order_count} delivered orders to Excel',
+        'user': username,
+        'timestamp': datetime.now()
+    }
+    log_activity(activity_data)
+
+def run_delivery_export_job(job):
+    job.set_progress(0, None, 'Building delivery list')
+    with open(os.path.join(job.folder, 'export.xlsx'), 'w+b') as output:
+        export = build_delivery_export(output, job.params)
+        if export is None:
+            return 'No delivered items found for export.'
+        filename, order_count = export
+    os.replace(output.name, job.result_path(filename))
+    log_delivery_export(order_count, job.created_by)
+    return f'Exported {order_count} delivered orders'
+
 @app.route('/excel_export_delivery')
 @login_required
 @permission_required('sales_customer')
@@ -2473,185 +3010,32 @@ def excel_export_delivery():
         if not check_firebase():
             return redirect(url_for('sales'))
             
-        # Get date filter
-        date_filter = request.args.get('date', '')
-        
-        # Get sales orders - ONLY delivered items
-        sales_ref = db.collection('sales_orders')
-        sales_orders = sales_ref.get()
+        # Get date filter (checked here so a bad date is reported before queueing)
+        date_args = {name: request.args.get(name, '') for name in ('date', 'from', 'to')}
+        parse_date_range(date_args)
         
-        # Filter by delivered status and date if provided
-        delivered_orders = []
-        for order in sales_orders:
-            order_data = order.to_dict()
-            
-            # Only include delivered items
-            if not order_data.get('delivered', False):
-                continue
-                
-            # Filter by date if provided
-            if date_filter:
-                order_date = order_data.get('created_at', datetime.now())
-                if isinstance(order_date, datetime):
-                    if order_date.strftime('%Y-%m-%d') != date_filter:
-                        continue
-                        
-            delivered_orders.append(order_data)
+        # Large exports can run as a background job and be downloaded when ready
+        if request.args.get('background'):
+            job_id = job_queue.submit('excel_export_delivery', date_args,
+                                      created_by=session['username'])
+            return jsonify({'success': True, 'job_id': job_id})
         
-        if not delivered_orders:
+        output = xlsx_file()
+        export = build_delivery_export(output, date_args)
+        if export is None:
+            output.close()
             flash('No delivered items found for export.', 'info')
             return redirect(url_for('sales'))
-        
-        # Create Excel workbook
-        workbook = openpyxl.Workbook()
-        sheet = workbook.active
-        sheet.title = "Go for Delivery"
-        
-        # Headers for delivery export
-        headers = ['Customer Name', 'Phone', 'Address', 'Delivery Location', 'Product Name', 'Size', 'Color', 'Quantity', 'Product Price', 'Delivery Charge', 'Total Price', 'Delivery Date', 'Sold By']
-        for col, header in enumerate(headers, 1):
-            sheet.cell(row=1, column=col, value=header)
-        
-        # Group delivered sales by customer and consolidate all their items
-        grouped_deliveries = {}
-        for order_data in delivered_orders:
-            customer_key = f"{order_data.get('customer_name', '')}|{order_data.get('customer_phone', '')}"
-            if customer_key not in grouped_deliveries:
-                grouped_deliveries[customer_key] = {
-                    'customer_name': order_data.get('customer_name', ''),
-                    'customer_phone': order_data.get('customer_phone', ''),
-                    'customer_address': order_data.get('customer_address', ''),
-                    'sold_by': order_data.get('sold_by', ''),
-                    'delivered_at': order_data.get('delivered_at', ''),
-                    'items': []
-                }
-            
-            # Handle both consolidated multiple items and individual items
-            if order_data.get('is_multiple_items'):
-                # This is a consolidated multiple items order
-                # Add the parent order's delivery charge to each item
-                parent_delivery_charge = order_data.get('delivery_charge', 0)
-                for item in order_data.get('items', []):
-                    # Create a copy of the item with parent delivery info
-                    item_copy = item.copy()
-                    item_copy['parent_delivery_charge'] = parent_delivery_charge
-                    item_copy['is_from_multiple_items'] = True
-                    grouped_deliveries[customer_key]['items'].append(item_copy)
-            else:
-                # This is a single item order
-                # Add delivery info directly to the item
-                order_data['parent_delivery_charge'] = order_data.get('delivery_charge', 0)
-                order_data['is_from_multiple_items'] = False
-                grouped_deliveries[customer_key]['items'].append(order_data)
-        
-        # Sort by delivery date (newest first)
-        grouped_list = list(grouped_deliveries.values())
-        grouped_list.sort(key=lambda x: x['delivered_at'], reverse=True)
-        
-        # Data - One row per item for detailed delivery list
-        row = 2
-        for customer_group in grouped_list:
-            for item in customer_group['items']:
-                if isinstance(item, dict):
-                    # Customer information
-                    sheet.cell(row=row, column=1, value=customer_group['customer_name'])
-                    sheet.cell(row=row, column=2, value=customer_group['customer_phone'])
-                    sheet.cell(row=row, column=3, value=customer_group['customer_address'])
-                    
-                    # Get delivery charge from parent order
-                    parent_delivery_charge = item.get('parent_delivery_charge', 0)
-                    
-                    # Determine delivery location based on delivery charge
-                    if parent_delivery_charge == 80:
-                        delivery_location = "Inside Dhaka"
-                    elif parent_delivery_charge == 130:
-                        delivery_location = "Outside Dhaka"
-                    elif parent_delivery_charge == 0:
-                        delivery_location = "No Delivery"
-                    else:
-                        delivery_location = f"Custom ({parent_delivery_charge}৳)"
-                    sheet.cell(row=row, column=4, value=delivery_location)
-                    
-                    # Product information
-                    sheet.cell(row=row, column=5, value=item.get('product_name', ''))
-                    sheet.cell(row=row, column=6, value=item.get('product_size', ''))
-                    sheet.cell(row=row, column=7, value=item.get('product_color', ''))
-                    sheet.cell(row=row, column=8, value=item.get('quantity', item.get('item_numbers', 1)))
-                    
-                    # Price information - separate product price, delivery charge, and total
-                    # Handle different data structures for single vs multiple items
-                    if item.get('is_from_multiple_items'):
-                        # This is from a multiple items order - calculate product price
-                        product_price = item.get('product_price', 0) * item.get('quantity', 1)
-                        # Show parent delivery charge for delivery team reference
-                        item_delivery_charge = parent_delivery_charge
-                        # For multiple items, show product price + delivery charge for total
-                        item_total_price = product_price + parent_delivery_charge
-                    else:
-                        # This is a single item order - get price directly
-                        product_price = item.get('product_total', 0)
-                        if product_price == 0:  # Fallback for older data
-                            product_price = item.get('total_price', 0) - parent_delivery_charge
-                        item_delivery_charge = parent_delivery_charge
-                        item_total_price = item.get('total_price', 0)
-                    
-                    sheet.cell(row=row, column=9, value=product_price)
-                    sheet.cell(row=row, column=10, value=item_delivery_charge)
-                    sheet.cell(row=row, column=11, value=item_total_price)
-                    
-                    # Delivery information
-                    delivery_date = customer_group['delivered_at']
-                    if delivery_date:
-                        if isinstance(delivery_date, datetime):
-                            sheet.cell(row=row, column=12, value=delivery_date.strftime('%Y-%m-%d %H:%M'))
-                        else:
-                            sheet.cell(row=row, column=12, value=str(delivery_date))
-                    else:
-                        sheet.cell(row=row, column=12, value='')
-                    
-                    sheet.cell(row=row, column=13, value=customer_group['sold_by'])
-                    row += 1
-        
-        # Auto-adjust column widths
-        for column in sheet.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            sheet.column_dimensions[column_letter].width = adjusted_width
-        
-        # Save to memory
-        output = io.BytesIO()
-        workbook.save(output)
-        output.seek(0)
-        
-        # Generate filename
-        current_date = datetime.now().strftime('%Y-%m-%d')
-        filename = f'delivery_export_{date_filter if date_filter else current_date}.xlsx'
+        filename, order_count = export
         
         # Log activity
-        activity_data = {
-            'action': 'Delivery Export',
-            'details': f'Exported {len(delivered_orders)} delivered orders to Excel',
-            'user': session['username'],
-            'timestamp': datetime.now()
-        }
-        if db:
-            db.collection('activities').add(activity_data)
+        log_delivery_export(order_count, session['username'])
         
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=filename,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+        return send_xlsx(output, filename)
         
     except Exception as e:
+        if request.args.get('background'):
+            return jsonify({'success': False, 'message': str(e)})
         flash(f'Error exporting delivery list: {str(e)}', 'error')
         return redirect(url_for('sales'))
 
@@ -2661,28 +3045,16 @@ def excel_export_delivery():
 @permission_required('sales_customer')
 def excel_export_to_production():
     try:
-        # Get date filter
-        date_filter = request.args.get('date', '')
-        
-        # Get sales orders
-        sales_ref = db.collection('sales_orders')
-        sales_orders = sales_ref.get()
-        
-        # Filter by date if provided
-        filtered_orders = []
-        for order in sales_orders:
-            order_data = order.to_dict()
-            if date_filter:
-                order_date = order_data.get('created_at', datetime.now())
-                if isinstance(order_date, datetime):
-                    if order_date.strftime('%Y-%m-%d') != date_filter:
-                        continue
-            filtered_orders.append(order_data)
+        # Get date filter; only orders in the range are read from Firestore
+        start, end, date_label = parse_date_range(request.args)
         
         # Group products by their characteristics and sum quantities
         product_groups = {}
         
-        for order_data in filtered_orders:
+        # Sales orders are streamed and folded into product_groups one at a time
+        for order in created_between('sales_orders', start, end).stream():
+            order_data = order.to_dict()
+            
             # Handle both consolidated multiple items and individual items
             items_to_process = []
             
@@ -2728,49 +3100,35 @@ def excel_export_to_production():
                 if item_numbers:
                     product_groups[product_key]['item_numbers'].append(item_numbers)
         
-        # Create Excel workbook
-        workbook = openpyxl.Workbook()
-        sheet = workbook.active
-        sheet.title = "Production Export"
-        
         # Headers for production export
         headers = ['Product Name', 'Product Category', 'Product Color', 'Product Size', 
                    'Body Size', 'Waist Size', 'Length', 'Item Numbers', 'Total Quantity']
-        for col, header in enumerate(headers, 1):
-            sheet.cell(row=1, column=col, value=header)
         
         # Sort products by name, then by size, then by color for better organization
         sorted_products = sorted(product_groups.values(), 
                                key=lambda x: (x['product_name'], x['product_category'], 
                                             x['product_size'], x['product_color']))
         
-        # Add data
-        row = 2
-        for product_data in sorted_products:
-            sheet.cell(row=row, column=1, value=product_data['product_name'])
-            sheet.cell(row=row, column=2, value=product_data['product_category'])
-            sheet.cell(row=row, column=3, value=product_data['product_color'])
-            sheet.cell(row=row, column=4, value=product_data['product_size'])
-            sheet.cell(row=row, column=5, value=product_data['product_body_size'])
-            sheet.cell(row=row, column=6, value=product_data['product_waist_size'])
-            sheet.cell(row=row, column=7, value=product_data['product_length'])
-            sheet.cell(row=row, column=8, value=', '.join(product_data['item_numbers']) if product_data['item_numbers'] else '')
-            sheet.cell(row=row, column=9, value=product_data['total_quantity'])
-            row += 1
-        
-        # Save to BytesIO
-        output = io.BytesIO()
-        workbook.save(output)
-        output.seek(0)
-        
-        filename = f'production_export_{date_filter if date_filter else "all"}.xlsx'
-        
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
+        rows = (
+            (
+                product_data['product_name'],
+                product_data['product_category'],
+                product_data['product_color'],
+                product_data['product_size'],
+                product_data['product_body_size'],
+                product_data['product_waist_size'],
+                product_data['product_length'],
+                ', '.join(product_data['item_numbers']) if product_data['item_numbers'] else '',
+                product_data['total_quantity']
+            )
+            for product_data in sorted_products
         )
+        output = xlsx_file()
+        write_xlsx(output, 'Production Export', headers, rows)
+        
+        filename = f'production_export_{date_label if date_label else "all"}.xlsx'
+        
+        return send_xlsx(output, filename)
         
     except Exception as e:
         flash(f'Error exporting to production: {str(e)}', 'error')
@@ -2911,12 +3269,13 @@ def create_multiple_sale():
         }
         
         # Add the consolidated sale record
-        db.collection('sales_orders').add(sale_data)
+        sale_ref = db.collection('sales_orders').document()
+        commit_sale_change(sale_ref, after=sale_data)
+        customer_index.note_sale(sale_ref.id, sale_data)
             
         
         # Invalidate cache
-        cache['sales_orders']['data'] = None
-        cache['products']['data'] = None
+        invalidate_cache('sales_orders', 'products', 'dashboard_stats')
         
         # Log activity
         activity_data = {
@@ -2925,7 +3284,7 @@ def create_multiple_sale():
             'user': session['username'],
             'timestamp': datetime.now()
         }
-        db.collection('activities').add(activity_data)
+        log_activity(activity_data)
         
         flash(f'Multiple sale completed successfully! {len(selected_products)} items - Total: ৳{grand_total}', 'success')
         
@@ -2940,16 +3299,24 @@ def create_multiple_sale():
 @permission_required('sales_customer')
 def mark_sale_returned(sale_id):
     try:
-        # Update the sale status to returned
+        # Update the sale status to returned, unless it already is (e.g. a double submit)
+        def mark_returned(stored):
+            if stored.get('status') == 'returned':
+                return None
+            return {
+                'status': 'returned',
+                'returned_at': datetime.now(),
+                'returned_by': session['username']
+            }
+        
         sale_ref = db.collection('sales_orders').document(sale_id)
-        sale_ref.update({
-            'status': 'returned',
-            'returned_at': datetime.now(),
-            'returned_by': session['username']
-        })
+        sale_data = commit_sale_change(sale_ref, updates=mark_returned)
+        if sale_data is None:
+            flash('Sale not found or already returned', 'error')
+            return redirect(url_for('sales'))
         
         # Invalidate sales cache to reflect changes immediately
-        cache['sales_orders']['data'] = None
+        invalidate_cache('sales_orders', 'dashboard_stats')
         
         # Log activity
         activity_data = {
@@ -2958,7 +3325,7 @@ def mark_sale_returned(sale_id):
             'user': session['username'],
             'timestamp': datetime.now()
         }
-        db.collection('activities').add(activity_data)
+        log_activity(activity_data)
         
         flash('Sale marked as returned successfully!', 'success')
         
@@ -2973,18 +3340,26 @@ def mark_sale_returned(sale_id):
 @permission_required('sales_customer')
 def undo_sale_return(sale_id):
     try:
-        # Update the sale status back to completed
+        # Update the sale status back to completed, if it is still returned
+        def undo_return(stored):
+            if stored.get('status') != 'returned':
+                return None
+            return {
+                'status': 'completed',
+                'returned_at': None,
+                'returned_by': None,
+                'updated_at': datetime.now(),
+                'updated_by': session['username']
+            }
+        
         sale_ref = db.collection('sales_orders').document(sale_id)
-        sale_ref.update({
-            'status': 'completed',
-            'returned_at': None,
-            'returned_by': None,
-            'updated_at': datetime.now(),
-            'updated_by': session['username']
-        })
+        sale_data = commit_sale_change(sale_ref, updates=undo_return)
+        if sale_data is None:
+            flash('Sale not found or not returned', 'error')
+            return redirect(url_for('sales'))
         
         # Invalidate sales cache to reflect changes immediately
-        cache['sales_orders']['data'] = None
+        invalidate_cache('sales_orders', 'dashboard_stats')
         
         # Log activity
         activity_data = {
@@ -2993,7 +3368,7 @@ def undo_sale_return(sale_id):
             'user': session['username'],
             'timestamp': datetime.now()
         }
-        db.collection('activities').add(activity_data)
+        log_activity(activity_data)
         
         flash('Sale return undone successfully!', 'success')
         
@@ -3028,7 +3403,7 @@ def toggle_emergency_delivery(sale_id):
         })
         
         # Invalidate sales cache to reflect changes immediately
-        cache['sales_orders']['data'] = None
+        invalidate_cache('sales_orders')
         
         # Log activity
         activity_data = {
@@ -3037,7 +3412,7 @@ def toggle_emergency_delivery(sale_id):
             'user': session['username'],
             'timestamp': datetime.now()
         }
-        db.collection('activities').add(activity_data)
+        log_activity(activity_data)
         
         return jsonify({
             'success': True, 
@@ -3054,28 +3429,26 @@ def toggle_emergency_delivery(sale_id):
 @permission_required('sales_customer')
 def toggle_delivered(sale_id):
     try:
-        # Get current sale data
+        # Toggle delivered status, from the sale as read in the transaction
+        def toggle(stored):
+            delivered = not stored.get('delivered', False)
+            return {
+                'delivered': delivered,
+                'delivered_at': datetime.now() if delivered else None,
+                'updated_at': datetime.now(),
+                'updated_by': session['username']
+            }
+        
         sale_ref = db.collection('sales_orders').document(sale_id)
-        sale_doc = sale_ref.get()
+        sale_data = commit_sale_change(sale_ref, updates=toggle)
         
-        if not sale_doc.exists:
+        if sale_data is None:
             return jsonify({'success': False, 'message': 'Sale not found'})
         
-        sale_data = sale_doc.to_dict()
-        current_delivered = sale_data.get('delivered', False)
-        
-        # Toggle delivered status
-        new_delivered_status = not current_delivered
-        
-        sale_ref.update({
-            'delivered': new_delivered_status,
-            'delivered_at': datetime.now() if new_delivered_status else None,
-            'updated_at': datetime.now(),
-            'updated_by': session['username']
-        })
+        new_delivered_status = not sale_data.get('delivered', False)
         
         # Invalidate sales cache to reflect changes immediately
-        cache['sales_orders']['data'] = None
+        invalidate_cache('sales_orders', 'dashboard_stats')
         
         # Log activity
         activity_data = {
@@ -3084,7 +3457,7 @@ def toggle_delivered(sale_id):
             'user': session['username'],
             'timestamp': datetime.now()
         }
-        db.collection('activities').add(activity_data)
+        log_activity(activity_data)
         
         return jsonify({
             'success': True, 
@@ -3158,12 +3531,7 @@ def edit_sale(sale_id):
                 if not data.get(field):
                     return jsonify({'success': False, 'message': f'{field.replace("_", " ").title()} is required'})
             
-            # Get current sale data
             sale_ref = db.collection('sales_orders').document(sale_id)
-            sale_doc = sale_ref.get()
-            
-            if not sale_doc.exists:
-                return jsonify({'success': False, 'message': 'Sale not found'})
             
             # Get product details
             product_ref = db.collection('products').document(data['product_id'])
@@ -3198,10 +3566,13 @@ def edit_sale(sale_id):
                 'updated_by': session['username']
             }
             
-            sale_ref.update(update_data)
+            sale_data = commit_sale_change(sale_ref, updates=update_data)
+            if sale_data is None:
+                return jsonify({'success': False, 'message': 'Sale not found'})
+            customer_index.replace_sale(sale_data, update_data)
             
             # Invalidate sales cache
-            cache['sales_orders']['data'] = None
+            invalidate_cache('sales_orders', 'dashboard_stats')
             
             # Log activity
             activity_data = {
@@ -3210,7 +3581,7 @@ def edit_sale(sale_id):
                 'user': session['username'],
                 'timestamp': datetime.now()
             }
-            db.collection('activities').add(activity_data)
+            log_activity(activity_data)
             
             return jsonify({
                 'success': True, 
@@ -3226,22 +3597,19 @@ def edit_sale(sale_id):
 @permission_required('sales_customer')
 def delete_sale(sale_id):
     try:
-        # Get sale data before deletion for logging
+        # Delete the sale; the deleted data is kept for logging
         sale_ref = db.collection('sales_orders').document(sale_id)
-        sale_doc = sale_ref.get()
+        sale_data = commit_sale_change(sale_ref)
         
-        if not sale_doc.exists:
+        if sale_data is None:
             return jsonify({'success': False, 'message': 'Sale not found'})
         
-        sale_data = sale_doc.to_dict()
         customer_name = sale_data.get('customer_name', 'Unknown')
         product_name = sale_data.get('product_name', 'Unknown')
-        
-        # Delete the sale
-        sale_ref.delete()
+        customer_index.forget_sale(sale_data)
         
         # Invalidate sales cache
-        cache['sales_orders']['data'] = None
+        invalidate_cache('sales_orders', 'dashboard_stats')
         
         # Log activity
         activity_data = {
@@ -3250,7 +3618,7 @@ def delete_sale(sale_id):
             'user': session['username'],
             'timestamp': datetime.now()
         }
-        db.collection('activities').add(activity_data)
+        log_activity(activity_data)
         
         return jsonify({
             'success': True, 
@@ -3272,71 +3640,32 @@ def get_customer_history():
         if not customer_name and not customer_phone:
             return jsonify({'error': 'Name or phone required'})
         
-        # Query sales orders for this customer
-        sales_ref = db.collection('sales_orders')
-        
-        # Build query based on available parameters
-        if customer_name and customer_phone:
-            # Query by both name and phone
-            name_query = sales_ref.where('customer_name', '==', customer_name)
-            phone_query = sales_ref.where('customer_phone', '==', customer_phone)
-            
-            # Get results from both queries
-            name_results = name_query.stream()
-            phone_results = phone_query.stream()
-            
-            # Combine and deduplicate results
-            all_sales = {}
-            for doc in name_results:
-                all_sales[doc.id] = doc.to_dict()
-            for doc in phone_results:
-                all_sales[doc.id] = doc.to_dict()
-                
-        elif customer_name:
-            name_query = sales_ref.where('customer_name', '==', customer_name)
-            all_sales = {doc.id: doc.to_dict() for doc in name_query.stream()}
-            
-        elif customer_phone:
-            phone_query = sales_ref.where('customer_phone', '==', customer_phone)
-            all_sales = {doc.id: doc.to_dict() for doc in phone_query.stream()}
+        # One summary document per customer holds the counts and newest orders
+        summary = customer_summaries.get(customer_name, customer_phone) or {}
         
-        # Process results
         history = []
-        total_orders = 0
-        total_returned = 0
-        last_order_date = None
-        
-        for sale_id, sale_data in all_sales.items():
-            total_orders += 1
-            if sale_data.get('status') == 'returned':
-                total_returned += 1
-            
-            order_date = sale_data.get('created_at')
-            if order_date and (not last_order_date or order_date > last_order_date):
-                last_order_date = order_date
-            
+        for order in summary.get('recent_orders', []):
+            order_date = order.get('created_at')
             history.append({
-                'id': sale_id,
-                'product_name': sale_data.get('product_name', ''),
-                'product_category': sale_data.get('product_category', ''),
-                'product_color': sale_data.get('product_color', ''),
-                'product_size': sale_data.get('product_size', ''),
-                'quantity': sale_data.get('quantity', 0),
-                'total_price': sale_data.get('total_price', 0),
-                'status': sale_data.get('status', 'completed'),
+                'id': order['id'],
+                'product_name': order.get('product_name') or '',
+                'product_category': order.get('product_category') or '',
+                'product_color': order.get('product_color') or '',
+                'product_size': order.get('product_size') or '',
+                'quantity': order.get('quantity') or 0,
+                'total_price': order.get('total_price') or 0,
+                'status': order.get('status', 'completed'),
                 'order_date': order_date.strftime('%Y-%m-%d %H:%M') if order_date else 'N/A',
-                'returned_at': sale_data.get('returned_at').strftime('%Y-%m-%d %H:%M') if sale_data.get('returned_at') else None
+                'returned_at': order.get('returned_at').strftime('%Y-%m-%d %H:%M') if order.get('returned_at') else None
             })
         
-        # Sort by date (newest first)
-        history.sort(key=lambda x: x['order_date'], reverse=True)
-        
+        last_order_date = summary.get('last_order_date')
         return jsonify({
             'success': True,
-            'total_orders': total_orders,
-            'total_returned': total_returned,
+            'total_orders': summary.get('total_orders', 0),
+            'total_returned': summary.get('total_returned', 0),
             'last_order_date': last_order_date.strftime('%Y-%m-%d') if last_order_date else None,
-            'history': history[:10]  # Limit to last 10 orders
+            'history': history  # Newest orders first
         })
         
     except Exception as e:
@@ -3348,68 +3677,40 @@ def get_customer_history():
 @permission_required('sales_customer')
 def get_returned_customers():
     try:
-        # Get all returned sales
-        sales_ref = db.collection('sales_orders')
-        returned_sales = sales_ref.where('status', '==', 'returned').get()
+        sort = request.args.get('sort', 'last_return')
+        limit = int(request.args.get('limit', RETURNS_PAGE_SIZE))
         
-        # Group by customer
-        returned_customers = {}
-        for sale_doc in returned_sales:
-            sale_data = sale_doc.to_dict()
-            customer_key = f"{sale_data.get('customer_name', '')}|{sale_data.get('customer_phone', '')}"
-            
-            if customer_key not in returned_customers:
-                returned_customers[customer_key] = {
-                    'customer_name': sale_data.get('customer_name', ''),
-                    'customer_phone': sale_data.get('customer_phone', ''),
-                    'customer_address': sale_data.get('customer_address', ''),
-                    'total_returned_items': 0,
-                    'total_returned_value': 0,
-                    'returned_items': [],
-                    'first_return_date': None,
-                    'last_return_date': None
-                }
-            
-            customer = returned_customers[customer_key]
-            customer['total_returned_items'] += 1
-            customer['total_returned_value'] += sale_data.get('total_price', 0)
-            
-            return_date = sale_data.get('returned_at')
-            if return_date:
-                if not customer['first_return_date'] or return_date < customer['first_return_date']:
-                    customer['first_return_date'] = return_date
-                if not customer['last_return_date'] or return_date > customer['last_return_date']:
-                    customer['last_return_date'] = return_date
-            
-            customer['returned_items'].append({
-                'id': sale_doc.id,
-                'product_name': sale_data.get('product_name', ''),
-                'product_category': sale_data.get('product_category', ''),
-                'product_color': sale_data.get('product_color', ''),
-                'product_size': sale_data.get('product_size', ''),
-                'quantity': sale_data.get('quantity', 0),
-                'item_numbers': sale_data.get('item_numbers', ''),
-                'total_price': sale_data.get('total_price', 0),
-                'returned_at': return_date,
-                'returned_by': sale_data.get('returned_by', ''),
-                'original_order_date': sale_data.get('created_at')
-            })
-        
-        # Convert to list and sort by last return date (newest first)
-        returned_list = list(returned_customers.values())
-        returned_list.sort(key=lambda x: x['last_return_date'] or datetime.min, reverse=True)
+        # One page of the per-customer returns index, plus the overall totals
+        returned_list, next_cursor = returns_index.page(sort, limit, request.args.get('after'))
+        totals = returns_index.totals()
         
         return jsonify({
             'success': True,
             'returned_customers': returned_list,
-            'total_returned_customers': len(returned_list),
-            'total_returned_items': sum(customer['total_returned_items'] for customer in returned_list),
-            'total_returned_value': sum(customer['total_returned_value'] for customer in returned_list)
+            'next_cursor': next_cursor,
+            'sort': sort,
+            'total_returned_customers': totals.get('customers', 0),
+            'total_returned_items': totals.get('items', 0),
+            'total_returned_value': totals.get('value', 0)
         })
         
     except Exception as e:
         return jsonify({'error': str(e)})
 
+# Get All Returned Items of One Customer (the index keeps only the newest)
+@app.route('/get_returned_items/<customer_id>')
+@login_required
+@permission_required('sales_customer')
+def get_returned_items(customer_id):
+    try:
+        items = returns_index.items(customer_id)
+        if items is None:
+            return jsonify({'success': False, 'message': 'Customer not found'})
+        return jsonify({'success': True, 'returned_items': items})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)})
+
 # Search Customers for Autocomplete
 @app.route('/search_customers')
 @login_required
@@ -3421,43 +3722,67 @@ def search_customers():
         if len(query) < 2:  # Minimum 2 characters
             return jsonify({'customers': []})
         
-        # Get all sales orders to extract unique customers
-        sales_ref = db.collection('sales_orders')
-        sales_orders = sales_ref.get()
-        
-        # Create a set of unique customers
-        customers_set = set()
-        for order in sales_orders:
-            order_data = order.to_dict()
-            customer_name = order_data.get('customer_name', '').strip()
-            customer_phone = order_data.get('customer_phone', '').strip()
-            
-            if customer_name or customer_phone:
-                customers_set.add((customer_name, customer_phone))
-        
-        # Filter customers based on query
-        matching_customers = []
-        for name, phone in customers_set:
-            if (query in name.lower() or query in phone.lower()):
-                matching_customers.append({
-                    'name': name,
-                    'phone': phone
-                })
-        
-        # Sort by name
-        matching_customers.sort(key=lambda x: x['name'].lower())
-        
-        # Limit to 10 results
-        return jsonify({'customers': matching_customers[:10]})
+        # Ranked prefix and substring matches on name and phone, from memory
+        return jsonify({'customers': customer_index.search(query, limit=10)})
         
     except Exception as e:
         return jsonify({'error': str(e)})
 
+# Background job status and downloads
+def get_visible_job(job_id):
+    """A job the current user may see (their own, or any job for admins)"""
+    job = job_queue.get(job_id)
+    if job and (job['created_by'] == session.get('username') or session.get('role') == 'admin'):
+        return job
+    return None
+
+def job_summary(job):
+    """Status fields reported for a job by the status endpoints"""
+    return {
+        'success': True,
+        'job_id': job['id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'progress': job['progress'],
+        'total': job['total'],
+        'message': job['message'] or job['error'] or '',
+        'created_at': job['created_at'],
+        'updated_at': job['updated_at'],
+        'download_url': url_for('job_download', job_id=job['id']) if job['result_file'] else None
+    }
+
+@app.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    job = get_visible_job(job_id)
+    if not job:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    return jsonify(job_summary(job))
+
+@app.route('/jobs/<job_id>/download')
+@login_required
+def job_download(job_id):
+    job = get_visible_job(job_id)
+    if not job or not job['result_file'] or not os.path.exists(job['result_file']):
+        flash('Export file is not available.', 'error')
+        return redirect(url_for('dashboard'))
+    return send_file(job['result_file'], as_attachment=True, download_name=job['download_name'])
+
+job_queue.register('excel_import', run_excel_import_job)
+job_queue.register('excel_import_production', run_production_import_job)
+job_queue.register('excel_export_delivery', run_delivery_export_job)
+job_queue.register('generate_missing_qr_codes', run_qr_generation_job)
+job_queue.register('hard_reset', run_hard_reset_job)
+
 # Handle service worker requests to prevent 404 logs
 @app.route('/sw.js')
 def service_worker():
     return '', 204  # No Content response
 
 if __name__ == '__main__':
+    import sys
+    if '--profile-startup' in sys.argv:
+        sys.exit(startup.profile_startup())
+    create_app()
     port = int(os.environ.get('PORT', 5003))
     app.run(debug=False, host='0.0.0.0', port=port)
@@ -0,0 +1,90 @@
+"""
+Barcode lookup index for THEO Clothing Inventory
+
+Maps barcodes to products in memory so scanner lookups do not query
+Firestore. The map is built from the cached product list (TTL cache or
+listener mirror) and rebuilt whenever that cache hands out a new list, which
+happens after every products invalidation in any worker. Product routes in
+this worker also update it directly with put() and remove().
+
+Barcodes that are not in the map are looked up in Firestore with 'in' queries
+of up to IN_QUERY_LIMIT values. Barcodes that are still not found are
+remembered as missing until the product list changes.
+"""
+
+import threading
+
+IN_QUERY_LIMIT = 30  # values per Firestore 'in' filter
+
+
+class BarcodeIndex:
+    """Barcode -> product dict for one worker"""
+
+    def __init__(self, db):
+        self.db = db
+        self.lock = threading.Lock()
+        self._source = None  # the cached product list the map was built from
+        self._products = {}  # barcode -> product dict (with 'id')
+        self._barcodes = {}  # product id -> barcode
+        self._missing = set()
+
+    def refresh(self, products):
+        """Rebuild the map if products is not the list it was built from"""
+        if products is self._source:
+            return
+        by_barcode, by_id = {}, {}
+        for product in products:
+            barcode = product.get('barcode')
+            if barcode:
+                by_barcode[barcode] = product
+                by_id[product['id']] = barcode
+        with self.lock:
+            self._source = products
+            self._products = by_barcode
+            self._barcodes = by_id
+            self._missing = set()
+
+    def put(self, product_id, product_data):
+        """Add or replace a product saved by this worker"""
+        product = {**product_data, 'id': product_id}
+        with self.lock:
+            old_barcode = self._barcodes.pop(product_id, None)
+            if old_barcode:
+                self._products.pop(old_barcode, None)
+            barcode = product.get('barcode')
+            if barcode:
+                self._products[barcode] = product
+                self._barcodes[product_id] = barcode
+                self._missing.discard(barcode)
+
+    def remove(self, product_id):
+        """Drop a product deleted by this worker"""
+        with self.lock:
+            barcode = self._barcodes.pop(product_id, None)
+            if barcode:
+                self._products.pop(barcode, None)
+
+    def lookup(self, barcodes):
+        """Products for many barcodes as {barcode: product}; unknown barcodes are left out"""
+        found = {}
+        unknown = []
+        with self.lock:
+            for barcode in barcodes:
+                product = self._products.get(barcode)
+                if product is not None:
+                    found[barcode] = product
+                elif barcode not in self._missing and barcode not in unknown:
+                    unknown.append(barcode)
+        for start in range(0, len(unknown), IN_QUERY_LIMIT):
+            chunk = unknown[start:start + IN_QUERY_LIMIT]
+            for doc in self.db.collection('products').where('barcode', 'in', chunk).get():
+                product_data = doc.to_dict()
+                found.setdefault(product_data['barcode'], {**product_data, 'id': doc.id})
+                self.put(doc.id, product_data)
+        with self.lock:
+            self._missing.update(barcode for barcode in unknown if barcode not in found)
+        return found
+
+    def get(self, barcode):
+        """The product with a barcode, or None"""
+        return self.lookup([barcode]).get(barcode)
@@ -0,0 +1,177 @@
+"""
+Chunked Firestore writes for THEO Clothing Inventory
+
+Commits large numbers of document writes through WriteBatch in chunks of at
+most 500 operations (the Firestore limit), optionally committing chunks
+concurrently from a thread pool. Every document reference is fixed before the
+first attempt, so a failed chunk can be retried, or a whole import re-run,
+without writing the same row twice.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+MAX_BATCH_SIZE = 500  # Firestore limit on operations per batch
+
+
+def chunked(items, size):
+    """Split a list into consecutive chunks of at most size items"""
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+class ChunkResult:
+    """Outcome of one committed (or failed) chunk"""
+
+    def __init__(self, index, start, count):
+        self.index = index
+        self.start = start
+        self.count = count
+        self.written = 0
+        self.skipped = 0
+        self.attempts = 0
+        self.error = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class BatchResult:
+    """Totals over all chunks of a BatchWriter run"""
+
+    def __init__(self, chunks):
+        self.chunks = sorted(chunks, key=lambda chunk: chunk.index)
+
+    @property
+    def written(self):
+        return sum(chunk.written for chunk in self.chunks)
+
+    @property
+    def skipped(self):
+        return sum(chunk.skipped for chunk in self.chunks)
+
+    @property
+    def failed(self):
+        return [chunk for chunk in self.chunks if not chunk.ok]
+
+
+class BatchWriter:
+    """Writes (reference, data) pairs through chunked WriteBatch commits
+
+    chunk_size: operations per batch, capped at MAX_BATCH_SIZE.
+    max_workers: chunks committed concurrently; 1 commits them in order.
+    max_attempts: commits tried per chunk before it is reported as failed.
+    progress: optional callback(chunk_result, completed_chunks, total_chunks).
+    before_commit: optional callback(batch, writes) that adds operations which
+    must commit together with a chunk's writes (e.g. counter updates); leave
+    room for them in chunk_size.
+    """
+
+    def __init__(self, db, chunk_size=MAX_BATCH_SIZE, max_workers=1, max_attempts=3,
+                 retry_delay=1.0, progress=None, before_commit=None):
+        self.db = db
+        self.chunk_size = max(1, min(chunk_size, MAX_BATCH_SIZE))
+        self.max_workers = max(1, max_workers)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay = retry_delay
+        self.progress = progress
+        self.before_commit = before_commit
+
+    def create(self, writes):
+        """Create documents, skipping any that already exist
+
+        The first attempt of each chunk uses batch.create(), which fails as a
+        whole if a document exists. Retries first read which references are
+        already present and only create the rest.
+        """
+        return self._run(writes, self._create_chunk)
+
+    def set(self, writes, merge=False):
+        """Set documents; repeating a chunk rewrites the same documents"""
+        return self._run(writes, lambda chunk, result: self._set_chunk(chunk, result, merge))
+
+    def update(self, writes):
+        """Apply field updates to existing documents"""
+        return self._run(writes, self._update_chunk)
+
+    def delete(self, references):
+        """Delete documents; deleting a missing document is a no-op"""
+        return self._run([(reference, None) for reference in references], self._delete_chunk)
+
+    def _create_chunk(self, chunk, result):
+        if result.attempts > 1:
+            existing = {snapshot.id for snapshot in self.db.get_all([reference for reference, _ in chunk])
+                        if snapshot.exists}
+            result.skipped = len(existing)
+            chunk = [(reference, data) for reference, data in chunk if reference.id not in existing]
+        if chunk:
+            batch = self.db.batch()
+            for reference, data in chunk:
+                batch.create(reference, data)
+            self._commit_batch(batch, chunk)
+        result.written = len(chunk)
+
+    def _set_chunk(self, chunk, result, merge):
+        batch = self.db.batch()
+        for reference, data in chunk:
+            batch.set(reference, data, merge=merge)
+        self._commit_batch(batch, chunk)
+        result.written = len(chunk)
+
+    def _update_chunk(self, chunk, result):
+        batch = self.db.batch()
+        for reference, data in chunk:
+            batch.update(reference, data)
+        self._commit_batch(batch, chunk)
+        result.written = len(chunk)
+
+    def _delete_chunk(self, chunk, result):
+        batch = self.db.batch()
+        for reference, _ in chunk:
+            batch.delete(reference)
+        self._commit_batch(batch, chunk)
+        result.written = len(chunk)
+
+    def _commit_batch(self, batch, chunk):
+        if self.before_commit:
+            self.before_commit(batch, chunk)
+        batch.commit()
+
+    def _commit(self, index, start, chunk, write_chunk):
+        result = ChunkResult(index, start, len(chunk))
+        while result.attempts < self.max_attempts:
+            result.attempts += 1
+            try:
+                write_chunk(chunk, result)
+                result.error = None
+                break
+            except Exception as e:
+                result.error = str(e)
+                print(f"Batch chunk {index + 1} attempt {result.attempts} failed: {e}")
+                if result.attempts < self.max_attempts:
+                    time.sleep(self.retry_delay * result.attempts)
+        return result
+
+    def _run(self, writes, write_chunk):
+        writes = list(writes)
+        chunks = chunked(writes, self.chunk_size)
+        total = len(chunks)
+        results = []
+
+        def finished(result):
+            results.append(result)
+            if self.progress:
+                self.progress(result, len(results), total)
+
+        if self.max_workers == 1 or total <= 1:
+            for index, chunk in enumerate(chunks):
+                finished(self._commit(index, index * self.chunk_size, chunk, write_chunk))
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, total)) as executor:
+                futures = [
+                    executor.submit(self._commit, index, index * self.chunk_size, chunk, write_chunk)
+                    for index, chunk in enumerate(chunks)
+                ]
+                for future in as_completed(futures):
+                    finished(future.result())
+        return BatchResult(results)
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+Benchmark: hot endpoints against the in-memory Firestore stand-in
+
+Seeds the local memory backend with a synthetic catalogue and sales history
+(legacy single-item orders mixed with is_multiple_items orders) and drives
+the sales, products, customer and returns endpoints and the five Excel
+exports through Flask's test client. For every endpoint it reports:
+
+  - median cold latency (TTL caches invalidated before each of --cold-runs
+    requests) and median warm latency
+  - Firestore documents read, from the X-Firestore-Usage header
+  - growth of the process's peak RSS while the endpoint ran
+
+Each scale runs in its own interpreter so peak RSS and the app's module
+state start fresh. Results are compared against a baseline JSON; reads
+above the baseline, or latency / RSS beyond the tolerance, are reported as
+regressions and the run exits with status 1. Latency is only compared as
+medians, so one slow request (a lazy import, a GC pause) does not fail it.
+
+Usage: python benchmarks/bench_endpoints.py [--scales small,medium]
+       python benchmarks/bench_endpoints.py --scales small --save-baseline
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline_endpoints.json')
+
+# (products, sales orders)
+SCALES = {
+    'small': (1000, 10000),
+    'medium': (10000, 100000),
+    'large': (50000, 500000),
+}
+
+# Latency, RSS growth and reads within these margins of the baseline are noise
+# (background threads such as the activity logger occasionally land a read in a request)
+LATENCY_FLOOR_MS = 5.0
+RSS_FLOOR_MB = 5.0
+READS_FLOOR = 5
+
+CATEGORIES = ['Shirt', 'Pant', 'Panjabi', 'Kurta', 'Blazer', 'T-Shirt']
+SIZES = ['S', 'M', 'L', 'XL', 'XXL']
+COLORS = ['Black', 'White', 'Navy', 'Red', 'Olive', 'Grey']
+
+RESULT_PREFIX = 'BENCH_RESULT '
+
+
+def endpoints(customer_name, customer_phone):
+    """(label, url, is_export) for every benchmarked endpoint"""
+    return [
+        ('sales', '/sales', False),
+        ('products', '/products', False),
+        ('search_customers', f'/search_customers?q={customer_name[:5].lower()}', False),
+        ('get_customer_history', f'/get_customer_history?name={customer_name}&phone={customer_phone}', False),
+        ('get_returned_customers', '/get_returned_customers', False),
+        ('excel_export', '/excel_export', True),
+        ('excel_export_sales', '/excel_export_sales', True),
+        ('excel_export_delivery', '/excel_export_delivery', True),
+        ('excel_export_production', '/excel_export_production', True),
+        ('excel_export_to_production', '/excel_export_to_production', True),
+    ]
+
+
+def peak_rss_mb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def generate_products(count, rng):
+    products = []
+    for index in range(count):
+        products.append({
+            'name': f'Product {index}',
+            'category': rng.choice(CATEGORIES),
+            'size': rng.choice(SIZES),
+            'color': rng.choice(COLORS),
+            'price': float(rng.randint(300, 5000)),
+            'body_size': str(rng.randint(36, 48)),
+            'waist_size': '',
+            'length': str(rng.randint(26, 44)),
+            'description': '',
+            'barcode': f'PROD_{index:012d}',
+            'image_url': '',
+            'qr_code_url': '',
+        })
+    return products
+
+
+def sale_item(product_id, product, quantity):
+    return {
+        'product_id': product_id,
+        'product_name': product['name'],
+        'product_category': product['category'],
+        'product_size': product['size'],
+        'product_body_size': product['body_size'],
+        'product_waist_size': product['waist_size'],
+        'product_length': product['length'],
+        'product_color': product['color'],
+        'product_price': product['price'],
+        'item_numbers': ','.join(str(number) for number in range(1, quantity + 1)),
+        'quantity': quantity,
+        'item_total': product['price'] * quantity,
+    }
+
+
+def generate_sales(count, products, rng):
+    """~8 orders per customer over a year; 30% consolidated multi-item orders, 5% returned"""
+    customers = [(f'Customer {index}', f'01{index:09d}') for index in range(max(count // 8, 1))]
+    start = datetime.now() - timedelta(days=365)
+    sales = []
+    for index in range(count):
+        name, phone = rng.choice(customers)
+        created_at = start + timedelta(seconds=rng.randint(0, 365 * 24 * 3600))
+        delivered = rng.random() < 0.7
+        returned = rng.random() < 0.05
+        order = {
+            'customer_name': name,
+            'customer_phone': phone,
+            'customer_address': f'House {index % 500}, Road {index % 40}',
+            'sold_by': 'admin',
+            'created_at': created_at,
+            'delivered': delivered,
+            'delivered_at': created_at + timedelta(days=2) if delivered else None,
+            'status': 'returned' if returned else 'completed',
+            'notes': '',
+            'delivery_charge': 80,
+        }
+        if returned:
+            order.update(returned_at=created_at + timedelta(days=5), returned_by='admin')
+        picks = [rng.randrange(len(products)) for _ in range(rng.randint(2, 4))]
+        if rng.random() < 0.3:
+            items = [sale_item(f'p{pick:06d}', products[pick], rng.randint(1, 3)) for pick in picks]
+            product_total = sum(item['item_total'] for item in items)
+            order.update({
+                'order_id': f'order{index:07d}',
+                'is_multiple_items': True,
+                'order_type': 'multiple_consolidated',
+                'items': items,
+                'product_total': product_total,
+                'total_price': product_total + 80,
+                'total_items': len(items),
+                'total_quantity': sum(item['quantity'] for item in items),
+            })
+        else:
+            item = sale_item(f'p{picks[0]:06d}', products[picks[0]], rng.randint(1, 3))
+            order.update(item)
+            order.pop('item_total')
+            order.update(product_total=item['item_total'], total_price=item['item_total'] + 80,
+                         emergency_delivery=False)
+        sales.append(order)
+    return sales, customers
+
+
+def generate_production_orders(count, products, rng):
+    orders = []
+    start = datetime.now() - timedelta(days=365)
+    for index in range(count):
+        pick = rng.randrange(len(products))
+        product = products[pick]
+        created_at = start + timedelta(seconds=rng.randint(0, 365 * 24 * 3600))
+        orders.append({
+            'product_id': f'p{pick:06d}',
+            'product_name': product['name'],
+            'product_category': product['category'],
+            'product_size': product['size'],
+            'product_color': product['color'],
+            'quantity': rng.randint(5, 100),
+            'status': rng.choice(['pending', 'in_progress', 'completed']),
+            'notes': '',
+            'created_by': 'admin',
+            'created_at': created_at,
+            'updated_at': created_at,
+        })
+    return orders
+
+
+def seed(db, collection, documents, id_format):
+    batch = db.batch()
+    for index, data in enumerate(documents):
+        batch.set(db.collection(collection).document(id_format.format(index)), data)
+        if (index + 1) % 500 == 0:
+            batch.commit()
+            batch = db.batch()
+    batch.commit()
+
+
+def firestore_reads(response):
+    usage = dict(part.split('=', 1) for part in response.headers.get('X-Firestore-Usage', '').split(';') if '=' in part)
+    return int(usage.get('reads', 0))
+
+
+def run_scale(products_count, orders_count, repeat, cold_runs):
+    """Seed the memory backend and time every endpoint; runs in the child process"""
+    import app as inventory
+    from firestore_tracing import unwrap
+
+    rng = random.Random(42)
+    setup_start = time.perf_counter()
+    # Seed before create_app() so its startup checks build the summaries from this data
+    db = unwrap(inventory.init_firebase())
+    products = generate_products(products_count, rng)
+    sales, customers = generate_sales(orders_count, products, rng)
+    seed(db, 'products', products, 'p{:06d}')
+    seed(db, 'sales_orders', sales, 's{:07d}')
+    seed(db, 'production_orders', generate_production_orders(max(products_count // 2, 1), products, rng), 'o{:06d}')
+    for collection, names in (('categories', CATEGORIES), ('sizes', SIZES), ('colors', COLORS)):
+        seed(db, collection, [{'name': name} for name in names], collection[:3] + '{:03d}')
+    del products, sales
+    inventory.create_app()
+    setup_seconds = time.perf_counter() - setup_start
+
+    client = inventory.app.test_client()
+    response = client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    if response.status_code != 302:
+        raise RuntimeError(f'Login failed with status {response.status_code}')
+
+    results = {}
+    customer_name, customer_phone = customers[0]
+    for label, url, is_export in endpoints(customer_name, customer_phone):
+        rss_before = peak_rss_mb()
+
+        timings, reads = [], []
+        for attempt in range(cold_runs + repeat):
+            if attempt < cold_runs:
+                inventory.invalidate_cache(*inventory.cache.entries)
+            start = time.perf_counter()
+            response = client.get(url)
+            body = response.get_data()
+            timings.append((time.perf_counter() - start) * 1000)
+            reads.append(firestore_reads(response))
+            expected = 'spreadsheetml' in (response.mimetype or '') if is_export else response.status_code == 200
+            if response.status_code != 200 or not expected:
+                raise RuntimeError(f'{url} returned {response.status_code} {response.mimetype}: {body[:200]!r}')
+
+        results[label] = {
+            'cold_ms': round(statistics.median(timings[:cold_runs]), 2),
+            'warm_ms': round(statistics.median(timings[cold_runs:]), 2) if repeat else None,
+            'reads_cold': max(reads[:cold_runs]),
+            'reads_warm': max(reads[cold_runs:]) if repeat else None,
+            'rss_growth_mb': round(peak_rss_mb() - rss_before, 1),
+            'bytes': len(body),
+        }
+    return {
+        'products': products_count,
+        'orders': orders_count,
+        'setup_seconds': round(setup_seconds, 2),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'endpoints': results,
+    }
+
+
+def run_child(products_count, orders_count, repeat, cold_runs):
+    """Run one scale in a fresh interpreter; returns its result dict"""
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(
+            os.environ,
+            DATA_BACKEND='memory',
+            CACHE_BACKEND='local',
+            CACHE_LISTENERS='false',
+            FIRESTORE_TRACING='true',
+            FIRESTORE_READ_BUDGET='0',
+            METRICS_ENABLED='false',
+            JOBS_DB_PATH=os.path.join(workdir, 'jobs.db'),
+            JOBS_FOLDER=os.path.join(workdir, 'job_files'),
+            ACTIVITY_SPILL_PATH=os.path.join(workdir, 'activity_spill.jsonl'),
+        )
+        # Leave DEPLOYMENT_ID unset so the startup checks run in the child
+        for name in ('DEPLOYMENT_ID', 'RENDER_GIT_COMMIT', 'RAILWAY_DEPLOYMENT_ID'):
+            env.pop(name, None)
+        command = [sys.executable, os.path.abspath(__file__), '--child',
+                   '--products', str(products_count), '--orders', str(orders_count), '--repeat', str(repeat),
+                   '--cold-runs', str(cold_runs)]
+        result = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True)
+    lines = [line for line in result.stdout.splitlines() if line.startswith(RESULT_PREFIX)]
+    if result.returncode != 0 or not lines:
+        print(result.stdout[-4000:] + result.stderr[-4000:])
+        raise RuntimeError(f'Benchmark run for {products_count} products / {orders_count} orders failed')
+    return json.loads(lines[-1][len(RESULT_PREFIX):])
+
+
+def print_scale(name, result):
+    print(f"\n{name}: {result['products']} products, {result['orders']} orders "
+          f"(setup {result['setup_seconds']:.1f} s, peak RSS {result['peak_rss_mb']:.0f} MB)")
+    print(f"{'Endpoint':<28} {'Cold (ms)':>10} {'Warm (ms)':>10} {'Reads cold':>11} {'Reads warm':>11} {'RSS +MB':>8}")
+    print('-' * 83)
+    for label, values in result['endpoints'].items():
+        warm_ms = f"{values['warm_ms']:10.1f}" if values['warm_ms'] is not None else f"{'-':>10}"
+        reads_warm = values['reads_warm'] if values['reads_warm'] is not None else '-'
+        print(f"{label:<28} {values['cold_ms']:10.1f} {warm_ms} {values['reads_cold']:>11} "
+              f"{reads_warm:>11} {values['rss_growth_mb']:8.1f}")
+
+
+def compare(name, result, baseline, tolerance):
+    """Regression messages for one scale against its baseline entry"""
+    regressions = []
+    if (baseline.get('products'), baseline.get('orders')) != (result['products'], result['orders']):
+        print(f"Baseline for {name} was recorded at a different size; skipping comparison")
+        return regressions
+    for label, values in result['endpoints'].items():
+        expected = baseline.get('endpoints', {}).get(label)
+        if expected is None:
+            print(f"No baseline for {name}/{label}")
+            continue
+        for field in ('reads_cold', 'reads_warm'):
+            if (values[field] is not None and expected.get(field) is not None
+                    and values[field] > expected[field] + READS_FLOOR):
+                regressions.append(f"{name}/{label}: {field} {values[field]} > baseline {expected[field]}")
+        for field in ('cold_ms', 'warm_ms'):
+            if values[field] is None or expected.get(field) is None:
+                continue
+            limit = max(expected[field] * (1 + tolerance), expected[field] + LATENCY_FLOOR_MS)
+            if values[field] > limit:
+                regressions.append(f"{name}/{label}: {field} {values[field]:.1f} > {limit:.1f} "
+                                   f"(baseline {expected[field]:.1f})")
+        limit = max(expected['rss_growth_mb'] * (1 + tolerance), expected['rss_growth_mb'] + RSS_FLOOR_MB)
+        if values['rss_growth_mb'] > limit:
+            regressions.append(f"{name}/{label}: rss_growth_mb {values['rss_growth_mb']:.1f} > {limit:.1f} "
+                               f"(baseline {expected['rss_growth_mb']:.1f})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scales', default='small',
+                        help=f"comma separated scales from {', '.join(SCALES)}")
+    parser.add_argument('--repeat', type=int, default=5, help='warm requests per endpoint')
+    parser.add_argument('--cold-runs', type=int, default=3,
+                        help='cold requests per endpoint (caches invalidated before each)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline JSON to compare with')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='write these results to the baseline instead of comparing')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='allowed latency and RSS growth over the baseline, as a fraction')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--products', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--orders', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = run_scale(args.products, args.orders, args.repeat, max(1, args.cold_runs))
+        print(RESULT_PREFIX + json.dumps(result))
+        return 0
+
+    names = [name.strip() for name in args.scales.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SCALES]
+    if unknown:
+        parser.error(f"unknown scale(s): {', '.join(unknown)}")
+
+    results = {}
+    for name in names:
+        products_count, orders_count = SCALES[name]
+        results[name] = run_child(products_count, orders_count, args.repeat, max(1, args.cold_runs))
+        print_scale(name, results[name])
+
+    if args.save_baseline:
+        stored = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as baseline_file:
+                stored = json.load(baseline_file)
+        stored.update(results)
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(stored, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write('\n')
+        print(f"\nBaseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to record one")
+        return 0
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    regressions = []
+    for name, result in results.items():
+        if name in baseline:
+            regressions += compare(name, result, baseline[name], args.tolerance)
+        else:
+            print(f"No baseline for scale {name}")
+    if regressions:
+        print(f"\nREGRESSIONS ({len(regressions)}):")
+        for message in regressions:
+            print(f"  {message}")
+        return 1
+    print("\nNo regressions against the baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark: bulk QR code generation
+
+Compares the previous one-product-at-a-time loop with QRPipeline against the
+local Firestore and Storage stand-ins. Network round trips are simulated with
+a fixed latency per Storage call and per Firestore commit.
+
+Usage: python benchmarks/bench_qr_generation.py [--products 2000] [--latency 0.05]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import local_firestore
+from local_storage import LocalBlob, LocalBucket
+from qr_codes import QRPipeline, new_barcode, render_qr_png, upload_qr_png
+
+# The legacy loop is only run up to this size; beyond it takes minutes
+LEGACY_MAX_PRODUCTS = 500
+
+
+class SlowBlob(LocalBlob):
+    def upload_from_file(self, file_obj, content_type=None):
+        time.sleep(self.bucket.latency)
+        super().upload_from_file(file_obj, content_type)
+
+    def make_public(self):
+        time.sleep(self.bucket.latency)
+
+
+class SlowBucket(LocalBucket):
+    """Local bucket where every call costs a simulated round trip"""
+
+    def __init__(self, root, latency):
+        super().__init__(root, '/static/local_bucket')
+        self.latency = latency
+
+    def blob(self, blob_name):
+        return SlowBlob(self, blob_name)
+
+
+def slow_commits(latency):
+    """Make every batch commit cost one round trip"""
+    commit = local_firestore.WriteBatch.commit
+
+    def slow_commit(self):
+        time.sleep(latency)
+        return commit(self)
+
+    local_firestore.WriteBatch.commit = slow_commit
+
+
+def seed(count):
+    db = local_firestore.create_client('memory')
+    batch = db.batch()
+    for index in range(count):
+        batch.set(db.collection('products').document(f'p{index:06d}'), {'name': f'Product {index}'})
+        if (index + 1) % 500 == 0:
+            batch.commit()
+            batch = db.batch()
+    batch.commit()
+    return db
+
+
+def legacy_generate(db, bucket, latency):
+    """The loop previously inlined in app.generate_missing_qr_codes"""
+    for product in db.collection('products').get():
+        barcode_data = new_barcode()
+        qr_url = upload_qr_png(bucket, barcode_data, render_qr_png(barcode_data))
+        # One round trip per document update
+        time.sleep(latency)
+        product.reference.update({'barcode': barcode_data, 'qr_code_url': qr_url})
+
+
+def pipeline_generate(db, bucket):
+    return QRPipeline(db, bucket).run(db.collection('products').get())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='simulated seconds per Storage call and Firestore commit')
+    args = parser.parse_args()
+    slow_commits(args.latency)
+
+    with tempfile.TemporaryDirectory() as root:
+        print(f"{'Method':>10} {'Products':>9} {'Seconds':>9}")
+        print('-' * 30)
+        if args.products <= LEGACY_MAX_PRODUCTS:
+            db = seed(args.products)
+            start = time.perf_counter()
+            legacy_generate(db, SlowBucket(os.path.join(root, 'legacy'), args.latency), args.latency)
+            print(f"{'legacy':>10} {args.products:>9} {time.perf_counter() - start:9.2f}")
+        else:
+            estimate = args.products * (3 * args.latency)
+            print(f"{'legacy':>10} {args.products:>9} {'~' + format(estimate, '.0f'):>9} (network time only)")
+
+        db = seed(args.products)
+        start = time.perf_counter()
+        updated, failed = pipeline_generate(db, SlowBucket(os.path.join(root, 'pipeline'), args.latency))
+        print(f"{'pipeline':>10} {updated:>9} {time.perf_counter() - start:9.2f}")
+        if failed:
+            print(f"{failed} products failed")
+
+
+if __name__ == '__main__':
+    main()
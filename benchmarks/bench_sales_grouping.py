@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark: sales page grouping
+
+Compares the previous quadratic group_sales_by_customer with the indexed
+SalesGrouper on synthetic sales histories of increasing size.
+
+Usage: python benchmarks/bench_sales_grouping.py [--sizes 1000,10000,200000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sales_grouping import group_sales
+
+# The legacy algorithm is only run up to this size; beyond it takes minutes
+LEGACY_MAX_ORDERS = 5000
+
+
+def legacy_group_sales_by_customer(sales_list):
+    """The grouping previously inlined in app.sales(), kept for comparison"""
+    grouped_sales = {}
+    for sale in sales_list:
+        if sale.get('is_multiple_items'):
+            customer_key = f"{sale['customer_name']}|{sale['customer_phone']}|{sale.get('order_id', sale.get('created_at'))}"
+            grouped_sales[customer_key] = {
+                'customer_name': sale['customer_name'],
+                'customer_phone': sale['customer_phone'],
+                'sold_by': sale['sold_by'],
+                'created_at': sale['created_at'],
+                'items': [sale]
+            }
+        else:
+            customer_base_key = f"{sale['customer_name']}|{sale['customer_phone']}"
+            found_group = False
+            for existing_key in grouped_sales:
+                if existing_key.startswith(customer_base_key):
+                    existing_group = grouped_sales[existing_key]
+                    time_diff = abs((sale['created_at'] - existing_group['created_at']).total_seconds())
+                    if time_diff <= 300:
+                        existing_group['items'].append(sale)
+                        found_group = True
+                        break
+            if not found_group:
+                customer_key = f"{customer_base_key}|{sale['created_at']}"
+                grouped_sales[customer_key] = {
+                    'customer_name': sale['customer_name'],
+                    'customer_phone': sale['customer_phone'],
+                    'sold_by': sale['sold_by'],
+                    'created_at': sale['created_at'],
+                    'items': [sale]
+                }
+    grouped_list = list(grouped_sales.values())
+    grouped_list.sort(key=lambda x: x['created_at'], reverse=True)
+    return grouped_list
+
+
+def generate_sales(count, seed=42):
+    """Synthetic history: ~8 orders per customer, visits of 1-4 legacy items or one consolidated order"""
+    rng = random.Random(seed)
+    customers = [(f'Customer {index}', f'01{index:09d}') for index in range(max(count // 8, 1))]
+    start = datetime(2024, 1, 1)
+    sales = []
+    while len(sales) < count:
+        name, phone = rng.choice(customers)
+        visit_time = start + timedelta(seconds=rng.randint(0, 365 * 24 * 3600))
+        base = {'customer_name': name, 'customer_phone': phone, 'sold_by': 'admin', 'total_price': 1000}
+        if rng.random() < 0.3:
+            sales.append(dict(base, created_at=visit_time, is_multiple_items=True,
+                              order_id=f'order{len(sales)}', items=[]))
+            continue
+        for offset in range(rng.randint(1, 4)):
+            sales.append(dict(base, created_at=visit_time + timedelta(seconds=offset * 40)))
+    sales = sales[:count]
+    rng.shuffle(sales)
+    return sales
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1000,5000,50000,200000',
+                        help='comma separated order counts')
+    args = parser.parse_args()
+
+    print(f"{'Orders':>8} {'Legacy (s)':>12} {'Indexed (s)':>12} {'Groups':>8}")
+    print('-' * 44)
+    for size in (int(value) for value in args.sizes.split(',')):
+        sales = generate_sales(size)
+        indexed_time, groups = timed(group_sales, sales)
+        if size <= LEGACY_MAX_ORDERS:
+            legacy_time, _ = timed(legacy_group_sales_by_customer, sales)
+            legacy_display = f'{legacy_time:12.3f}'
+        else:
+            legacy_display = f"{'skipped':>12}"
+        print(f'{size:>8} {legacy_display} {indexed_time:12.3f} {len(groups):>8}')
+
+
+if __name__ == '__main__':
+    main()
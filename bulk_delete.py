@@ -0,0 +1,87 @@
+"""
+Bulk collection deletes for THEO Clothing Inventory
+
+BulkDeleter empties whole collections (used by the admin hard reset). Each
+collection is read a page at a time in document id order, using limit() and a
+start_after() cursor on the last document of the previous page, and every
+page is deleted with one WriteBatch (through BatchWriter, which retries a
+failed commit). Collections are deleted in parallel on a small thread pool.
+
+Deleting is idempotent, so an interrupted run is resumed by running it again:
+the documents already deleted are gone and the rest are picked up from the
+first page.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from batch_writer import MAX_BATCH_SIZE, BatchWriter
+
+PAGE_SIZE = MAX_BATCH_SIZE  # documents read and deleted per batch
+MAX_WORKERS = 4  # collections deleted at the same time
+
+
+class BulkDeleter:
+    """Deletes every document of a set of collections
+
+    progress: optional callback(collection, deleted_in_collection, deleted_in_total)
+    called after each committed page.
+    """
+
+    def __init__(self, db, page_size=PAGE_SIZE, max_workers=MAX_WORKERS, progress=None):
+        self.db = db
+        self.page_size = max(1, min(page_size, MAX_BATCH_SIZE))
+        self.max_workers = max(1, max_workers)
+        self.progress = progress
+        self.lock = threading.Lock()
+        self.deleted = 0
+
+    def count(self, collections):
+        """{collection: documents} from count aggregations; None where a count fails"""
+        counts = {}
+        for collection in collections:
+            try:
+                counts[collection] = self.db.collection(collection).count(alias='total').get()[0][0].value
+            except Exception as e:
+                print(f"Could not count {collection}: {e}")
+                counts[collection] = None
+        return counts
+
+    def delete_collection(self, collection):
+        """Delete every document in one collection; returns how many were deleted"""
+        query = self.db.collection(collection).order_by('__name__').limit(self.page_size)
+        writer = BatchWriter(self.db, chunk_size=self.page_size)
+        deleted = 0
+        last = None
+        while True:
+            page = (query.start_after(last) if last is not None else query).get()
+            if not page:
+                return deleted
+            result = writer.delete([snapshot.reference for snapshot in page])
+            if result.failed:
+                raise Exception(result.failed[0].error)
+            deleted += len(page)
+            last = page[-1]
+            with self.lock:
+                self.deleted += len(page)
+                total = self.deleted
+            if self.progress:
+                self.progress(collection, deleted, total)
+            if len(page) < self.page_size:
+                return deleted
+
+    def delete(self, collections):
+        """Delete collections in parallel; returns {collection: count or 'Error: ...'}"""
+        def run(collection):
+            try:
+                count = self.delete_collection(collection)
+                print(f"Deleted {count} documents from {collection}")
+                return count
+            except Exception as e:
+                print(f"Error deleting from {collection}: {e}")
+                return f"Error: {e}"
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(collections) or 1),
+                                thread_name_prefix='bulk-delete') as executor:
+            results = list(executor.map(run, collections))
+        return dict(zip(collections, results))
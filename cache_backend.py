@@ -0,0 +1,455 @@
+"""
+Cache backends for THEO Clothing Inventory
+
+Each gunicorn worker keeps a local copy of cached collections. A shared backend
+holds a version counter per cache key (and optionally the cached data itself)
+so that:
+  - an invalidation in one worker bumps the version and every worker refetches
+  - a value fetched by one worker can be reused by the others
+
+Backends:
+  local   - per-process only (previous behaviour)
+  sqlite  - a local SQLite file shared by all workers on the host
+  redis   - any server speaking the Redis protocol (RESP), including the
+            stand-in started with `python cache_backend.py --serve`
+"""
+
+import pickle
+import socket
+import socketserver
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse
+
+
+class LocalCacheBackend:
+    """Versions held in this process; nothing is shared"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.versions = {}
+
+    def version(self, key):
+        return self.versions.get(key, 0)
+
+    def load(self, key):
+        return None
+
+    def store(self, key, version, timestamp, data):
+        return True
+
+    def invalidate(self, key):
+        with self.lock:
+            self.versions[key] = self.versions.get(key, 0) + 1
+
+
+class SQLiteCacheBackend:
+    """Versions and pickled values in a SQLite file shared between workers"""
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        connection = self._connection()
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS cache_entries ('
+            'key TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0, '
+            'timestamp REAL NOT NULL DEFAULT 0, data BLOB)'
+        )
+        connection.commit()
+
+    def _connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self.local.connection = connection
+        return connection
+
+    def version(self, key):
+        row = self._connection().execute(
+            'SELECT version FROM cache_entries WHERE key = ?', (key,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def load(self, key):
+        row = self._connection().execute(
+            'SELECT version, timestamp, data FROM cache_entries WHERE key = ?', (key,)
+        ).fetchone()
+        if not row or row[2] is None:
+            return None
+        return row[0], row[1], pickle.loads(row[2])
+
+    def store(self, key, version, timestamp, data):
+        """Store data only if nobody invalidated the key since version was read"""
+        connection = self._connection()
+        payload = sqlite3.Binary(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+        with connection:
+            connection.execute(
+                'INSERT OR IGNORE INTO cache_entries (key, version) VALUES (?, 0)', (key,)
+            )
+            cursor = connection.execute(
+                'UPDATE cache_entries SET timestamp = ?, data = ? WHERE key = ? AND version = ?',
+                (timestamp, payload, key, version)
+            )
+        return cursor.rowcount == 1
+
+    def invalidate(self, key):
+        with self._connection() as connection:
+            connection.execute(
+                'INSERT INTO cache_entries (key, version) VALUES (?, 1) '
+                'ON CONFLICT(key) DO UPDATE SET version = version + 1, timestamp = 0, data = NULL',
+                (key,)
+            )
+
+
+class RespError(Exception):
+    """Error reply from a Redis-protocol server"""
+
+
+class RespConnection:
+    """Minimal Redis protocol (RESP2) client connection"""
+
+    def __init__(self, host, port, db=0, password=None, timeout=5):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.reader = self.sock.makefile('rb')
+        if password:
+            self.execute('AUTH', password)
+        if db:
+            self.execute('SELECT', db)
+
+    def close(self):
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+    def execute(self, *args):
+        self.sock.sendall(encode_command(args))
+        return read_reply(self.reader)
+
+
+def encode_command(args):
+    parts = [f'*{len(args)}\r\n'.encode()]
+    for arg in args:
+        if isinstance(arg, bytes):
+            value = arg
+        else:
+            value = str(arg).encode()
+        parts.append(f'${len(value)}\r\n'.encode())
+        parts.append(value + b'\r\n')
+    return b''.join(parts)
+
+
+def read_reply(reader):
+    line = reader.readline()
+    if not line:
+        raise ConnectionError('Connection closed by server')
+    prefix, payload = line[:1], line[1:-2]
+    if prefix == b'+':
+        return payload.decode()
+    if prefix == b'-':
+        raise RespError(payload.decode())
+    if prefix == b':':
+        return int(payload)
+    if prefix == b'$':
+        length = int(payload)
+        if length < 0:
+            return None
+        data = reader.read(length + 2)
+        return data[:-2]
+    if prefix == b'*':
+        count = int(payload)
+        if count < 0:
+            return None
+        return [read_reply(reader) for _ in range(count)]
+    raise RespError(f'Unknown reply type: {line!r}')
+
+
+class RedisCacheBackend:
+    """Versions and pickled values on a Redis-protocol server"""
+
+    def __init__(self, url, prefix='theo:cache'):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.password = parsed.password
+        self.prefix = prefix
+        self.local = threading.local()
+
+    def _execute(self, *args):
+        connection = getattr(self.local, 'connection', None)
+        for attempt in range(2):
+            if connection is None:
+                connection = RespConnection(self.host, self.port, self.db, self.password)
+                self.local.connection = connection
+            try:
+                return connection.execute(*args)
+            except (OSError, ConnectionError):
+                connection.close()
+                connection = self.local.connection = None
+                if attempt:
+                    raise
+
+    def _key(self, key, field):
+        return f'{self.prefix}:{key}:{field}'
+
+    def version(self, key):
+        value = self._execute('GET', self._key(key, 'version'))
+        return int(value) if value is not None else 0
+
+    def load(self, key):
+        version, payload = self._execute('MGET', self._key(key, 'version'), self._key(key, 'data'))
+        if payload is None:
+            return None
+        stored_version, timestamp, data = pickle.loads(payload)
+        if stored_version != (int(version) if version is not None else 0):
+            return None
+        return stored_version, timestamp, data
+
+    def store(self, key, version, timestamp, data):
+        # Readers discard data whose embedded version is stale, so a plain SET is enough
+        payload = pickle.dumps((version, timestamp, data), protocol=pickle.HIGHEST_PROTOCOL)
+        self._execute('SET', self._key(key, 'data'), payload)
+        return True
+
+    def invalidate(self, key):
+        self._execute('INCR', self._key(key, 'version'))
+        self._execute('DEL', self._key(key, 'data'))
+
+
+def create_backend(name='local', sqlite_path=None, redis_url=None):
+    """Build the backend selected by CACHE_BACKEND"""
+    if name == 'sqlite':
+        return SQLiteCacheBackend(sqlite_path or 'cache.db')
+    if name == 'redis':
+        return RedisCacheBackend(redis_url or 'redis://localhost:6379/0')
+    if name == 'local':
+        return LocalCacheBackend()
+    raise ValueError(f'Unknown cache backend: {name}')
+
+
+class VersionedCache:
+    """Worker-local cache entries validated against a shared backend
+
+    cache[key] exposes the local entry ({'data', 'timestamp', 'version'}).
+    Keys in local_only are versioned through the backend but their data is
+    never shared (e.g. values the worker mutates in place).
+
+    Refreshes are single-flight per key: concurrent callers wait for the one
+    fetch in progress instead of all hitting Firestore. An entry that has
+    merely expired (not been invalidated) is served stale for up to
+    max_staleness seconds while a background thread revalidates it.
+
+    observer(key, result) is told how each get() was answered: 'hit' (fresh
+    local copy), 'stale' (served while revalidating), 'shared' (loaded from
+    the backend) or 'miss' (fetched).
+    """
+
+    def __init__(self, backend, keys, local_only=(), max_staleness=0, observer=None):
+        self.backend = backend
+        self.observer = observer
+        self.entries = {key: {'data': None, 'timestamp': 0, 'version': -1} for key in keys}
+        self.locks = {key: threading.Lock() for key in keys}
+        self.local_only = set(local_only)
+        self.max_staleness = max_staleness
+
+    def __getitem__(self, key):
+        return self.entries[key]
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def _shared_version(self, key):
+        try:
+            return self.backend.version(key)
+        except Exception as e:
+            print(f"Cache backend unavailable ({e}); using local cache for {key}")
+            return self.entries[key]['version']
+
+    def _is_fresh(self, entry, version, duration):
+        return (entry['data'] is not None and entry['version'] == version and
+                time.time() - entry['timestamp'] <= duration)
+
+    def _observe(self, key, result):
+        if self.observer is not None:
+            self.observer(key, result)
+
+    def get(self, key, fetch_function, duration):
+        entry = self.entries[key]
+        version = self._shared_version(key)
+
+        if self._is_fresh(entry, version, duration):
+            self._observe(key, 'hit')
+            return entry['data']
+
+        # Expired but not invalidated: serve stale data while revalidating
+        if (entry['data'] is not None and entry['version'] == version and
+                time.time() - entry['timestamp'] <= duration + self.max_staleness):
+            self._refresh_in_background(key, fetch_function, duration, version)
+            self._observe(key, 'stale')
+            return entry['data']
+
+        with self.locks[key]:
+            # Another request may have refreshed the entry while we waited
+            if self._is_fresh(entry, version, duration):
+                self._observe(key, 'hit')
+                return entry['data']
+            return self._refresh(key, fetch_function, duration, version, observe=True)
+
+    def _refresh(self, key, fetch_function, duration, version, observe=False):
+        """Load the entry from the shared backend or fetch it; caller holds the key lock"""
+        entry = self.entries[key]
+        current_time = time.time()
+
+        # Another worker may already have fetched this version
+        if key not in self.local_only:
+            try:
+                shared = self.backend.load(key)
+            except Exception:
+                shared = None
+            if shared and shared[0] == version and current_time - shared[1] <= duration:
+                entry.update(data=shared[2], timestamp=shared[1], version=version)
+                if observe:
+                    self._observe(key, 'shared')
+                return entry['data']
+
+        if observe:
+            self._observe(key, 'miss')
+        data = fetch_function()
+        entry.update(data=data, timestamp=current_time, version=version)
+        if key not in self.local_only:
+            try:
+                self.backend.store(key, version, current_time, data)
+            except Exception as e:
+                print(f"Error storing {key} in cache backend: {e}")
+        return data
+
+    def _refresh_in_background(self, key, fetch_function, duration, version):
+        lock = self.locks[key]
+        if not lock.acquire(blocking=False):
+            return  # a refresh is already running
+
+        def revalidate():
+            try:
+                self._refresh(key, fetch_function, duration, version)
+            except Exception as e:
+                print(f"Error revalidating cache entry {key}: {e}")
+            finally:
+                lock.release()
+
+        threading.Thread(target=revalidate, name=f'cache-refresh-{key}', daemon=True).start()
+
+    def invalidate(self, key):
+        entry = self.entries[key]
+        entry['data'] = None
+        entry['timestamp'] = 0
+        try:
+            self.backend.invalidate(key)
+        except Exception as e:
+            print(f"Error invalidating {key} in cache backend: {e}")
+
+
+class _RespHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server
+        while True:
+            try:
+                command = read_reply(self.rfile)
+            except (ConnectionError, OSError, ValueError):
+                return
+            if not isinstance(command, list) or not command:
+                return
+            name = command[0].decode().upper()
+            args = command[1:]
+            try:
+                reply = server.dispatch(name, args)
+            except Exception as e:
+                reply = RespError(str(e))
+            self.wfile.write(encode_reply(reply))
+
+
+def encode_reply(reply):
+    if isinstance(reply, RespError):
+        return f'-ERR {reply}\r\n'.encode()
+    if reply is True:
+        return b'+OK\r\n'
+    if isinstance(reply, int):
+        return f':{reply}\r\n'.encode()
+    if reply is None:
+        return b'$-1\r\n'
+    if isinstance(reply, list):
+        return f'*{len(reply)}\r\n'.encode() + b''.join(encode_reply(item) for item in reply)
+    if isinstance(reply, str):
+        return f'+{reply}\r\n'.encode()
+    return f'${len(reply)}\r\n'.encode() + reply + b'\r\n'
+
+
+class LocalRedisServer(socketserver.ThreadingTCPServer):
+    """In-process stand-in for Redis implementing the commands the cache uses"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=6379):
+        super().__init__((host, port), _RespHandler)
+        self.lock = threading.Lock()
+        self.data = {}
+
+    def dispatch(self, name, args):
+        with self.lock:
+            if name == 'PING':
+                return 'PONG'
+            if name in ('SELECT', 'AUTH'):
+                return True
+            if name == 'GET':
+                return self.data.get(args[0])
+            if name == 'MGET':
+                return [self.data.get(key) for key in args]
+            if name == 'SET':
+                self.data[args[0]] = args[1]
+                return True
+            if name == 'DEL':
+                return sum(1 for key in args if self.data.pop(key, None) is not None)
+            if name in ('INCR', 'INCRBY'):
+                amount = int(args[1]) if name == 'INCRBY' else 1
+                value = int(self.data.get(args[0], b'0')) + amount
+                self.data[args[0]] = str(value).encode()
+                return value
+            if name == 'EXISTS':
+                return sum(1 for key in args if key in self.data)
+            if name == 'FLUSHALL':
+                self.data.clear()
+                return True
+        raise RespError(f"unknown command '{name}'")
+
+    def start(self):
+        """Serve from a background thread; returns the thread"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run the local Redis-protocol cache server')
+    parser.add_argument('--serve', action='store_true', help='start the stand-in server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6379)
+    args = parser.parse_args()
+
+    if args.serve:
+        server = LocalRedisServer(args.host, args.port)
+        print(f"Local cache server listening on {args.host}:{args.port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\nCache server stopped")
+    else:
+        parser.print_help()
@@ -19,6 +19,44 @@ class Config:
     FIREBASE_PROJECT_ID = os.environ.get('FIREBASE_PROJECT_ID', 'inventory-3098f')
     FIREBASE_STORAGE_BUCKET = os.environ.get('FIREBASE_STORAGE_BUCKET', 'inventory-3098f.firebasestorage.app')
     
+    # Data backend: 'firestore' (default), or 'memory' / 'sqlite' for offline runs
+    DATA_BACKEND = os.environ.get('DATA_BACKEND', 'firestore').lower()
+    LOCAL_DB_PATH = os.environ.get('LOCAL_DB_PATH', 'local_firestore.db')
+    
+    # Cache backend shared by gunicorn workers: 'local', 'sqlite' or 'redis'
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'local').lower()
+    CACHE_SQLITE_PATH = os.environ.get('CACHE_SQLITE_PATH', 'cache.db')
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    # Seconds an expired entry may still be served while it is refreshed in the background
+    CACHE_MAX_STALENESS = int(os.environ.get('CACHE_MAX_STALENESS', 300))
+    # Mirror categories/sizes/colors/products with Firestore on_snapshot listeners
+    CACHE_LISTENERS = os.environ.get('CACHE_LISTENERS', 'False').lower() == 'true'
+    
+    # Background jobs: SQLite queue shared by workers, and the folder for uploads/results
+    JOBS_DB_PATH = os.environ.get('JOBS_DB_PATH', 'jobs.db')
+    JOBS_FOLDER = os.environ.get('JOBS_FOLDER', 'job_files')
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    
+    # Activity log: flushed in batches every few seconds; spilled here while Firestore is unreachable
+    ACTIVITY_SPILL_PATH = os.environ.get('ACTIVITY_SPILL_PATH', 'activity_spill.jsonl')
+    ACTIVITY_FLUSH_INTERVAL = float(os.environ.get('ACTIVITY_FLUSH_INTERVAL', 2.0))
+    
+    # Password hashing: Werkzeug KDF method with its cost, and threads computing hashes
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    
+    # Metrics: flushed by every worker to a shared SQLite file and served on /metrics
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True').lower() == 'true'
+    METRICS_DB_PATH = os.environ.get('METRICS_DB_PATH', 'metrics.db')
+    METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5.0))
+    # When set, /metrics requires 'Authorization: Bearer <token>'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    
+    # Per-request Firestore usage: X-Firestore-Usage response header, and a warning
+    # when a request reads more documents than the budget
+    FIRESTORE_TRACING = os.environ.get('FIRESTORE_TRACING', 'True').lower() == 'true'
+    FIRESTORE_READ_BUDGET = int(os.environ.get('FIRESTORE_READ_BUDGET', 1000))
+    
     # Email configuration
     MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
     MAIL_PORT = int(os.environ.get('MAIL_PORT', 587))
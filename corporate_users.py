@@ -11,6 +11,11 @@ from datetime import datetime
 from firebase_admin import credentials, firestore
 import firebase_admin
 
+import cache_backend
+import user_principals
+from config import Config
+from passwords import PasswordHasher
+
 # Initialize Firebase
 def init_firebase():
     if not os.path.exists('firebase-service-account.json'):
@@ -22,6 +27,15 @@ def init_firebase():
     firebase_admin.initialize_app(cred)
     return firestore.client()
 
+# Tell running app workers to reload user roles and permissions
+def invalidate_app_principals():
+    backend = cache_backend.create_backend(
+        Config.CACHE_BACKEND,
+        sqlite_path=Config.CACHE_SQLITE_PATH,
+        redis_url=Config.CACHE_REDIS_URL
+    )
+    user_principals.bump_version(backend)
+
 # Corporate user roles and permissions
 CORPORATE_ROLES = {
     'admin': {
@@ -88,7 +102,7 @@ def create_corporate_user(db, username, password, role, email, full_name, depart
         # Create user data
         user_data = {
             'username': username,
-            'password': password,
+            'password_hash': PasswordHasher(Config.PASSWORD_HASH_METHOD, max_workers=1).hash(password),
             'role': role,
             'role_name': role_data['name'],
             'permissions': role_data['permissions'],
@@ -171,6 +185,7 @@ def update_user_role(db, username, new_role):
             'updated_at': datetime.now(),
             'updated_by': 'corporate_setup'
         })
+        invalidate_app_principals()
         
         print(f"✅ User '{username}' role updated to {role_data['name']}")
         return True
@@ -198,6 +213,7 @@ def deactivate_user(db, username):
             'deactivated_at': datetime.now(),
             'deactivated_by': 'corporate_setup'
         })
+        invalidate_app_principals()
         
         print(f"✅ User '{username}' deactivated successfully")
         return True
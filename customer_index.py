@@ -0,0 +1,327 @@
+"""
+Customer autocomplete index for THEO Clothing Inventory
+
+Holds every distinct (name, phone) pair from sales_orders in memory with a
+bigram index over normalized names and phone digits, so autocomplete answers
+from memory instead of reading the whole sales collection per keystroke.
+
+The index is built from sales history on first use. Sales created in this
+worker are added directly; sales created by other workers are picked up by an
+incremental created_at query at most every SYNC_INTERVAL seconds, and the
+whole index is rebuilt every REBUILD_INTERVAL seconds to drop edited and
+deleted customers. Both refreshes run on a background thread while searches
+keep using the current index.
+"""
+
+import bisect
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from datetime import datetime, timedelta, timezone
+
+GRAM_SIZE = 2  # autocomplete starts at two characters
+SYNC_INTERVAL = 5  # seconds
+REBUILD_INTERVAL = 3600  # seconds
+# Sales committed by another worker can carry a slightly older created_at than
+# the newest one already seen, so each sync re-reads this far back
+SYNC_OVERLAP = 60  # seconds
+
+def normalize_name(value):
+    value = unicodedata.normalize('NFKD', value or '')
+    value = ''.join(char for char in value if not unicodedata.combining(char))
+    return ' '.join(value.casefold().split())
+
+
+def phone_digits(value):
+    return re.sub(r'\D', '', value or '')
+
+
+def instant(value):
+    """Seconds since the epoch of a created_at value; naive values are UTC, as in Firestore"""
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def grams(text):
+    return {text[index:index + GRAM_SIZE] for index in range(len(text) - GRAM_SIZE + 1)}
+
+
+class CustomerEntry:
+    """One distinct customer and how many of their sales are indexed"""
+
+    __slots__ = ('name', 'phone', 'name_key', 'phone_key', 'orders')
+
+    def __init__(self, name, phone):
+        self.name = name
+        self.phone = phone
+        self.name_key = normalize_name(name)
+        self.phone_key = phone_digits(phone)
+        self.orders = 0
+
+    def starts(self):
+        """Texts a query can be a prefix of for a best-rank match"""
+        return [text for text in (self.name_key, self.phone_key) if text]
+
+    def word_starts(self):
+        """Name suffixes starting at the second and later words"""
+        words = self.name_key.split(' ')
+        return [' '.join(words[index:]) for index in range(1, len(words))]
+
+
+def _prefix_keys(items, prefix, limit):
+    """Up to limit keys from a sorted [(text, key)] list whose text starts with prefix"""
+    low = bisect.bisect_left(items, (prefix,))
+    high = min(bisect.bisect_left(items, (prefix + '\U0010ffff',)), low + limit)
+    return [key for _, key in items[low:high]]
+
+
+class IndexData:
+    """Entries, sorted prefix lists and bigram postings; replaced as a whole by a rebuild"""
+
+    def __init__(self):
+        self.entries = {}  # (name, phone) -> CustomerEntry
+        self.starts = []  # sorted (name or phone, key)
+        self.word_starts = []  # sorted (name from its second word on, key)
+        self.postings = {}  # gram -> set of keys
+
+    def add(self, name, phone, bulk=False):
+        """Count one sale for a customer; bulk appends and leaves sorting to finish()"""
+        key = (name, phone)
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = CustomerEntry(name, phone)
+            add_item = list.append if bulk else bisect.insort
+            for text in entry.starts():
+                add_item(self.starts, (text, key))
+            for text in entry.word_starts():
+                add_item(self.word_starts, (text, key))
+            for gram in grams(entry.name_key) | grams(entry.phone_key):
+                self.postings.setdefault(gram, set()).add(key)
+        entry.orders += 1
+
+    def finish(self):
+        self.starts.sort()
+        self.word_starts.sort()
+
+    def remove(self, name, phone):
+        key = (name, phone)
+        entry = self.entries.get(key)
+        if entry is None:
+            return
+        entry.orders -= 1
+        if entry.orders > 0:
+            return
+        del self.entries[key]
+        for items, texts in ((self.starts, entry.starts()), (self.word_starts, entry.word_starts())):
+            for text in texts:
+                index = bisect.bisect_left(items, (text, key))
+                if index < len(items) and items[index] == (text, key):
+                    del items[index]
+        for gram in grams(entry.name_key) | grams(entry.phone_key):
+            keys = self.postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.postings[gram]
+
+    def candidates(self, text):
+        """Keys whose indexed text contains every gram of text"""
+        result = None
+        for gram in sorted(grams(text), key=lambda gram: len(self.postings.get(gram, ()))):
+            keys = self.postings.get(gram)
+            if not keys:
+                return set()
+            result = set(keys) if result is None else result & keys
+            if not result:
+                break
+        return result or set()
+
+    def search(self, name_query, phone_query, limit):
+        """Name or phone prefixes first, then later words of the name, then substrings
+
+        Each tier is ordered by name, and later tiers are only searched while
+        there is room left, so short queries stay cheap on large indexes.
+        """
+        results = []
+        seen = set()
+
+        def take(keys):
+            keys = [key for key in keys if key not in seen]
+            keys.sort(key=lambda key: (self.entries[key].name_key, self.entries[key].phone_key))
+            for key in keys[:limit - len(results)]:
+                seen.add(key)
+                results.append(self.entries[key])
+
+        tier = []
+        for query in {name_query, phone_query} - {''}:
+            tier += _prefix_keys(self.starts, query, limit)
+        take(tier)
+        if len(results) < limit and name_query:
+            # A name can match at several words; ask for extra to make up for repeats
+            take(_prefix_keys(self.word_starts, name_query, limit * 2))
+        if len(results) < limit:
+            matches = []
+            for query, field in ((name_query, 'name_key'), (phone_query, 'phone_key')):
+                if len(query) < GRAM_SIZE:
+                    continue
+                for key in self.candidates(query) - seen:
+                    entry = self.entries[key]
+                    if query in getattr(entry, field):
+                        matches.append(key)
+            take(heapq.nsmallest(limit, set(matches), key=lambda key: (self.entries[key].name_key, self.entries[key].phone_key)))
+        return results
+
+
+def sale_customer(sale_data):
+    """The (name, phone) a sale belongs to, or None"""
+    name = (sale_data.get('customer_name') or '').strip()
+    phone = (sale_data.get('customer_phone') or '').strip()
+    if name or phone:
+        return name, phone
+    return None
+
+
+class CustomerIndex:
+    """In-memory autocomplete over customers seen in sales_orders"""
+
+    def __init__(self, db, collection='sales_orders'):
+        self.db = db
+        self.collection = collection
+        self._data = None
+        self._lock = threading.RLock()
+        self._refreshing = threading.Lock()
+        self._cursor = None  # created_at of the newest sale seen
+        self._recent = {}  # sale id -> instant, for sales inside SYNC_OVERLAP
+        self._synced_at = 0
+        self._built_at = 0
+
+    def _remember(self, sale_id, created_at):
+        seconds = instant(created_at)
+        if seconds is None:
+            return
+        self._recent[sale_id] = seconds
+        if self._cursor is None or seconds > instant(self._cursor):
+            self._cursor = created_at
+
+    def _prune_recent(self):
+        if self._cursor is not None:
+            oldest = instant(self._cursor) - SYNC_OVERLAP
+            self._recent = {sale_id: seconds for sale_id, seconds in self._recent.items()
+                            if seconds >= oldest}
+
+    def rebuild(self):
+        """Build the index from the whole sales history; returns the customer count"""
+        data = IndexData()
+        seen = []
+        for doc in self.db.collection(self.collection).stream():
+            sale_data = doc.to_dict()
+            customer = sale_customer(sale_data)
+            if customer:
+                data.add(*customer, bulk=True)
+            seen.append((doc.id, sale_data.get('created_at')))
+        data.finish()
+        with self._lock:
+            self._data = data
+            self._cursor = None
+            self._recent = {}
+            for sale_id, created_at in seen:
+                self._remember(sale_id, created_at)
+            self._prune_recent()
+            self._built_at = self._synced_at = time.monotonic()
+        print(f"Customer index built: {len(data.entries)} customers")
+        return len(data.entries)
+
+    def sync(self):
+        """Add sales created since the last build or sync (e.g. by other workers)"""
+        with self._lock:
+            cursor = self._cursor
+        if cursor is None:
+            # No dated sales at build time; ordering skips the undated ones already indexed
+            query = self.db.collection(self.collection).order_by('created_at')
+        else:
+            query = self.db.collection(self.collection).where(
+                'created_at', '>=', cursor - timedelta(seconds=SYNC_OVERLAP))
+        docs = list(query.stream())
+        with self._lock:
+            for doc in docs:
+                if doc.id in self._recent:
+                    continue
+                sale_data = doc.to_dict()
+                customer = sale_customer(sale_data)
+                if customer:
+                    self._data.add(*customer)
+                self._remember(doc.id, sale_data.get('created_at'))
+            self._prune_recent()
+            self._synced_at = time.monotonic()
+
+    def _refresh(self, rebuild):
+        try:
+            if rebuild:
+                self.rebuild()
+            else:
+                self.sync()
+        except Exception as e:
+            print(f"Customer index refresh failed: {e}")
+            with self._lock:
+                # Back off instead of retrying on every keystroke
+                self._synced_at = time.monotonic()
+        finally:
+            self._refreshing.release()
+
+    def _ensure_ready(self):
+        if self._data is None:
+            with self._refreshing:
+                if self._data is None:
+                    self.rebuild()
+            return
+        now = time.monotonic()
+        rebuild = now - self._built_at >= REBUILD_INTERVAL
+        if (rebuild or now - self._synced_at >= SYNC_INTERVAL) and self._refreshing.acquire(blocking=False):
+            threading.Thread(target=self._refresh, args=(rebuild,), name='customer-index',
+                             daemon=True).start()
+
+    def note_sale(self, sale_id, sale_data):
+        """Record a sale created by this worker"""
+        with self._lock:
+            if self._data is None or sale_id in self._recent:
+                return
+            customer = sale_customer(sale_data)
+            if customer:
+                self._data.add(*customer)
+            self._remember(sale_id, sale_data.get('created_at'))
+
+    def forget_sale(self, sale_data):
+        """Drop a deleted sale from its customer's order count"""
+        with self._lock:
+            customer = sale_customer(sale_data)
+            if self._data is not None and customer:
+                self._data.remove(*customer)
+
+    def replace_sale(self, before, after):
+        """Move an edited sale to its new customer name and phone"""
+        with self._lock:
+            old, new = sale_customer(before), sale_customer(after)
+            if self._data is None or old == new:
+                return
+            if old:
+                self._data.remove(*old)
+            if new:
+                self._data.add(*new)
+
+    def search(self, query, limit=10):
+        """Ranked matches on name and phone as [{'name', 'phone'}]"""
+        name_query = normalize_name(query)
+        digits = phone_digits(query)
+        # Only treat the query as a phone number when it has no letters
+        phone_query = digits if digits and not re.search(r'[^\d\s+\-()]', query) else ''
+        if len(name_query) < GRAM_SIZE and len(phone_query) < GRAM_SIZE:
+            return []
+        self._ensure_ready()
+        with self._lock:
+            entries = self._data.search(name_query, phone_query, limit)
+            return [{'name': entry.name, 'phone': entry.phone} for entry in entries]
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Per-customer order summaries for THEO Clothing Inventory
+
+Each customer has one document in customer_summaries holding their total
+orders, total returned, last order date and their RECENT_ORDERS newest orders
+(newest first), so the customer history opens with a single document read.
+Customers are identified by phone number, or by name when a sale has no
+phone; every sale stores that identity as customer_key, so a customer's
+sales are found with one equality query whatever the spelling of the phone.
+
+Sales routes commit the summary update in the same transaction as the sale
+write (create, edit, return, undo return, delete). backfill() rebuilds every
+summary from the sales history and sets customer_key on older sales:
+
+    python customer_summary.py --backfill
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+from datetime import datetime
+
+from batch_writer import BatchWriter
+from customer_index import instant, normalize_name, phone_digits
+
+COLLECTION = 'customer_summaries'
+RECENT_ORDERS = 10
+# Written once every sale carries a customer_key
+KEYS_MARKER = ('dashboard_stats', 'customer_keys')
+
+# Sale fields copied into a summary's recent orders
+ORDER_FIELDS = ['product_name', 'product_category', 'product_color', 'product_size',
+                'quantity', 'total_price', 'status', 'created_at', 'returned_at']
+
+
+def customer_key(name, phone):
+    """Summary document id for a customer, or None without a name or phone"""
+    digits = phone_digits(phone)
+    if digits:
+        return f'phone_{digits}'
+    name_key = normalize_name(name)
+    if name_key:
+        # Names can contain characters that are not allowed in document ids
+        return 'name_' + hashlib.sha1(name_key.encode('utf-8')).hexdigest()[:24]
+    return None
+
+
+def sale_key(sale_data):
+    if not sale_data:
+        return None
+    return customer_key(sale_data.get('customer_name'), sale_data.get('customer_phone'))
+
+
+def customer_sales(db, key):
+    """Query for a customer's sales, by the customer_key stored on each sale"""
+    return db.collection('sales_orders').where('customer_key', '==', key)
+
+
+def order_entry(sale_id, sale_data):
+    """What a summary keeps of one sale"""
+    entry = {'id': sale_id}
+    for field in ORDER_FIELDS:
+        entry[field] = sale_data.get(field)
+    if sale_data.get('is_multiple_items') and not entry['product_name']:
+        items = sale_data.get('items') or []
+        entry['product_name'] = ', '.join(item.get('product_name', '') for item in items)
+        entry['quantity'] = sale_data.get('total_quantity', 0)
+    entry['status'] = entry['status'] or 'completed'
+    return entry
+
+
+def _newest_first(entry):
+    return instant(entry.get('created_at')) or 0
+
+
+def empty_summary(sale_data):
+    return {
+        'customer_name': (sale_data.get('customer_name') or '').strip(),
+        'customer_phone': (sale_data.get('customer_phone') or '').strip(),
+        'total_orders': 0,
+        'total_returned': 0,
+        'last_order_date': None,
+        'recent_orders': []
+    }
+
+
+def remove_sale(summary, sale_id, sale_data):
+    summary['total_orders'] -= 1
+    if sale_data.get('status') == 'returned':
+        summary['total_returned'] -= 1
+    summary['recent_orders'] = [entry for entry in summary['recent_orders'] if entry['id'] != sale_id]
+    if instant(summary.get('last_order_date')) == instant(sale_data.get('created_at')):
+        recent = summary['recent_orders']
+        summary['last_order_date'] = recent[0]['created_at'] if recent else None
+
+
+def add_sale(summary, sale_id, sale_data):
+    summary['total_orders'] += 1
+    if sale_data.get('status') == 'returned':
+        summary['total_returned'] += 1
+    created_at = sale_data.get('created_at')
+    if instant(created_at) is not None and (
+            summary['last_order_date'] is None
+            or instant(created_at) > instant(summary['last_order_date'])):
+        summary['last_order_date'] = created_at
+    recent = summary['recent_orders'] + [order_entry(sale_id, sale_data)]
+    recent.sort(key=_newest_first, reverse=True)
+    summary['recent_orders'] = recent[:RECENT_ORDERS]
+
+
+class CustomerSummaries:
+    """Reads and maintains the customer_summaries collection"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def reference(self, key):
+        return self.db.collection(COLLECTION).document(key)
+
+    def get(self, name, phone):
+        """A customer's summary document, or None"""
+        key = customer_key(name, phone)
+        if key is None:
+            return None
+        return self.reference(key).get().to_dict()
+
+    def prepare(self, transaction, sale_id, before, after):
+        """Read the summaries a sale change touches; returns the writes to stage
+
+        Writes are (reference, data, merge) with data None for a delete. They
+        are returned rather than staged because a Firestore transaction has to
+        finish all of its reads before the first write.
+        """
+        old_key, new_key = sale_key(before), sale_key(after)
+        if old_key == new_key and (old_key is None or (
+                order_entry(sale_id, before) == order_entry(sale_id, after))):
+            return []
+        summaries = {}
+        for key in {old_key, new_key} - {None}:
+            snapshot = self.reference(key).get(transaction=transaction)
+            summaries[key] = snapshot.to_dict() if snapshot.exists else None
+        if old_key and summaries[old_key] is not None:
+            summary = summaries[old_key]
+            remove_sale(summary, sale_id, before)
+            if len(summary['recent_orders']) < min(summary['total_orders'], RECENT_ORDERS):
+                self._refill(transaction, old_key, summary, sale_id)
+        if new_key:
+            if summaries[new_key] is None:
+                summaries[new_key] = empty_summary(after)
+            add_sale(summaries[new_key], sale_id, after)
+        writes = []
+        for key, summary in summaries.items():
+            if summary is not None:
+                writes.append((self.reference(key), summary if summary['total_orders'] > 0 else None, False))
+        return writes
+
+    def _refill(self, transaction, key, summary, removed_id):
+        """Reload a customer's newest orders after one left the recent list"""
+        entries = []
+        for doc in customer_sales(self.db, key).stream(transaction=transaction):
+            if doc.id != removed_id:
+                entries.append(order_entry(doc.id, doc.to_dict()))
+        entries.sort(key=_newest_first, reverse=True)
+        summary['recent_orders'] = entries[:RECENT_ORDERS]
+        summary['last_order_date'] = entries[0]['created_at'] if entries else None
+
+    @property
+    def keys_marker(self):
+        return self.db.collection(KEYS_MARKER[0]).document(KEYS_MARKER[1])
+
+    def ensure(self):
+        """Backfill once if sales exist but summaries or sale customer keys were never written"""
+        if self.db.collection(COLLECTION).limit(1).get() and self.keys_marker.get().exists:
+            return
+        if self.db.collection('sales_orders').limit(1).get():
+            print("Customer summaries or sale customer keys missing, backfilling from sales history")
+            self.backfill()
+
+    def backfill(self):
+        """Rebuild every summary from sales_orders; returns the customer count
+
+        Sales changed while the backfill runs can be missed, so run it when
+        the app is quiet.
+        """
+        summaries = {}
+        key_updates = []
+        for doc in self.db.collection('sales_orders').stream():
+            sale_data = doc.to_dict()
+            key = sale_key(sale_data)
+            if sale_data.get('customer_key') != key:
+                key_updates.append((doc.reference, {'customer_key': key}))
+            if key is None:
+                continue
+            if key not in summaries:
+                summaries[key] = empty_summary(sale_data)
+            add_sale(summaries[key], doc.id, sale_data)
+
+        writer = BatchWriter(self.db)
+        result = writer.set([(self.reference(key), summary) for key, summary in summaries.items()])
+        stale = [doc.reference for doc in self.db.collection(COLLECTION).stream() if doc.id not in summaries]
+        if stale:
+            writer.delete(stale)
+        if result.failed:
+            raise Exception(f'{len(result.failed)} chunks of customer summaries failed to save')
+        if key_updates:
+            result = writer.update(key_updates)
+            if result.failed:
+                raise Exception(f'{len(result.failed)} chunks of sale customer keys failed to save')
+        self.keys_marker.set({'backfilled_at': datetime.now()})
+        return len(summaries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build customer order summaries from sales history')
+    parser.add_argument('--backfill', action='store_true', required=True,
+                        help='rebuild every customer summary from sales_orders')
+    parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from app import init_firebase
+    db = init_firebase()
+
+    if db is None:
+        print("Firestore is not configured")
+        return 1
+    count = CustomerSummaries(db).backfill()
+    print(f"Wrote summaries for {count} customers")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
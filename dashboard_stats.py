@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Dashboard aggregates for THEO Clothing Inventory
+
+The dashboard figures live in one summary document (dashboard_stats/summary)
+instead of being recomputed from every product and sale on each visit.
+Routes that create, edit or delete products and sales commit the document
+write together with the matching counter deltas in one transaction, which
+reads the stored document first so the deltas are taken from the version
+being replaced; imports stage new products and their deltas in the same
+WriteBatch. Deltas are Increment transforms, which concurrent writers can
+apply without reading or overwriting each other's counts. Documents changed
+outside the app are not counted until the summary is rebuilt.
+
+Today's sales are kept per day in the summary's 'daily' map, keyed by the
+sale's creation date, so editing an older sale never changes today's figures.
+
+The 'usage' map counts the products using each category, size and color
+name, so the option pages read one document instead of querying products.
+Delete guards take their count from a count() aggregation, so a stale map
+can neither block nor allow a delete.
+
+rebuild() recomputes every figure from scratch. To verify or repair the
+stored summary, run:
+
+    python dashboard_stats.py --rebuild [--dry-run]
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+COLLECTION = 'dashboard_stats'
+SUMMARY_ID = 'summary'
+COUNTER_FIELDS = ['product_count', 'inventory_value', 'sales_count', 'returned_count', 'pending_deliveries']
+# Days of per-day sales totals kept by rebuild(); older days are only dropped there
+DAILY_RETENTION_DAYS = 90
+# Product field counted in the usage map, by the collection listing the options
+USAGE_FIELDS = {'categories': 'category', 'sizes': 'size', 'colors': 'color'}
+
+
+def day_key(value):
+    """Key of a date in the summary's daily map (field names must not start with a digit)"""
+    return value.strftime('d%Y%m%d')
+
+
+def usage_key(name):
+    """Key of an option name in the usage map (dots would split the field path)"""
+    return quote(str(name), safe='').replace('.', '%2E')
+
+
+def product_totals(product_data):
+    """What one product contributes to the summary"""
+    if not product_data:
+        return {}
+    totals = {
+        'product_count': 1,
+        'inventory_value': float(product_data.get('price') or 0)
+    }
+    for field in USAGE_FIELDS.values():
+        if product_data.get(field):
+            totals[f'usage.{field}.{usage_key(product_data[field])}'] = 1
+    return totals
+
+
+def sale_totals(sale_data):
+    """What one sales order contributes to the summary, as dotted field paths"""
+    if not sale_data:
+        return {}
+    returned = sale_data.get('status') == 'returned'
+    totals = {
+        'sales_count': 1,
+        'returned_count': 1 if returned else 0,
+        'pending_deliveries': 0 if returned or sale_data.get('delivered') else 1
+    }
+    created_at = sale_data.get('created_at')
+    if isinstance(created_at, datetime):
+        key = day_key(created_at)
+        totals[f'daily.{key}.sales_count'] = 1
+        totals[f'daily.{key}.sales_total'] = float(sale_data.get('total_price') or 0)
+    return totals
+
+
+TOTALS = {
+    'products': product_totals,
+    'sales_orders': sale_totals
+}
+
+
+def totals_delta(collection, before, after):
+    """Field deltas between two versions of a document (None when absent)"""
+    totals = TOTALS[collection]
+    old, new = totals(before), totals(after)
+    delta = {}
+    for field in set(old) | set(new):
+        change = new.get(field, 0) - old.get(field, 0)
+        if change:
+            delta[field] = change
+    return delta
+
+
+def _nested(delta, wrap):
+    """Turn dotted field paths into the nested maps set(merge=True) expects"""
+    result = {}
+    for field_path, value in delta.items():
+        parts = field_path.split('.')
+        target = result
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = wrap(value)
+    return result
+
+
+class DashboardStats:
+    """Reads and maintains the dashboard summary document"""
+
+    def __init__(self, db):
+        self.db = db
+
+    @property
+    def summary_ref(self):
+        return self.db.collection(COLLECTION).document(SUMMARY_ID)
+
+    def stage(self, batch, delta):
+        """Add counter deltas to a batch; merge=True creates the summary if needed"""
+        if delta:
+            # Imported on first use to keep the client library off the startup path
+            from firebase_admin import firestore
+            batch.set(self.summary_ref, _nested(delta, firestore.Increment), merge=True)
+
+    def stage_write(self, writer, reference, before=None, after=None, updates=None):
+        """Stage a product or sale change and its summary deltas on a batch or transaction
+
+        before: the stored document, or None when creating it.
+        after: the full new document, or None when deleting it.
+        updates: field updates to apply with update() instead of set(after).
+        """
+        collection = reference.parent.id
+        if updates is not None:
+            after = {**(before or {}), **updates}
+            writer.update(reference, updates)
+        elif after is None:
+            writer.delete(reference)
+        else:
+            writer.set(reference, after)
+        self.stage(writer, totals_delta(collection, before, after))
+
+    def write(self, reference, after=None, updates=None):
+        """Commit a change and its summary deltas in one transaction; see stage_write()
+
+        The stored document is read inside the transaction, so a repeated or
+        concurrent change is counted against the version it replaces.
+        after: the new document when creating it; updates: fields to update();
+        with neither, the document is deleted.
+
+        Returns the stored document as read before the change ({} when
+        created), or None when nothing was written because the document does
+        not exist (or already exists when creating).
+        """
+        from firebase_admin import firestore
+
+        @firestore.transactional
+        def apply(transaction):
+            snapshot = reference.get(transaction=transaction)
+            if snapshot.exists == (after is not None and updates is None):
+                return None
+            before = snapshot.to_dict() if snapshot.exists else None
+            self.stage_write(transaction, reference, before, after, updates)
+            return before or {}
+
+        return apply(self.db.transaction())
+
+    def stage_created(self, batch, collection, documents):
+        """Stage the deltas for documents created in the same batch"""
+        delta = {}
+        for document_data in documents:
+            for field, value in totals_delta(collection, None, document_data).items():
+                delta[field] = delta.get(field, 0) + value
+        self.stage(batch, delta)
+
+    def read(self, today=None):
+        """Dashboard figures from the summary document; None if it was never built"""
+        summary = self.summary_ref.get().to_dict()
+        if summary is None:
+            return None
+        return figures(summary, today)
+
+    def ensure(self):
+        """Build the summary if it does not exist yet (e.g. first start after upgrading)"""
+        summary = self.summary_ref.get().to_dict()
+        if summary is None:
+            print("Dashboard summary missing, rebuilding from products and sales")
+            self.rebuild()
+        elif 'usage' not in summary:
+            print("Product usage counts missing, rebuilding the dashboard summary")
+            self.rebuild()
+
+    def usage(self, collection):
+        """{usage_key(name): products} for 'categories', 'sizes' or 'colors'; None before the map is built"""
+        summary = self.summary_ref.get().to_dict()
+        if summary is None or 'usage' not in summary:
+            return None
+        return summary['usage'].get(USAGE_FIELDS[collection], {})
+
+    def count_usage(self, collection, name):
+        """Products using an option, from a count() aggregation over products"""
+        query = self.db.collection('products').where(USAGE_FIELDS[collection], '==', name)
+        return query.count(alias='total').get()[0][0].value
+
+    def usage_count(self, collection, name):
+        """Products using an option, for delete guards
+
+        The count always comes from count_usage(); a summary count that
+        disagrees with it is reported.
+        """
+        count = self.count_usage(collection, name)
+        counts = self.usage(collection)
+        stored = counts.get(usage_key(name), 0) if counts is not None else count
+        if stored != count:
+            print(f"Usage count for {USAGE_FIELDS[collection]} '{name}' is {stored} but {count} products use it; "
+                  f"run dashboard_stats.py --rebuild")
+        return count
+
+    def compute(self, today=None):
+        """Recompute the summary document from every product and sale"""
+        summary = {field: 0 for field in COUNTER_FIELDS}
+        summary['inventory_value'] = 0.0
+        summary['daily'] = {}
+        summary['usage'] = {field: {} for field in USAGE_FIELDS.values()}
+        for collection in TOTALS:
+            for doc in self.db.collection(collection).stream():
+                for field_path, value in TOTALS[collection](doc.to_dict()).items():
+                    parts = field_path.split('.')
+                    target = summary
+                    for part in parts[:-1]:
+                        target = target.setdefault(part, {})
+                    target[parts[-1]] = target.get(parts[-1], 0) + value
+        oldest = day_key((today or datetime.now()) - timedelta(days=DAILY_RETENTION_DAYS))
+        summary['daily'] = {key: value for key, value in summary['daily'].items() if key >= oldest}
+        return summary
+
+    def rebuild(self, write=True):
+        """Recompute the summary; returns (computed, differences from the stored summary)
+
+        Writes that land while the collections are being read can be missed,
+        so run this when the app is quiet.
+        """
+        computed = self.compute()
+        stored = self.summary_ref.get().to_dict() or {}
+        differences = {}
+        current, expected = figures(stored), figures(computed)
+        for field in expected:
+            if abs((current.get(field) or 0) - (expected[field] or 0)) > 0.005:
+                differences[field] = (current.get(field), expected[field])
+        for field in USAGE_FIELDS.values():
+            stored_counts = (stored.get('usage') or {}).get(field, {})
+            computed_counts = computed['usage'].get(field, {})
+            for key in set(stored_counts) | set(computed_counts):
+                if stored_counts.get(key, 0) != computed_counts.get(key, 0):
+                    differences[f'usage.{field}.{key}'] = (stored_counts.get(key), computed_counts.get(key, 0))
+        if write:
+            self.summary_ref.set({**computed, 'rebuilt_at': datetime.now()})
+        return computed, differences
+
+
+def figures(summary, today=None):
+    """The values the dashboard shows, from a summary document"""
+    today_totals = (summary.get('daily') or {}).get(day_key(today or datetime.now()), {})
+    sales_count = summary.get('sales_count', 0)
+    returned_count = summary.get('returned_count', 0)
+    return {
+        'total_products': summary.get('product_count', 0),
+        'total_value': summary.get('inventory_value', 0.0),
+        'today_sales_count': today_totals.get('sales_count', 0),
+        'today_sales_total': today_totals.get('sales_total', 0.0),
+        'pending_deliveries': summary.get('pending_deliveries', 0),
+        'sales_count': sales_count,
+        'returned_count': returned_count,
+        'return_rate': (returned_count / sales_count * 100) if sales_count else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild the dashboard summary document')
+    parser.add_argument('--rebuild', action='store_true', required=True,
+                        help='recompute the summary from every product and sale')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='only report differences, do not write the summary')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from app import init_firebase
+    db = init_firebase()
+
+    if db is None:
+        print("Firestore is not configured")
+        return 1
+    computed, differences = DashboardStats(db).rebuild(write=not args.dry_run)
+    for field, (stored, expected) in sorted(differences.items()):
+        print(f"{field}: stored {stored}, recomputed {expected}")
+    if not differences:
+        print("Summary matches the recomputed figures")
+    print("Dry run, summary not written" if args.dry_run else "Summary rewritten")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""
+Streaming Excel exports for THEO Clothing Inventory
+
+Workbooks are built with openpyxl's write_only mode: rows are appended as
+tuples and flushed to a temporary file as they arrive, so an export never
+holds the whole sheet in memory. The finished file is spooled to disk and
+sent to the client in blocks.
+"""
+
+import tempfile
+import time
+
+from flask import send_file
+
+import metrics
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+MAX_COLUMN_WIDTH = 50
+
+
+def write_xlsx(output, title, headers, rows, column_widths=None):
+    """Write a single-sheet workbook to a path or binary file; returns the row count
+
+    rows may be any iterable of tuples, e.g. a generator over Firestore stream().
+    column_widths must be known up front because write_only sheets cannot be
+    resized after rows are written.
+    """
+    # openpyxl is slow to import, so it is only loaded when an export runs
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+
+    start_time = time.perf_counter()
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title)
+    for index, width in enumerate(column_widths or [], 1):
+        if width:
+            sheet.column_dimensions[get_column_letter(index)].width = width
+    sheet.append(headers)
+    count = 0
+    for row in rows:
+        sheet.append(row)
+        count += 1
+    workbook.save(output)
+    metrics.observe_excel('export', title, count, time.perf_counter() - start_time)
+    return count
+
+
+def fit_column_widths(headers, rows):
+    """Column widths that fit the longest value, for rows already in memory"""
+    widths = [len(str(header)) for header in headers]
+    for row in rows:
+        for index, value in enumerate(row):
+            if value is not None:
+                widths[index] = max(widths[index], len(str(value)))
+    return [min(width + 2, MAX_COLUMN_WIDTH) for width in widths]
+
+
+def xlsx_file():
+    """Anonymous temporary file to build an export in; removed once closed"""
+    return tempfile.TemporaryFile()
+
+
+def send_xlsx(output, filename):
+    """Send a finished export file to the client in blocks"""
+    output.seek(0)
+    return send_file(output, mimetype=XLSX_MIMETYPE, as_attachment=True, download_name=filename)
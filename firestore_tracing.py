@@ -0,0 +1,373 @@
+"""
+Firestore call instrumentation for THEO Clothing Inventory
+
+TracedClient wraps a Firestore client (or the local stand-in) and reports
+every read and write to its observers as
+
+    observer(operation, collection, documents, seconds)
+
+operation is one of get, query, count, add, create, set, update, delete or
+commit. documents is the number of documents read or written; a commit is
+reported once per collection it wrote to, each with the commit's latency.
+Query results are reported once the stream is exhausted (or closed).
+
+RequestTrace adds up the calls made while handling one request, so the app
+can report what a page view cost in reads and writes.
+
+References, queries, batches, transactions and snapshots handed out by the
+wrapper are wrapped as well, so doc.reference.update() on a streamed
+document is counted too. Anything else is passed through to the wrapped
+object unchanged.
+"""
+
+import time
+
+READ_OPERATIONS = ('get', 'query', 'count')
+WRITE_OPERATIONS = ('add', 'create', 'set', 'update', 'delete', 'commit')
+
+
+class RequestTrace:
+    """Firestore usage of one request, fed by a TracedClient observer"""
+
+    def __init__(self):
+        self.calls = 0
+        self.reads = 0
+        self.writes = 0
+        self.seconds = 0.0
+        self.by_call = {}  # (collection, operation) -> [calls, documents, seconds]
+
+    def record(self, operation, collection, documents, seconds):
+        self.calls += 1
+        self.seconds += seconds
+        if operation in READ_OPERATIONS:
+            self.reads += documents
+        elif operation in WRITE_OPERATIONS:
+            self.writes += documents
+        totals = self.by_call.setdefault((collection, operation), [0, 0, 0.0])
+        totals[0] += 1
+        totals[1] += documents
+        totals[2] += seconds
+
+    def summary(self):
+        """Header value, e.g. 'calls=4;reads=812;writes=0;ms=35.2'"""
+        return f'calls={self.calls};reads={self.reads};writes={self.writes};ms={self.seconds * 1000:.1f}'
+
+    def breakdown(self, limit=5):
+        """The costliest collection/operation pairs by documents, for log lines"""
+        ranked = sorted(self.by_call.items(), key=lambda item: (-item[1][1], -item[1][2]))
+        return ', '.join(f'{collection}.{operation} x{calls}: {documents} docs, {seconds * 1000:.1f} ms'
+                         for (collection, operation), (calls, documents, seconds) in ranked[:limit])
+
+
+def unwrap(value):
+    """The underlying Firestore object of a wrapper (or value itself)"""
+    return getattr(value, '_wrapped', value)
+
+
+class _Traced:
+    """Attribute passthrough to the wrapped object"""
+
+    __slots__ = ('_wrapped', '_client')
+
+    def __init__(self, wrapped, client):
+        self._wrapped = wrapped
+        self._client = client
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    def __eq__(self, other):
+        return self._wrapped == unwrap(other)
+
+    def __hash__(self):
+        return hash(self._wrapped)
+
+    def __repr__(self):
+        return f'<traced {self._wrapped!r}>'
+
+
+class TracedClient(_Traced):
+    """Firestore client whose calls are reported to observers"""
+
+    __slots__ = ('observers',)
+
+    def __init__(self, client, observers=()):
+        super().__init__(client, self)
+        self.observers = list(observers)
+
+    def add_observer(self, observer):
+        self.observers.append(observer)
+
+    def record(self, operation, collection, documents, seconds):
+        for observer in self.observers:
+            try:
+                observer(operation, collection, documents, seconds)
+            except Exception as e:
+                print(f"Firestore observer failed: {e}")
+
+    def collection(self, collection_id, *path):
+        return TracedQuery(self._wrapped.collection(collection_id, *path), self, path[-1] if path else collection_id)
+
+    def document(self, *path):
+        return TracedDocument(self._wrapped.document(*path), self)
+
+    def get_all(self, references, *args, **kwargs):
+        references = [unwrap(reference) for reference in references]
+        kwargs = _unwrap_transaction(kwargs)
+        start = time.perf_counter()
+        try:
+            for snapshot in self._wrapped.get_all(references, *args, **kwargs):
+                yield TracedSnapshot(snapshot, self)
+        finally:
+            # Every requested document is a read, found or not
+            reads = {}
+            for reference in references:
+                reads[reference.parent.id] = reads.get(reference.parent.id, 0) + 1
+            seconds = time.perf_counter() - start
+            for collection, documents in reads.items():
+                self.record('get', collection, documents, seconds)
+
+    def batch(self):
+        return TracedBatch(self._wrapped.batch(), self)
+
+    def transaction(self, **kwargs):
+        return TracedTransaction(self._wrapped.transaction(**kwargs), self)
+
+
+class TracedSnapshot(_Traced):
+    __slots__ = ()
+
+    @property
+    def id(self):
+        return self._wrapped.id
+
+    @property
+    def exists(self):
+        return self._wrapped.exists
+
+    @property
+    def reference(self):
+        return TracedDocument(self._wrapped.reference, self._client)
+
+    def to_dict(self):
+        return self._wrapped.to_dict()
+
+    def get(self, field_path):
+        return self._wrapped.get(field_path)
+
+
+class TracedDocument(_Traced):
+    __slots__ = ()
+
+    @property
+    def id(self):
+        return self._wrapped.id
+
+    @property
+    def _collection(self):
+        return self._wrapped.parent.id
+
+    def _call(self, operation, documents, method, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            self._client.record(operation, self._collection, documents, time.perf_counter() - start)
+
+    def get(self, *args, **kwargs):
+        kwargs = _unwrap_transaction(kwargs)
+        start = time.perf_counter()
+        try:
+            return TracedSnapshot(self._wrapped.get(*args, **kwargs), self._client)
+        finally:
+            # A missing document still costs a read
+            self._client.record('get', self._collection, 1, time.perf_counter() - start)
+
+    def create(self, document_data):
+        return self._call('create', 1, self._wrapped.create, document_data)
+
+    def set(self, document_data, merge=False):
+        return self._call('set', 1, self._wrapped.set, document_data, merge=merge)
+
+    def update(self, field_updates, *args, **kwargs):
+        return self._call('update', 1, self._wrapped.update, field_updates, *args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        return self._call('delete', 1, self._wrapped.delete, *args, **kwargs)
+
+    def collection(self, collection_id):
+        return TracedQuery(self._wrapped.collection(collection_id), self._client, collection_id)
+
+
+def _unwrap_transaction(kwargs):
+    if kwargs.get('transaction') is not None:
+        kwargs = {**kwargs, 'transaction': unwrap(kwargs['transaction'])}
+    return kwargs
+
+
+class TracedQuery(_Traced):
+    """A collection reference or query; refinements return traced queries"""
+
+    __slots__ = ('_collection',)
+
+    def __init__(self, query, client, collection):
+        super().__init__(query, client)
+        self._collection = collection
+
+    def _refine(self, query):
+        return TracedQuery(query, self._client, self._collection)
+
+    def where(self, *args, **kwargs):
+        return self._refine(self._wrapped.where(*args, **kwargs))
+
+    def order_by(self, *args, **kwargs):
+        return self._refine(self._wrapped.order_by(*args, **kwargs))
+
+    def limit(self, count):
+        return self._refine(self._wrapped.limit(count))
+
+    def offset(self, count):
+        return self._refine(self._wrapped.offset(count))
+
+    def select(self, field_paths):
+        return self._refine(self._wrapped.select(field_paths))
+
+    def start_at(self, cursor):
+        return self._refine(self._wrapped.start_at(unwrap(cursor)))
+
+    def start_after(self, cursor):
+        return self._refine(self._wrapped.start_after(unwrap(cursor)))
+
+    def end_at(self, cursor):
+        return self._refine(self._wrapped.end_at(unwrap(cursor)))
+
+    def end_before(self, cursor):
+        return self._refine(self._wrapped.end_before(unwrap(cursor)))
+
+    def document(self, *args):
+        return TracedDocument(self._wrapped.document(*args), self._client)
+
+    def add(self, document_data, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            update_time, reference = self._wrapped.add(document_data, *args, **kwargs)
+            return update_time, TracedDocument(reference, self._client)
+        finally:
+            self._client.record('add', self._collection, 1, time.perf_counter() - start)
+
+    def stream(self, *args, **kwargs):
+        kwargs = _unwrap_transaction(kwargs)
+        start = time.perf_counter()
+        count = 0
+        try:
+            for snapshot in self._wrapped.stream(*args, **kwargs):
+                count += 1
+                yield TracedSnapshot(snapshot, self._client)
+        finally:
+            self._client.record('query', self._collection, count, time.perf_counter() - start)
+
+    def get(self, *args, **kwargs):
+        kwargs = _unwrap_transaction(kwargs)
+        start = time.perf_counter()
+        snapshots = []
+        try:
+            snapshots = [TracedSnapshot(snapshot, self._client)
+                         for snapshot in self._wrapped.get(*args, **kwargs)]
+            return snapshots
+        finally:
+            self._client.record('query', self._collection, len(snapshots), time.perf_counter() - start)
+
+    def count(self, *args, **kwargs):
+        return TracedAggregation(self._wrapped.count(*args, **kwargs), self._client, self._collection)
+
+
+class TracedAggregation(_Traced):
+    __slots__ = ('_collection',)
+
+    def __init__(self, query, client, collection):
+        super().__init__(query, client)
+        self._collection = collection
+
+    def get(self, *args, **kwargs):
+        kwargs = _unwrap_transaction(kwargs)
+        start = time.perf_counter()
+        try:
+            return self._wrapped.get(*args, **kwargs)
+        finally:
+            # Billed as one read per batch of up to 1000 index entries
+            self._client.record('count', self._collection, 1, time.perf_counter() - start)
+
+
+class TracedBatch(_Traced):
+    """WriteBatch that reports its writes per collection when committed"""
+
+    __slots__ = ('_writes',)
+
+    def __init__(self, batch, client):
+        super().__init__(batch, client)
+        self._writes = {}
+
+    def _note(self, reference):
+        collection = unwrap(reference).parent.id
+        self._writes[collection] = self._writes.get(collection, 0) + 1
+
+    def __len__(self):
+        return len(self._wrapped)
+
+    def create(self, reference, document_data):
+        self._note(reference)
+        return self._wrapped.create(unwrap(reference), document_data)
+
+    def set(self, reference, document_data, merge=False):
+        self._note(reference)
+        return self._wrapped.set(unwrap(reference), document_data, merge=merge)
+
+    def update(self, reference, field_updates, *args, **kwargs):
+        self._note(reference)
+        return self._wrapped.update(unwrap(reference), field_updates, *args, **kwargs)
+
+    def delete(self, reference, *args, **kwargs):
+        self._note(reference)
+        return self._wrapped.delete(unwrap(reference), *args, **kwargs)
+
+    def _report(self, start):
+        seconds = time.perf_counter() - start
+        writes, self._writes = self._writes, {}
+        for collection, documents in writes.items():
+            self._client.record('commit', collection, documents, seconds)
+
+    def commit(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._wrapped.commit(*args, **kwargs)
+        finally:
+            self._report(start)
+
+
+class TracedTransaction(TracedBatch):
+    """Transaction for firestore.transactional; reads go through traced references"""
+
+    __slots__ = ()
+
+    def get(self, ref_or_query, *args, **kwargs):
+        if isinstance(ref_or_query, TracedDocument):
+            return iter([ref_or_query.get(transaction=self)])
+        if isinstance(ref_or_query, TracedQuery):
+            return ref_or_query.stream(transaction=self)
+        return self._wrapped.get(ref_or_query, *args, **kwargs)
+
+    def _commit(self, *args, **kwargs):
+        # Called by firestore.transactional once the function has returned
+        start = time.perf_counter()
+        try:
+            return self._wrapped._commit(*args, **kwargs)
+        finally:
+            self._report(start)
+
+    def _rollback(self, *args, **kwargs):
+        self._writes = {}
+        return self._wrapped._rollback(*args, **kwargs)
+
+    def _clean_up(self, *args, **kwargs):
+        self._writes = {}
+        return self._wrapped._clean_up(*args, **kwargs)
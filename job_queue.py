@@ -0,0 +1,265 @@
+"""
+Background jobs for THEO Clothing Inventory
+
+Long-running work (Excel imports, large exports, bulk QR generation) is
+queued here instead of running inside the request. Jobs are stored in a
+local SQLite file, so every gunicorn worker on the host can report their
+status and a job queued or interrupted by a worker restart is picked up
+again. Each worker runs a dispatcher thread that claims queued jobs and
+executes them on a small thread pool.
+"""
+
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+FINISHED_JOB_RETENTION = timedelta(days=7)
+
+_COLUMNS = ['id', 'kind', 'status', 'params', 'created_by', 'created_at', 'updated_at',
+            'owner', 'progress', 'total', 'message', 'error', 'result_file', 'download_name']
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobContext:
+    """Handed to a job handler: parameters, working folder and progress reporting"""
+
+    def __init__(self, queue, job):
+        self._queue = queue
+        self.id = job['id']
+        self.kind = job['kind']
+        self.params = job['params']
+        self.created_by = job['created_by']
+        self.folder = queue.job_folder(self.id)
+        self.result_file = None
+        self.download_name = None
+
+    def set_progress(self, done, total=None, message=None):
+        self._queue._update(self.id, progress=done, total=total, message=message)
+
+    def result_path(self, download_name):
+        """Path the handler writes its downloadable result to"""
+        self.download_name = download_name
+        self.result_file = os.path.join(self.folder, 'result' + os.path.splitext(download_name)[1])
+        return self.result_file
+
+
+class JobQueue:
+    """SQLite backed job queue with a per-process dispatcher thread"""
+
+    def __init__(self, path, folder, max_workers=2, poll_interval=2.0):
+        self.path = path
+        self.folder = os.path.abspath(folder)
+        self.max_workers = max(1, max_workers)
+        self.poll_interval = poll_interval
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._handlers = {}
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._slots = threading.Semaphore(self.max_workers)
+        self._executor = None
+        self._dispatcher = None
+        self._stopping = False
+        os.makedirs(self.folder, exist_ok=True)
+        connection = self._connection()
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, params TEXT, '
+            'created_by TEXT, created_at TEXT NOT NULL, updated_at TEXT NOT NULL, owner TEXT, '
+            'progress INTEGER DEFAULT 0, total INTEGER, message TEXT, error TEXT, '
+            'result_file TEXT, download_name TEXT)'
+        )
+        connection.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)')
+        connection.commit()
+
+    def _connection(self):
+        # One connection per thread; request threads and job threads never share one
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+        return connection
+
+    def register(self, kind, handler):
+        """handler(context) runs the job and returns a message for the user"""
+        self._handlers[kind] = handler
+
+    def job_folder(self, job_id):
+        return os.path.join(self.folder, job_id)
+
+    def submit(self, kind, params=None, created_by=None, files=None):
+        """Queue a job; files maps names to bytes saved in the job folder first"""
+        if kind not in self._handlers:
+            raise ValueError(f'Unknown job type: {kind}')
+        job_id = uuid.uuid4().hex
+        os.makedirs(self.job_folder(job_id), exist_ok=True)
+        for name, content in (files or {}).items():
+            with open(os.path.join(self.job_folder(job_id), name), 'wb') as handle:
+                handle.write(content)
+        now = datetime.now().isoformat()
+        connection = self._connection()
+        connection.execute(
+            'INSERT INTO jobs (id, kind, status, params, created_by, created_at, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (job_id, kind, QUEUED, json.dumps(params or {}), created_by, now, now)
+        )
+        connection.commit()
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        row = self._connection().execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return self._job(row) if row else None
+
+    def list(self, created_by=None, kind=None, limit=20):
+        query = f"SELECT {', '.join(_COLUMNS)} FROM jobs"
+        conditions, args = [], ()
+        if created_by is not None:
+            conditions.append('created_by = ?')
+            args += (created_by,)
+        if kind is not None:
+            conditions.append('kind = ?')
+            args += (kind,)
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY created_at DESC LIMIT ?'
+        rows = self._connection().execute(query, args + (limit,)).fetchall()
+        return [self._job(row) for row in rows]
+
+    def _job(self, row):
+        job = dict(zip(_COLUMNS, row))
+        job['params'] = json.loads(job['params'] or '{}')
+        return job
+
+    def _update(self, job_id, **fields):
+        fields = {name: value for name, value in fields.items() if value is not None}
+        fields['updated_at'] = datetime.now().isoformat()
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        connection = self._connection()
+        connection.execute(f'UPDATE jobs SET {assignments} WHERE id = ?', (*fields.values(), job_id))
+        connection.commit()
+
+    def _claim(self):
+        """Mark the oldest queued job as ours; returns it or None"""
+        connection = self._connection()
+        while True:
+            row = connection.execute(
+                'SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1', (QUEUED,)
+            ).fetchone()
+            if row is None:
+                return None
+            claimed = connection.execute(
+                'UPDATE jobs SET status = ?, owner = ?, updated_at = ? WHERE id = ? AND status = ?',
+                (RUNNING, self.owner, datetime.now().isoformat(), row[0], QUEUED)
+            ).rowcount
+            connection.commit()
+            if claimed:
+                return self.get(row[0])
+            # Another worker claimed it first; try the next one
+
+    def recover(self):
+        """Requeue jobs left running by a process on this host that no longer exists"""
+        host = socket.gethostname()
+        connection = self._connection()
+        rows = connection.execute('SELECT id, owner FROM jobs WHERE status = ?', (RUNNING,)).fetchall()
+        for job_id, owner in rows:
+            owner_host, _, pid = (owner or '').rpartition(':')
+            if owner_host == host and pid.isdigit() and not _process_alive(int(pid)):
+                connection.execute(
+                    'UPDATE jobs SET status = ?, owner = NULL, updated_at = ? WHERE id = ? AND status = ?',
+                    (QUEUED, datetime.now().isoformat(), job_id, RUNNING)
+                )
+                print(f"Requeued interrupted job {job_id}")
+        connection.commit()
+
+    def purge(self, older_than=FINISHED_JOB_RETENTION):
+        """Remove finished jobs and their files after the retention period"""
+        cutoff = (datetime.now() - older_than).isoformat()
+        connection = self._connection()
+        rows = connection.execute(
+            'SELECT id FROM jobs WHERE status IN (?, ?) AND updated_at < ?', (COMPLETED, FAILED, cutoff)
+        ).fetchall()
+        for (job_id,) in rows:
+            shutil.rmtree(self.job_folder(job_id), ignore_errors=True)
+            connection.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+        connection.commit()
+
+    def _run(self, job):
+        context = JobContext(self, job)
+        try:
+            handler = self._handlers[job['kind']]
+            message = handler(context)
+            self._update(job['id'], status=COMPLETED, message=message or 'Done',
+                         result_file=context.result_file, download_name=context.download_name)
+        except Exception as e:
+            print(f"Job {job['id']} ({job['kind']}) failed: {e}")
+            self._update(job['id'], status=FAILED, error=str(e))
+        finally:
+            self._slots.release()
+            self._wakeup.set()
+
+    def _dispatch(self):
+        while not self._stopping:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            while not self._stopping and self._slots.acquire(blocking=False):
+                try:
+                    job = self._claim()
+                except Exception as e:
+                    print(f"Error claiming job: {e}")
+                    job = None
+                if job is None:
+                    self._slots.release()
+                    break
+                self._executor.submit(self._run, job)
+
+    def start(self):
+        """Recover interrupted jobs and start dispatching in this process"""
+        if self._dispatcher is not None:
+            return
+        self.recover()
+        self.purge()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job')
+        self._dispatcher = threading.Thread(target=self._dispatch, name='job-dispatcher', daemon=True)
+        self._dispatcher.start()
+        self._wakeup.set()
+
+    def stop(self, wait=True):
+        self._stopping = True
+        self._wakeup.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+
+    def wait(self, job_id, timeout=None):
+        """Block until a job finishes (used by scripts and tests)"""
+        deadline = time.time() + timeout if timeout else None
+        while True:
+            job = self.get(job_id)
+            if job is None or job['status'] in (COMPLETED, FAILED):
+                return job
+            if deadline and time.time() > deadline:
+                return job
+            time.sleep(0.1)
@@ -0,0 +1,925 @@
+"""
+Local stand-in for the Firestore client used by THEO Clothing Inventory
+
+Implements the part of the google-cloud-firestore client API that app.py uses
+(collections, documents, where/order_by/limit/start_after queries, count
+aggregations, write batches, transactions and on_snapshot listeners) on top of an
+in-memory or SQLite store, so the application can run and be profiled
+without a live Firebase project.
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from enum import Enum
+
+
+def _firestore_transforms():
+    """Firestore's transforms module, if the client library has been imported
+
+    Sentinels and transforms can only come from that module, so checking for
+    them never needs to import the (slow to load) client library.
+    """
+    return sys.modules.get('google.cloud.firestore_v1.transforms')
+
+
+# Collections managed by the application
+APP_COLLECTIONS = [
+    'products',
+    'sales_orders',
+    'production_orders',
+    'customers',
+    'categories',
+    'sizes',
+    'colors',
+    'users',
+    'activities'
+]
+
+ASCENDING = 'ASCENDING'
+DESCENDING = 'DESCENDING'
+
+
+def _copy_value(value):
+    """Copy a document value the way a Firestore round trip would"""
+    if isinstance(value, dict):
+        return {key: _copy_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy_value(item) for item in value]
+    return value
+
+
+def _get_field(data, field_path):
+    """Resolve a dotted field path; returns (found, value)"""
+    value = data
+    for part in field_path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return False, None
+        value = value[part]
+    return True, value
+
+
+def _document_field(doc_id, data, field_path):
+    """Like _get_field, with '__name__' resolving to the document ID"""
+    if field_path == '__name__':
+        return True, doc_id
+    return _get_field(data, field_path)
+
+
+def _resolve_transform(current, value):
+    """Apply Firestore sentinels and transforms (Increment, SERVER_TIMESTAMP, ...)"""
+    firestore_transforms = _firestore_transforms()
+    if firestore_transforms is None:
+        return value
+    if value is firestore_transforms.SERVER_TIMESTAMP:
+        return datetime.now()
+    if isinstance(value, firestore_transforms.Increment):
+        base = current if isinstance(current, (int, float)) else 0
+        return base + value.value
+    if isinstance(value, firestore_transforms.Maximum):
+        return value.value if not isinstance(current, (int, float)) else max(current, value.value)
+    if isinstance(value, firestore_transforms.Minimum):
+        return value.value if not isinstance(current, (int, float)) else min(current, value.value)
+    if isinstance(value, firestore_transforms.ArrayUnion):
+        result = list(current) if isinstance(current, list) else []
+        for item in value.values:
+            if item not in result:
+                result.append(item)
+        return result
+    if isinstance(value, firestore_transforms.ArrayRemove):
+        result = list(current) if isinstance(current, list) else []
+        return [item for item in result if item not in value.values]
+    return value
+
+
+def _check_transaction_read(transaction):
+    """Firestore transactions must do all their reads before any write"""
+    if transaction is not None and transaction._operations:
+        raise ValueError('Attempted read after write in a transaction.')
+
+
+def _is_delete_sentinel(value):
+    firestore_transforms = _firestore_transforms()
+    return firestore_transforms is not None and value is firestore_transforms.DELETE_FIELD
+
+
+def _set_field(data, field_path, value):
+    """Set a dotted field path, creating intermediate maps"""
+    parts = field_path.split('.')
+    target = data
+    for part in parts[:-1]:
+        if not isinstance(target.get(part), dict):
+            target[part] = {}
+        target = target[part]
+
+    if _is_delete_sentinel(value):
+        target.pop(parts[-1], None)
+    else:
+        target[parts[-1]] = _resolve_transform(target.get(parts[-1]), _copy_value(value))
+
+
+def _merge_data(existing, data):
+    """Deep-merge data into existing for set(..., merge=True)"""
+    for key, value in data.items():
+        if isinstance(value, dict):
+            if not isinstance(existing.get(key), dict):
+                existing[key] = {}
+            _merge_data(existing[key], value)
+        elif _is_delete_sentinel(value):
+            existing.pop(key, None)
+        else:
+            existing[key] = _resolve_transform(existing.get(key), _copy_value(value))
+
+
+def _strip_transforms(data):
+    """Resolve transforms in a full document write"""
+    result = {}
+    for key, value in data.items():
+        if _is_delete_sentinel(value):
+            continue
+        if isinstance(value, dict):
+            result[key] = _strip_transforms(value)
+        else:
+            result[key] = _resolve_transform(None, _copy_value(value))
+    return result
+
+
+def _sort_key(value):
+    """Order values by Firestore type order, then by value"""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            return (3, value.timestamp())
+        return (3, value.astimezone(timezone.utc).timestamp())
+    if isinstance(value, str):
+        return (4, value)
+    if isinstance(value, bytes):
+        return (5, value)
+    if isinstance(value, list):
+        return (7, [_sort_key(item) for item in value])
+    if isinstance(value, dict):
+        return (8, sorted((key, _sort_key(item)) for key, item in value.items()))
+    return (6, str(value))
+
+
+def _compare(left, op, right):
+    """Evaluate a single where() filter"""
+    if op == '==':
+        return left == right
+    if op == '!=':
+        return left is not None and left != right
+    if op == 'in':
+        return left in right
+    if op == 'not-in':
+        return left is not None and left not in right
+    if op == 'array_contains':
+        return isinstance(left, list) and right in left
+    if op == 'array_contains_any':
+        return isinstance(left, list) and any(item in left for item in right)
+
+    left_key, right_key = _sort_key(left), _sort_key(right)
+    if left_key[0] != right_key[0]:
+        return False
+    if op == '<':
+        return left_key < right_key
+    if op == '<=':
+        return left_key <= right_key
+    if op == '>':
+        return left_key > right_key
+    if op == '>=':
+        return left_key >= right_key
+    raise ValueError(f'Unsupported operator: {op}')
+
+
+# JSON codec shared by the SQLite store and the dump/load helpers
+class _DocumentEncoder(json.JSONEncoder):
+    def default(self, o):
+        if isinstance(o, datetime):
+            return {'__datetime__': o.isoformat()}
+        if isinstance(o, bytes):
+            return {'__bytes__': o.hex()}
+        return super().default(o)
+
+
+def _decode_object(obj):
+    if '__datetime__' in obj and len(obj) == 1:
+        return datetime.fromisoformat(obj['__datetime__'])
+    if '__bytes__' in obj and len(obj) == 1:
+        return bytes.fromhex(obj['__bytes__'])
+    return obj
+
+
+def encode_document(data):
+    return json.dumps(data, cls=_DocumentEncoder, ensure_ascii=False)
+
+
+def decode_document(text):
+    return json.loads(text, object_hook=_decode_object)
+
+
+class MemoryStore:
+    """Documents held in process memory"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.collections = {}
+        self._bulk_depth = 0
+        self._undo = {}  # (collection, doc_id) -> document before the bulk, or None
+
+    # Stored documents are replaced on every write, never mutated in place,
+    # so get() and scan() hand them out without copying, and bulk() can
+    # restore a document by putting its old version back
+
+    def _remember(self, collection, doc_id):
+        if self._bulk_depth and (collection, doc_id) not in self._undo:
+            self._undo[(collection, doc_id)] = self.collections.get(collection, {}).get(doc_id)
+
+    def get(self, collection, doc_id):
+        with self.lock:
+            return self.collections.get(collection, {}).get(doc_id)
+
+    def put(self, collection, doc_id, data):
+        with self.lock:
+            self._remember(collection, doc_id)
+            self.collections.setdefault(collection, {})[doc_id] = _copy_value(data)
+
+    def delete(self, collection, doc_id):
+        with self.lock:
+            self._remember(collection, doc_id)
+            self.collections.get(collection, {}).pop(doc_id, None)
+
+    def scan(self, collection):
+        """Return (doc_id, data) pairs for a collection"""
+        with self.lock:
+            return list(self.collections.get(collection, {}).items())
+
+    def collection_names(self):
+        with self.lock:
+            return [name for name, docs in self.collections.items() if docs]
+
+    @contextmanager
+    def bulk(self):
+        """Group several writes so they apply atomically
+
+        The documents written are snapshotted as they change and put back if
+        the block raises, like the rollback in SQLiteStore.bulk().
+        """
+        with self.lock:
+            self._bulk_depth += 1
+            try:
+                yield
+            except Exception:
+                self._bulk_depth -= 1
+                if not self._bulk_depth:
+                    self._restore()
+                raise
+            self._bulk_depth -= 1
+            if not self._bulk_depth:
+                self._undo = {}
+
+    def _restore(self):
+        undo, self._undo = self._undo, {}
+        for (collection, doc_id), data in undo.items():
+            if data is None:
+                self.collections.get(collection, {}).pop(doc_id, None)
+            else:
+                self.collections.setdefault(collection, {})[doc_id] = data
+
+
+class SQLiteStore:
+    """Documents persisted as JSON rows in a local SQLite file"""
+
+    def __init__(self, path):
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS documents ('
+            'collection TEXT NOT NULL, doc_id TEXT NOT NULL, data TEXT NOT NULL, '
+            'PRIMARY KEY (collection, doc_id))'
+        )
+        self.connection.commit()
+        self._bulk_depth = 0
+
+    def _commit(self):
+        if not self._bulk_depth:
+            self.connection.commit()
+
+    @contextmanager
+    def bulk(self):
+        """Group several writes into one SQLite transaction"""
+        with self.lock:
+            self._bulk_depth += 1
+            try:
+                yield
+            except Exception:
+                self._bulk_depth -= 1
+                if not self._bulk_depth:
+                    self.connection.rollback()
+                raise
+            self._bulk_depth -= 1
+            self._commit()
+
+    def get(self, collection, doc_id):
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT data FROM documents WHERE collection = ? AND doc_id = ?',
+                (collection, doc_id)
+            ).fetchone()
+        return decode_document(row[0]) if row else None
+
+    def put(self, collection, doc_id, data):
+        with self.lock:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO documents (collection, doc_id, data) VALUES (?, ?, ?)',
+                (collection, doc_id, encode_document(data))
+            )
+            self._commit()
+
+    def delete(self, collection, doc_id):
+        with self.lock:
+            self.connection.execute(
+                'DELETE FROM documents WHERE collection = ? AND doc_id = ?',
+                (collection, doc_id)
+            )
+            self._commit()
+
+    def scan(self, collection):
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT doc_id, data FROM documents WHERE collection = ?',
+                (collection,)
+            ).fetchall()
+        return [(doc_id, decode_document(data)) for doc_id, data in rows]
+
+    def collection_names(self):
+        with self.lock:
+            rows = self.connection.execute('SELECT DISTINCT collection FROM documents').fetchall()
+        return [row[0] for row in rows]
+
+
+class DocumentSnapshot:
+    """Mirror of google.cloud.firestore.DocumentSnapshot"""
+
+    def __init__(self, reference, data, read_time=None):
+        self.reference = reference
+        self._data = data
+        self.read_time = read_time or datetime.now()
+
+    @property
+    def id(self):
+        return self.reference.id
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return _copy_value(self._data) if self._data is not None else None
+
+    def get(self, field_path):
+        if self._data is None:
+            return None
+        found, value = _get_field(self._data, field_path)
+        if not found:
+            raise KeyError(field_path)
+        return _copy_value(value)
+
+
+class DocumentReference:
+    """Mirror of google.cloud.firestore.DocumentReference"""
+
+    def __init__(self, client, collection_id, doc_id):
+        self._client = client
+        self._collection_id = collection_id
+        self.id = doc_id
+
+    @property
+    def parent(self):
+        return CollectionReference(self._client, self._collection_id)
+
+    @property
+    def path(self):
+        return f'{self._collection_id}/{self.id}'
+
+    def __eq__(self, other):
+        return isinstance(other, DocumentReference) and self.path == other.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def get(self, field_paths=None, transaction=None):
+        _check_transaction_read(transaction)
+        data = self._client._store.get(self._collection_id, self.id)
+        return DocumentSnapshot(self, data)
+
+    def create(self, document_data):
+        with self._client._store.lock:
+            if self._client._store.get(self._collection_id, self.id) is not None:
+                raise ValueError(f'Document already exists: {self.path}')
+            data = _strip_transforms(document_data)
+            self._client._store.put(self._collection_id, self.id, data)
+            self._client._notify(self, None, data)
+        return datetime.now()
+
+    def set(self, document_data, merge=False):
+        with self._client._store.lock:
+            previous = self._client._store.get(self._collection_id, self.id)
+            if merge:
+                existing = _copy_value(previous or {})
+                _merge_data(existing, document_data)
+                data = existing
+            else:
+                data = _strip_transforms(document_data)
+            self._client._store.put(self._collection_id, self.id, data)
+            self._client._notify(self, previous, data)
+        return datetime.now()
+
+    def update(self, field_updates):
+        with self._client._store.lock:
+            previous = self._client._store.get(self._collection_id, self.id)
+            if previous is None:
+                raise ValueError(f'No document to update: {self.path}')
+            existing = _copy_value(previous)
+            for field_path, value in field_updates.items():
+                _set_field(existing, field_path, value)
+            self._client._store.put(self._collection_id, self.id, existing)
+            self._client._notify(self, previous, existing)
+        return datetime.now()
+
+    def delete(self):
+        with self._client._store.lock:
+            previous = self._client._store.get(self._collection_id, self.id)
+            self._client._store.delete(self._collection_id, self.id)
+            if previous is not None:
+                self._client._notify(self, previous, None)
+        return datetime.now()
+
+
+class ChangeType(Enum):
+    """Mirror of google.cloud.firestore_v1.watch.ChangeType"""
+    ADDED = 1
+    REMOVED = 2
+    MODIFIED = 3
+
+
+class DocumentChange:
+    """Mirror of google.cloud.firestore_v1.watch.DocumentChange"""
+
+    def __init__(self, type, document, old_index=-1, new_index=-1):
+        self.type = type
+        self.document = document
+        self.old_index = old_index
+        self.new_index = new_index
+
+
+class _LazyDocuments:
+    """Current collection contents, only materialized if a listener looks at them"""
+
+    def __init__(self, collection):
+        self._collection = collection
+        self._documents = None
+
+    def _load(self):
+        if self._documents is None:
+            self._documents = self._collection.get()
+        return self._documents
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def __getitem__(self, index):
+        return self._load()[index]
+
+
+class Watch:
+    """Collection listener returned by on_snapshot()
+
+    Changes are delivered synchronously on the writing thread, which keeps
+    offline tests deterministic.
+    """
+
+    def __init__(self, collection, callback):
+        self._collection = collection
+        self._callback = callback
+        self.is_active = True
+        client = collection._client
+        with client._store.lock:
+            client._listeners.setdefault(collection.id, []).append(self)
+            initial = [DocumentChange(ChangeType.ADDED, doc, -1, index)
+                       for index, doc in enumerate(collection.get())]
+            self._deliver(initial)
+
+    def _deliver(self, changes):
+        self._callback(_LazyDocuments(self._collection), changes, datetime.now())
+
+    def unsubscribe(self):
+        listeners = self._collection._client._listeners.get(self._collection.id, [])
+        if self in listeners:
+            listeners.remove(self)
+        self.is_active = False
+
+    def close(self, reason=None):
+        self.unsubscribe()
+
+
+class AggregationResult:
+    def __init__(self, alias, value):
+        self.alias = alias
+        self.value = value
+        self.read_time = datetime.now()
+
+
+class AggregationQuery:
+    """count() aggregation over a query"""
+
+    def __init__(self, query, alias):
+        self._query = query
+        self._alias = alias or 'field_1'
+
+    def get(self, transaction=None):
+        return [[AggregationResult(self._alias, len(self._query._matching()))]]
+
+    def stream(self, transaction=None):
+        yield from self.get()
+
+
+class Query:
+    """Immutable query over one collection"""
+
+    def __init__(self, client, collection_id, filters=(), orders=(),
+                 limit_count=None, offset_count=0, start=None, end=None):
+        self._client = client
+        self._collection_id = collection_id
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit_count
+        self._offset = offset_count
+        self._start = start
+        self._end = end
+
+    def _copy(self, **changes):
+        values = {
+            'filters': self._filters,
+            'orders': self._orders,
+            'limit_count': self._limit,
+            'offset_count': self._offset,
+            'start': self._start,
+            'end': self._end
+        }
+        values.update(changes)
+        return Query(self._client, self._collection_id, **values)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path = filter.field_path
+            op_string = filter.op_string
+            value = filter.value
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path, direction=ASCENDING):
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count):
+        return self._copy(limit_count=count)
+
+    def offset(self, num_to_skip):
+        return self._copy(offset_count=num_to_skip)
+
+    def start_after(self, document_fields_or_snapshot):
+        return self._copy(start=(document_fields_or_snapshot, False))
+
+    def start_at(self, document_fields_or_snapshot):
+        return self._copy(start=(document_fields_or_snapshot, True))
+
+    def end_before(self, document_fields_or_snapshot):
+        return self._copy(end=(document_fields_or_snapshot, False))
+
+    def end_at(self, document_fields_or_snapshot):
+        return self._copy(end=(document_fields_or_snapshot, True))
+
+    def count(self, alias=None):
+        return AggregationQuery(self, alias)
+
+    def _cursor_key(self, cursor):
+        """Turn a snapshot / field dict / value list into an ordering key"""
+        if isinstance(cursor, DocumentSnapshot):
+            values = []
+            for field_path, _ in self._orders:
+                values.append(cursor.id if field_path == '__name__' else cursor.get(field_path))
+            return values + [cursor.id]
+        if isinstance(cursor, dict):
+            values = [cursor.get(field_path) for field_path, _ in self._orders if field_path in cursor]
+        else:
+            values = list(cursor)
+        # '__name__' cursors may be given as IDs or document references
+        return [value.id if isinstance(value, DocumentReference) else value for value in values]
+
+    def _order_key(self, doc_id, data):
+        key = []
+        for field_path, direction in self._orders:
+            _, value = _document_field(doc_id, data, field_path)
+            key.append(value)
+        return key + [doc_id]
+
+    def _compare_keys(self, left, right):
+        """Compare ordering keys honouring each order's direction"""
+        directions = [direction for _, direction in self._orders] + [ASCENDING]
+        for index in range(min(len(left), len(right))):
+            left_key, right_key = _sort_key(left[index]), _sort_key(right[index])
+            if left_key == right_key:
+                continue
+            result = -1 if left_key < right_key else 1
+            return -result if directions[index] == DESCENDING else result
+        return 0
+
+    def _matching(self):
+        """Apply filters, ordering and cursors; returns [(doc_id, data)]"""
+        documents = []
+        for doc_id, data in self._client._store.scan(self._collection_id):
+            matched = True
+            for field_path, op, value in self._filters:
+                found, field_value = _document_field(doc_id, data, field_path)
+                if not found or not _compare(field_value, op, value):
+                    matched = False
+                    break
+            if matched and all(_document_field(doc_id, data, field_path)[0] for field_path, _ in self._orders):
+                documents.append((doc_id, data))
+
+        # Stable multi-key sort, last key first
+        documents.sort(key=lambda item: item[0])
+        for field_path, direction in reversed(self._orders):
+            documents.sort(
+                key=lambda item: _sort_key(_document_field(item[0], item[1], field_path)[1]),
+                reverse=direction == DESCENDING
+            )
+
+        if self._start is not None:
+            cursor, inclusive = self._start
+            cursor_key = self._cursor_key(cursor)
+            documents = [
+                item for item in documents
+                if (self._compare_keys(self._order_key(*item), cursor_key) >= 0 if inclusive
+                    else self._compare_keys(self._order_key(*item), cursor_key) > 0)
+            ]
+        if self._end is not None:
+            cursor, inclusive = self._end
+            cursor_key = self._cursor_key(cursor)
+            documents = [
+                item for item in documents
+                if (self._compare_keys(self._order_key(*item), cursor_key) <= 0 if inclusive
+                    else self._compare_keys(self._order_key(*item), cursor_key) < 0)
+            ]
+
+        if self._offset:
+            documents = documents[self._offset:]
+        if self._limit is not None:
+            documents = documents[:self._limit]
+        return documents
+
+    def stream(self, transaction=None):
+        _check_transaction_read(transaction)
+        for doc_id, data in self._matching():
+            yield DocumentSnapshot(DocumentReference(self._client, self._collection_id, doc_id), data)
+
+    def get(self, transaction=None):
+        return list(self.stream())
+
+
+class CollectionReference(Query):
+    """Mirror of google.cloud.firestore.CollectionReference"""
+
+    def __init__(self, client, collection_id):
+        super().__init__(client, collection_id)
+
+    @property
+    def id(self):
+        return self._collection_id
+
+    def document(self, document_id=None):
+        return DocumentReference(self._client, self._collection_id, document_id or uuid.uuid4().hex[:20])
+
+    def add(self, document_data, document_id=None):
+        reference = self.document(document_id)
+        update_time = reference.create(document_data)
+        return update_time, reference
+
+    def on_snapshot(self, callback):
+        return Watch(self, callback)
+
+    def list_documents(self, page_size=None):
+        for doc_id, _ in self._client._store.scan(self._collection_id):
+            yield DocumentReference(self._client, self._collection_id, doc_id)
+
+
+class WriteBatch:
+    """Buffered writes committed together"""
+
+    MAX_OPERATIONS = 500
+
+    def __init__(self, client):
+        self._client = client
+        self._operations = []
+
+    def __len__(self):
+        return len(self._operations)
+
+    def _add(self, operation):
+        if len(self._operations) >= self.MAX_OPERATIONS:
+            raise ValueError(f'A write batch can contain at most {self.MAX_OPERATIONS} operations')
+        self._operations.append(operation)
+
+    def create(self, reference, document_data):
+        self._add(lambda: reference.create(document_data))
+
+    def set(self, reference, document_data, merge=False):
+        self._add(lambda: reference.set(document_data, merge=merge))
+
+    def update(self, reference, field_updates):
+        self._add(lambda: reference.update(field_updates))
+
+    def delete(self, reference):
+        self._add(reference.delete)
+
+    def commit(self):
+        with self._client._store.bulk():
+            results = [operation() for operation in self._operations]
+        self._operations = []
+        return results
+
+
+class Transaction(WriteBatch):
+    """Mirror of google.cloud.firestore.Transaction, for use with firestore.transactional
+
+    The store lock is held from _begin() until _commit() or _rollback(), so
+    local transactions run one at a time and never need to be retried.
+    """
+
+    def __init__(self, client, max_attempts=5, read_only=False):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._id = None
+
+    @property
+    def in_progress(self):
+        return self._id is not None
+
+    def _clean_up(self):
+        self._operations = []
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        if self.in_progress:
+            raise ValueError('Transaction already in progress')
+        self._client._store.lock.acquire()
+        self._id = uuid.uuid4().hex.encode()
+
+    def _rollback(self):
+        if self.in_progress:
+            self._clean_up()
+            self._client._store.lock.release()
+
+    def _commit(self):
+        if not self.in_progress:
+            raise ValueError('Transaction not in progress')
+        try:
+            if self._read_only and self._operations:
+                raise ValueError('Cannot write in a read-only transaction')
+            return WriteBatch.commit(self)
+        finally:
+            self._clean_up()
+            self._client._store.lock.release()
+
+    def commit(self):
+        raise ValueError('Use firestore.transactional to run a transaction')
+
+    def get(self, ref_or_query):
+        if isinstance(ref_or_query, DocumentReference):
+            return iter([ref_or_query.get(transaction=self)])
+        return ref_or_query.stream(transaction=self)
+
+
+class LocalClient:
+    """Drop-in replacement for firestore.client() backed by a local store"""
+
+    def __init__(self, store):
+        self._store = store
+        self._listeners = {}
+
+    def _notify(self, reference, previous, data):
+        """Send a document change to the collection's listeners"""
+        listeners = self._listeners.get(reference._collection_id)
+        if not listeners:
+            return
+        if data is None:
+            change_type, snapshot_data = ChangeType.REMOVED, previous
+        elif previous is None:
+            change_type, snapshot_data = ChangeType.ADDED, data
+        else:
+            change_type, snapshot_data = ChangeType.MODIFIED, data
+        change = DocumentChange(change_type, DocumentSnapshot(reference, snapshot_data))
+        for watch in list(listeners):
+            try:
+                watch._deliver([change])
+            except Exception as e:
+                print(f"Error in snapshot listener for {reference._collection_id}: {e}")
+
+    def collection(self, collection_id):
+        return CollectionReference(self, collection_id)
+
+    def document(self, document_path):
+        collection_id, doc_id = document_path.split('/', 1)
+        return DocumentReference(self, collection_id, doc_id)
+
+    def collections(self):
+        return [CollectionReference(self, name) for name in self._store.collection_names()]
+
+    def get_all(self, references):
+        for reference in references:
+            yield reference.get()
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def transaction(self, max_attempts=5, read_only=False):
+        return Transaction(self, max_attempts=max_attempts, read_only=read_only)
+
+
+def create_client(backend='memory', path=None):
+    """Create a local client; backend is 'memory' or 'sqlite'"""
+    if backend == 'memory':
+        return LocalClient(MemoryStore())
+    if backend == 'sqlite':
+        path = path or 'local_firestore.db'
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return LocalClient(SQLiteStore(path))
+    raise ValueError(f'Unknown local backend: {backend}')
+
+
+def dump_collections(client, path, collections=None):
+    """Export collections from any client (real or local) to a JSON file"""
+    counts = {}
+    with open(path, 'w', encoding='utf-8') as output:
+        output.write('{')
+        for index, name in enumerate(collections or APP_COLLECTIONS):
+            if index:
+                output.write(',')
+            output.write(f'{json.dumps(name)}:{{')
+            count = 0
+            for doc in client.collection(name).stream():
+                if count:
+                    output.write(',')
+                output.write(f'{json.dumps(doc.id)}:{encode_document(doc.to_dict())}')
+                count += 1
+            output.write('}')
+            counts[name] = count
+        output.write('}')
+    return counts
+
+
+def load_collections(client, path):
+    """Replay a JSON export produced by dump_collections into a client"""
+    with open(path, 'r', encoding='utf-8') as source:
+        dataset = decode_document(source.read())
+
+    counts = {}
+    for name, documents in dataset.items():
+        batch = client.batch()
+        for doc_id, data in documents.items():
+            batch.set(client.collection(name).document(doc_id), data)
+            if len(batch) >= WriteBatch.MAX_OPERATIONS:
+                batch.commit()
+                batch = client.batch()
+        batch.commit()
+        counts[name] = len(documents)
+    return counts
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Load a Firestore JSON export into a local SQLite store')
+    parser.add_argument('export_file', help='JSON file written by dump_collections()')
+    parser.add_argument('--db', default=os.environ.get('LOCAL_DB_PATH', 'local_firestore.db'),
+                        help='SQLite file to load into')
+    args = parser.parse_args()
+
+    loaded = load_collections(create_client('sqlite', args.db), args.export_file)
+    for collection_name, loaded_count in loaded.items():
+        print(f'Loaded {loaded_count} documents into {collection_name}')
@@ -0,0 +1,84 @@
+"""
+Local stand-in for the Firebase Storage bucket used by THEO Clothing Inventory
+
+Implements the small part of the google-cloud-storage Bucket/Blob API that
+app.py uses (blob uploads, make_public, public_url, delete) on top of a
+folder on disk, so product images and QR codes work with the offline data
+backends. Files under the app's static folder are served by Flask directly.
+"""
+
+import os
+import shutil
+import threading
+
+
+class LocalBlob:
+    """Mirror of google.cloud.storage.Blob backed by a file"""
+
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.content_type = None
+
+    @property
+    def path(self):
+        return os.path.join(self.bucket.root, *self.name.split('/'))
+
+    @property
+    def public_url(self):
+        return f"{self.bucket.base_url}/{self.name}"
+
+    def _write(self, data):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Write then rename, so concurrent readers never see a partial file
+        temporary = f"{self.path}.{threading.get_ident()}.tmp"
+        with open(temporary, 'wb') as handle:
+            handle.write(data)
+        os.replace(temporary, self.path)
+
+    def upload_from_file(self, file_obj, content_type=None):
+        self.content_type = content_type
+        self._write(file_obj.read())
+
+    def upload_from_filename(self, filename, content_type=None):
+        self.content_type = content_type
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        shutil.copyfile(filename, self.path)
+
+    def upload_from_string(self, data, content_type=None):
+        self.content_type = content_type
+        self._write(data.encode('utf-8') if isinstance(data, str) else data)
+
+    def download_as_bytes(self):
+        with open(self.path, 'rb') as handle:
+            return handle.read()
+
+    def make_public(self):
+        # Files under the static folder are already public
+        return None
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def delete(self):
+        os.remove(self.path)
+
+
+class LocalBucket:
+    """Mirror of google.cloud.storage.Bucket backed by a folder"""
+
+    def __init__(self, root, base_url):
+        self.root = os.path.abspath(root)
+        self.base_url = base_url.rstrip('/')
+        self.name = 'local'
+        os.makedirs(self.root, exist_ok=True)
+
+    def blob(self, blob_name):
+        return LocalBlob(self, blob_name)
+
+    def list_blobs(self, prefix=''):
+        for folder, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                name = os.path.relpath(os.path.join(folder, filename), self.root).replace(os.sep, '/')
+                if name.startswith(prefix) and not name.endswith('.tmp'):
+                    yield LocalBlob(self, name)
@@ -0,0 +1,304 @@
+"""
+Prometheus-style metrics for THEO Clothing Inventory
+
+Counters, gauges and histograms are updated in memory by each gunicorn
+worker and flushed every FLUSH_INTERVAL seconds to a SQLite file
+(METRICS_DB_PATH) that all workers on the host share. /metrics renders the
+combined values in the Prometheus text format:
+
+  - counters and histogram buckets are stored as running totals, so every
+    worker's flush adds its increments
+  - gauges are stored per process and summed over the processes that have
+    flushed within GAUGE_TTL seconds, so a worker that exits drops out
+
+Metrics are declared once at import time with a name, help text and label
+names, and updated with metric.labels(...).inc() / .observe() / .set().
+"""
+
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+
+FLUSH_INTERVAL = 5.0  # seconds
+GAUGE_TTL = 30.0  # seconds a process's gauges count after its last flush
+
+# Seconds; covers cached page loads up to full-collection exports
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_metrics = {}
+
+
+def _label_key(labelnames, values):
+    return tuple(zip(labelnames, (str(value) for value in values)))
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.pending = {}  # (sample suffix, labels) -> value not yet flushed
+        _metrics[name] = self
+
+    def labels(self, *values, **named):
+        if named:
+            values = tuple(named[name] for name in self.labelnames)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}')
+        return _Child(self, _label_key(self.labelnames, values))
+
+    def _add(self, suffix, labels, amount):
+        with self.lock:
+            key = (suffix, labels)
+            self.pending[key] = self.pending.get(key, 0) + amount
+
+    def take_pending(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        return pending
+
+
+class _Child:
+    """A metric with its label values bound"""
+
+    __slots__ = ('metric', 'key')
+
+    def __init__(self, metric, key):
+        self.metric = metric
+        self.key = key
+
+    def inc(self, amount=1):
+        self.metric.inc(self.key, amount)
+
+    def dec(self, amount=1):
+        self.metric.inc(self.key, -amount)
+
+    def set(self, value):
+        self.metric.set(self.key, value)
+
+    def observe(self, value):
+        self.metric.observe(self.key, value)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, labels, amount=1):
+        self._add('_total', labels, amount)
+
+
+class Gauge(_Metric):
+    """Per-process value; /metrics reports the sum over live processes"""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.values = {}
+
+    def inc(self, labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def set(self, labels, value):
+        with self.lock:
+            self.values[labels] = value
+
+    def take_pending(self):
+        with self.lock:
+            return {('', labels): value for labels, value in self.values.items()}
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, labels, value):
+        with self.lock:
+            for bound in self.buckets:
+                if value <= bound:
+                    key = ('_bucket', labels + (('le', _format_value(bound)),))
+                    self.pending[key] = self.pending.get(key, 0) + 1
+            for suffix, amount in (('_bucket', 1), ('_count', 1), ('_sum', value)):
+                sample_labels = labels + (('le', '+Inf'),) if suffix == '_bucket' else labels
+                key = (suffix, sample_labels)
+                self.pending[key] = self.pending.get(key, 0) + amount
+
+
+class MetricsStore:
+    """SQLite file holding every worker's flushed metric values"""
+
+    def __init__(self, path, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.local = threading.local()
+        self.flush_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        connection = self._connection()
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS metric_totals ('
+            'name TEXT NOT NULL, suffix TEXT NOT NULL, labels TEXT NOT NULL, value REAL NOT NULL, '
+            'PRIMARY KEY (name, suffix, labels))'
+        )
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS metric_gauges ('
+            'name TEXT NOT NULL, labels TEXT NOT NULL, pid INTEGER NOT NULL, value REAL NOT NULL, '
+            'updated_at REAL NOT NULL, PRIMARY KEY (name, labels, pid))'
+        )
+        connection.commit()
+
+    def _connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self.local.connection = connection
+        return connection
+
+    def flush(self):
+        """Write this process's pending increments and current gauges"""
+        with self.flush_lock:
+            totals, gauges = [], []
+            for metric in list(_metrics.values()):
+                for (suffix, labels), value in metric.take_pending().items():
+                    encoded = json.dumps(labels)
+                    if metric.kind == 'gauge':
+                        gauges.append((metric.name, encoded, os.getpid(), value, time.time()))
+                    elif value:
+                        totals.append((metric.name, suffix, encoded, value))
+            if not totals and not gauges:
+                return
+            connection = self._connection()
+            try:
+                with connection:
+                    connection.executemany(
+                        'INSERT INTO metric_totals (name, suffix, labels, value) VALUES (?, ?, ?, ?) '
+                        'ON CONFLICT (name, suffix, labels) DO UPDATE SET value = value + excluded.value',
+                        totals
+                    )
+                    connection.executemany(
+                        'INSERT OR REPLACE INTO metric_gauges (name, labels, pid, value, updated_at) '
+                        'VALUES (?, ?, ?, ?, ?)',
+                        gauges
+                    )
+            except sqlite3.Error as e:
+                print(f"Error flushing metrics: {e}")
+                # Keep the increments for the next flush
+                for name, suffix, encoded, value in totals:
+                    _metrics[name]._add(suffix, _decode_labels(encoded), value)
+
+    def render(self):
+        """Every metric in the Prometheus text exposition format"""
+        self.flush()
+        connection = self._connection()
+        samples = {}
+        for name, suffix, labels, value in connection.execute(
+                'SELECT name, suffix, labels, value FROM metric_totals'):
+            samples.setdefault(name, []).append((suffix, _decode_labels(labels), value))
+        gauges = {}
+        for name, labels, value in connection.execute(
+                'SELECT name, labels, value FROM metric_gauges WHERE updated_at >= ?',
+                (time.time() - GAUGE_TTL,)):
+            gauges[(name, labels)] = gauges.get((name, labels), 0) + value
+        for (name, labels), value in gauges.items():
+            samples.setdefault(name, []).append(('', _decode_labels(labels), value))
+
+        lines = []
+        for name in sorted(samples):
+            metric = _metrics.get(name)
+            if metric is not None:
+                lines.append(f'# HELP {name} {metric.documentation}')
+                lines.append(f'# TYPE {name} {metric.kind}')
+            for suffix, labels, value in sorted(samples[name], key=_sample_order):
+                lines.append(f'{name}{suffix}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def _run(self):
+        while not self._stopping.wait(self.flush_interval):
+            self.flush()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='metrics-flush', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def stop(self):
+        self._stopping.set()
+        self.flush()
+        try:
+            with self._connection() as connection:
+                connection.execute('DELETE FROM metric_gauges WHERE pid = ?', (os.getpid(),))
+        except sqlite3.Error:
+            pass
+
+
+def _decode_labels(encoded):
+    return tuple(tuple(pair) for pair in json.loads(encoded))
+
+
+def _sample_order(sample):
+    suffix, labels, _ = sample
+    bound = dict(labels).get('le')
+    plain = tuple(pair for pair in labels if pair[0] != 'le')
+    return (plain, suffix, float(bound) if bound is not None else 0.0)
+
+
+# Request handling
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Request latency by route',
+                            ['route', 'method', 'status'])
+REQUESTS_IN_FLIGHT = Gauge('http_requests_in_flight', 'Requests being handled, by route', ['route'])
+
+# Cache lookups by cache key; result is hit, stale, shared, listener or miss
+CACHE_REQUESTS = Counter('cache_requests', 'Cache lookups by key and result', ['key', 'result'])
+
+# Firestore calls reported by firestore_tracing.TracedClient
+FIRESTORE_CALLS = Counter('firestore_calls', 'Firestore calls by collection and operation',
+                          ['collection', 'operation'])
+FIRESTORE_DOCUMENTS = Counter('firestore_documents', 'Documents read or written by collection and operation',
+                              ['collection', 'operation'])
+FIRESTORE_LATENCY = Histogram('firestore_call_duration_seconds', 'Firestore call latency by collection and operation',
+                              ['collection', 'operation'])
+
+# Excel imports and exports; rows over seconds gives the throughput
+EXCEL_ROWS = Counter('excel_rows', 'Rows written by Excel exports or saved by imports', ['operation', 'sheet'])
+EXCEL_SECONDS = Counter('excel_seconds', 'Time spent in Excel exports and imports', ['operation', 'sheet'])
+
+
+def observe_firestore(operation, collection, documents, seconds):
+    """firestore_tracing observer feeding the Firestore metrics"""
+    labels = _label_key(('collection', 'operation'), (collection, operation))
+    FIRESTORE_CALLS.inc(labels)
+    if documents:
+        FIRESTORE_DOCUMENTS.inc(labels, documents)
+    FIRESTORE_LATENCY.observe(labels, seconds)
+
+
+def observe_excel(operation, sheet, rows, seconds):
+    EXCEL_ROWS.labels(operation, sheet).inc(rows)
+    EXCEL_SECONDS.labels(operation, sheet).inc(seconds)
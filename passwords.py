@@ -0,0 +1,76 @@
+"""
+Password hashing for THEO Clothing Inventory
+
+Users store a salted password hash ('password_hash') instead of the password.
+Login looks the user up by username alone and verifies the password here.
+Hashes use Werkzeug's KDF formats. The cost is set by PASSWORD_HASH_METHOD,
+for example 'pbkdf2:sha256:600000' or 'scrypt:32768:8:1'.
+
+Hashing runs on a bounded thread pool. The KDF releases the GIL, so other
+threads in the worker keep serving requests meanwhile, and at most
+PASSWORD_HASH_WORKERS hashes are computed at once.
+Hashes made with an older method are upgraded on the next successful login.
+
+Users created before hashing still have a plaintext 'password'. It is checked
+once and replaced by a hash on that user's next login.
+"""
+
+import hmac
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = 'pbkdf2:sha256:600000'
+DEFAULT_WORKERS = 2
+VERIFY_TIMEOUT = 30  # seconds
+
+
+class PasswordHasher:
+    """Hashes and verifies passwords on a bounded thread pool"""
+
+    def __init__(self, method=DEFAULT_METHOD, max_workers=DEFAULT_WORKERS):
+        self.method = method
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='password-hash')
+        # Checked for unknown usernames so they take as long as a wrong password
+        self._dummy_hash = None
+        # Method and cost as Werkzeug writes them, e.g. 'scrypt' -> 'scrypt:32768:8:1'
+        self._prefix = None
+
+    def hash(self, password):
+        return self.executor.submit(generate_password_hash, password, method=self.method).result(VERIFY_TIMEOUT)
+
+    def needs_rehash(self, password_hash):
+        """True for hashes made with a different method or cost"""
+        if self._prefix is None:
+            # Shorthand methods are expanded with Werkzeug's defaults, so hash once to see how
+            self._prefix = self.hash('').split('$', 1)[0]
+        return not password_hash or password_hash.split('$', 1)[0] != self._prefix
+
+    def verify(self, user_data, password):
+        """Check a password against a users document
+
+        Returns (valid, updates): updates holds the fields to write back when the
+        stored credential should be replaced (plaintext or outdated hash), else None.
+        """
+        if user_data is None:
+            if self._dummy_hash is None:
+                self._dummy_hash = self.hash('not-a-password')
+            self.executor.submit(check_password_hash, self._dummy_hash, password).result(VERIFY_TIMEOUT)
+            return False, None
+
+        password_hash = user_data.get('password_hash')
+        if password_hash:
+            valid = self.executor.submit(check_password_hash, password_hash, password).result(VERIFY_TIMEOUT)
+        else:
+            stored = user_data.get('password') or ''
+            valid = bool(stored) and hmac.compare_digest(stored.encode('utf-8'), password.encode('utf-8'))
+        if not valid:
+            return False, None
+        if password_hash and not self.needs_rehash(password_hash):
+            return True, None
+        return True, self.update_fields(password)
+
+    def update_fields(self, password):
+        """Fields for users update() that set a new password and drop any plaintext one"""
+        from firebase_admin import firestore
+        return {'password_hash': self.hash(password), 'password': firestore.DELETE_FIELD}
@@ -0,0 +1,128 @@
+"""
+QR code generation for THEO Clothing Inventory
+
+Product barcodes are rendered as QR code PNGs and stored in the Storage
+bucket under barcodes/. QRPipeline handles products in bulk: PNGs are
+rendered on a small thread pool (PIL and zlib release the GIL while the PNG
+is drawn and compressed), uploaded through a bounded thread pool (uploads
+are network bound), and the product documents are updated in WriteBatch
+chunks as uploads finish. Rendering stays in the app process: worker
+processes would re-import the entry module and could start the app again.
+"""
+
+import io
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from batch_writer import MAX_BATCH_SIZE, BatchWriter
+
+# Below this many products, rendering inline is as fast as a pool
+MIN_RENDER_POOL_SIZE = 50
+UPLOAD_WORKERS = 32
+
+
+def new_barcode():
+    return f"PROD_{uuid.uuid4().hex[:12].upper()}"
+
+
+def render_qr_png(barcode_data):
+    """PNG bytes of the QR code for a barcode"""
+    # qrcode pulls in PIL; only load it once a code is actually rendered
+    import qrcode
+
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(barcode_data)
+    qr.make(fit=True)
+
+    qr_img = qr.make_image(fill_color="black", back_color="white")
+    qr_buffer = io.BytesIO()
+    qr_img.save(qr_buffer, format='PNG')
+    return qr_buffer.getvalue()
+
+
+def upload_qr_png(bucket, barcode_data, png):
+    """Upload a rendered QR code and return its public URL"""
+    qr_blob = bucket.blob(f"barcodes/{barcode_data}.png")
+    qr_blob.upload_from_file(io.BytesIO(png), content_type='image/png')
+    qr_blob.make_public()
+    return qr_blob.public_url
+
+
+class QRPipeline:
+    """Render, upload and record QR codes for many products at once
+
+    render_workers: render threads (None uses one per CPU, 0 renders inline).
+    upload_workers: concurrent uploads to the bucket.
+    progress: optional callback(done, total).
+    """
+
+    def __init__(self, db, bucket, render_workers=None, upload_workers=UPLOAD_WORKERS,
+                 batch_size=MAX_BATCH_SIZE, progress=None):
+        self.db = db
+        self.bucket = bucket
+        self.render_workers = render_workers
+        self.upload_workers = upload_workers
+        self.batch_size = batch_size
+        self.progress = progress
+
+    def _render_all(self, barcodes):
+        """Yield PNGs in barcode order, from a thread pool when it is worth it"""
+        if len(barcodes) < MIN_RENDER_POOL_SIZE or self.render_workers == 0:
+            for barcode_data in barcodes:
+                yield render_qr_png(barcode_data)
+            return
+        workers = self.render_workers or os.cpu_count() or 1
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='qr-render') as executor:
+            yield from executor.map(render_qr_png, barcodes)
+
+    def run(self, products):
+        """Give each product snapshot a QR code; returns (updated, failed) counts
+
+        Products that already have a barcode keep it, so printed labels stay valid.
+        """
+        items = []
+        for product in products:
+            barcode_data = (product.to_dict() or {}).get('barcode') or new_barcode()
+            items.append((product.reference, barcode_data))
+        total = len(items)
+        writer = BatchWriter(self.db, chunk_size=self.batch_size)
+        pending = []
+        updated = 0
+        failed = 0
+
+        def flush():
+            nonlocal updated, failed
+            result = writer.update(pending)
+            updated += result.written
+            failed += sum(chunk.count for chunk in result.failed)
+            pending.clear()
+            if self.progress:
+                self.progress(updated + failed, total)
+
+        with ThreadPoolExecutor(max_workers=self.upload_workers) as uploader:
+            uploads = {}
+            pngs = self._render_all([barcode_data for _, barcode_data in items])
+            for (reference, barcode_data), png in zip(items, pngs):
+                future = uploader.submit(upload_qr_png, self.bucket, barcode_data, png)
+                uploads[future] = (reference, barcode_data)
+
+            for future in as_completed(uploads):
+                reference, barcode_data = uploads[future]
+                try:
+                    qr_url = future.result()
+                except Exception as e:
+                    print(f"QR upload failed for product {reference.id}: {e}")
+                    failed += 1
+                    continue
+                pending.append((reference, {
+                    'barcode': barcode_data,
+                    'qr_code_url': qr_url,
+                    'updated_at': datetime.now()
+                }))
+                if len(pending) >= self.batch_size:
+                    flush()
+        if pending:
+            flush()
+        return updated, failed
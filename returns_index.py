@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Returned-customers index for THEO Clothing Inventory
+
+Each customer with returned sales has one document in returns_index holding
+their item count, returned value, first/last return dates and their
+RECENT_RETURNS newest returned items; older items are read from sales_orders
+when the report asks for them. Overall totals live in dashboard_stats/returns. Marking a sale as
+returned, undoing a return, and editing or deleting a returned sale update
+the index in the same transaction as the sale, so the returns report is a
+sorted, paginated query instead of a regrouping of every returned sale.
+
+rebuild() recreates the index from sales_orders:
+
+    python returns_index.py --rebuild
+"""
+
+import argparse
+import os
+import sys
+
+from batch_writer import BatchWriter
+from customer_index import instant
+from customer_summary import customer_sales, sale_key
+
+COLLECTION = 'returns_index'
+TOTALS_COLLECTION = 'dashboard_stats'
+TOTALS_ID = 'returns'
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+# Returned items kept on a customer's document, newest first (documents are limited to 1 MiB)
+RECENT_RETURNS = 50
+
+# Sort options for the report: request value -> indexed field (descending)
+SORT_FIELDS = {
+    'last_return': 'last_return_date',
+    'value': 'total_returned_value'
+}
+
+
+def is_returned(sale_data):
+    return bool(sale_data) and sale_data.get('status') == 'returned'
+
+
+def returned_item(sale_id, sale_data):
+    """What the index keeps of one returned sale"""
+    return {
+        'id': sale_id,
+        'product_name': sale_data.get('product_name', ''),
+        'product_category': sale_data.get('product_category', ''),
+        'product_color': sale_data.get('product_color', ''),
+        'product_size': sale_data.get('product_size', ''),
+        'quantity': sale_data.get('quantity', 0),
+        'item_numbers': sale_data.get('item_numbers', ''),
+        'total_price': sale_data.get('total_price', 0),
+        'returned_at': sale_data.get('returned_at'),
+        'returned_by': sale_data.get('returned_by', ''),
+        'original_order_date': sale_data.get('created_at'),
+        'customer_address': sale_data.get('customer_address', '')
+    }
+
+
+def empty_customer(sale_data):
+    return {
+        'customer_name': sale_data.get('customer_name', ''),
+        'customer_phone': sale_data.get('customer_phone', ''),
+        'customer_address': sale_data.get('customer_address', ''),
+        'total_returned_items': 0,
+        'total_returned_value': 0,
+        'returned_items': [],
+        'first_return_date': None,
+        'last_return_date': None
+    }
+
+
+def _newest_first(item):
+    return instant(item.get('returned_at')) or 0
+
+
+def _refresh_totals(customer):
+    """Recompute a customer's counts and dates from all of their returned items
+
+    Only the RECENT_RETURNS newest items are kept on the customer afterwards.
+    """
+    items = customer['returned_items']
+    customer['total_returned_items'] = len(items)
+    customer['total_returned_value'] = sum(item.get('total_price') or 0 for item in items)
+    dates = [item['returned_at'] for item in items if instant(item.get('returned_at')) is not None]
+    customer['first_return_date'] = min(dates, key=instant) if dates else None
+    customer['last_return_date'] = max(dates, key=instant) if dates else None
+    items.sort(key=_newest_first, reverse=True)
+    if items:
+        # The newest return carries the current address
+        customer['customer_address'] = items[0].get('customer_address', '')
+    customer['returned_items'] = items[:RECENT_RETURNS]
+
+
+def _add_item(customer, item):
+    """Count one more returned item; older items left off the document are not needed"""
+    customer['total_returned_items'] += 1
+    customer['total_returned_value'] += item.get('total_price') or 0
+    returned_at = item.get('returned_at')
+    if instant(returned_at) is not None:
+        if customer['first_return_date'] is None or instant(returned_at) < instant(customer['first_return_date']):
+            customer['first_return_date'] = returned_at
+        if customer['last_return_date'] is None or instant(returned_at) > instant(customer['last_return_date']):
+            customer['last_return_date'] = returned_at
+    items = customer['returned_items'] + [item]
+    items.sort(key=_newest_first, reverse=True)
+    customer['customer_address'] = items[0].get('customer_address', '')
+    customer['returned_items'] = items[:RECENT_RETURNS]
+
+
+def is_complete(customer):
+    """Whether every returned item of a customer is on their document"""
+    return len(customer['returned_items']) >= customer['total_returned_items']
+
+
+class ReturnsIndex:
+    """Reads and maintains the returns_index collection"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def reference(self, key):
+        return self.db.collection(COLLECTION).document(key)
+
+    @property
+    def totals_ref(self):
+        return self.db.collection(TOTALS_COLLECTION).document(TOTALS_ID)
+
+    def prepare(self, transaction, sale_id, before, after):
+        """Read the index documents a sale change touches; returns the writes to stage
+
+        Writes are (reference, data, merge) with data None for a delete; see
+        CustomerSummaries.prepare().
+        """
+        old_key = sale_key(before) if is_returned(before) else None
+        new_key = sale_key(after) if is_returned(after) else None
+        if old_key is None and new_key is None:
+            return []
+        if old_key == new_key and returned_item(sale_id, before) == returned_item(sale_id, after):
+            return []
+
+        customers = {}
+        for key in {old_key, new_key} - {None}:
+            snapshot = self.reference(key).get(transaction=transaction)
+            customers[key] = snapshot.to_dict() if snapshot.exists else None
+        existed = {key for key, customer in customers.items() if customer is not None}
+
+        if old_key and customers[old_key] is not None:
+            customer = customers[old_key]
+            if is_complete(customer):
+                customer['returned_items'] = [item for item in customer['returned_items'] if item['id'] != sale_id]
+            else:
+                # Totals and dates may depend on items left off the document
+                customer['returned_items'] = self.returned_sales(old_key, transaction, exclude=sale_id)
+            _refresh_totals(customer)
+        if new_key:
+            if customers[new_key] is None:
+                customers[new_key] = empty_customer(after)
+            _add_item(customers[new_key], returned_item(sale_id, after))
+
+        from firebase_admin import firestore
+
+        writes = []
+        customer_delta = 0
+        for key, customer in customers.items():
+            if customer is None:
+                continue
+            if customer['total_returned_items'] > 0:
+                writes.append((self.reference(key), customer, False))
+                customer_delta += 0 if key in existed else 1
+            else:
+                writes.append((self.reference(key), None, False))
+                customer_delta -= 1 if key in existed else 0
+        old_value = (before.get('total_price') or 0) if old_key else 0
+        new_value = (after.get('total_price') or 0) if new_key else 0
+        writes.append((self.totals_ref, {
+            'customers': firestore.Increment(customer_delta),
+            'items': firestore.Increment((1 if new_key else 0) - (1 if old_key else 0)),
+            'value': firestore.Increment(new_value - old_value)
+        }, True))
+        return writes
+
+    def returned_sales(self, key, transaction=None, exclude=None):
+        """Every returned item of a customer, read from sales_orders"""
+        query = customer_sales(self.db, key).where('status', '==', 'returned')
+        return [returned_item(doc.id, doc.to_dict()) for doc in query.stream(transaction=transaction)
+                if doc.id != exclude]
+
+    def items(self, key):
+        """A customer's returned items, newest first; None if they have none"""
+        customer = self.reference(key).get().to_dict()
+        if customer is None:
+            return None
+        if is_complete(customer):
+            return customer['returned_items']
+        items = self.returned_sales(key)
+        items.sort(key=_newest_first, reverse=True)
+        return items
+
+    def totals(self):
+        return self.totals_ref.get().to_dict() or {'customers': 0, 'items': 0, 'value': 0}
+
+    def page(self, sort='last_return', limit=PAGE_SIZE, after=None):
+        """One page of customers, newest return or highest value first
+
+        after: id of the last customer on the previous page.
+        Returns (customers, next_cursor); next_cursor is None on the last page.
+        """
+        from firebase_admin import firestore
+
+        field = SORT_FIELDS.get(sort, SORT_FIELDS['last_return'])
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        query = self.db.collection(COLLECTION).order_by(field, direction=firestore.Query.DESCENDING)
+        if after:
+            cursor = self.reference(after).get()
+            if cursor.exists:
+                query = query.start_after(cursor)
+        docs = query.limit(limit + 1).get()
+        customers = [{**doc.to_dict(), 'id': doc.id} for doc in docs[:limit]]
+        next_cursor = customers[-1]['id'] if len(docs) > limit else None
+        return customers, next_cursor
+
+    def ensure(self):
+        """Build the index if it was never built (e.g. first start after upgrading)"""
+        if self.totals_ref.get().exists:
+            return
+        print("Returns index missing, building from sales history")
+        self.rebuild()
+
+    def rebuild(self):
+        """Recreate the index from sales_orders; returns the customer count
+
+        Returns marked while the rebuild runs can be missed, so run it when
+        the app is quiet.
+        """
+        customers = {}
+        for doc in self.db.collection('sales_orders').where('status', '==', 'returned').stream():
+            sale_data = doc.to_dict()
+            key = sale_key(sale_data)
+            if key is None:
+                continue
+            if key not in customers:
+                customers[key] = empty_customer(sale_data)
+            customers[key]['returned_items'].append(returned_item(doc.id, sale_data))
+        for customer in customers.values():
+            _refresh_totals(customer)
+
+        writer = BatchWriter(self.db)
+        result = writer.set([(self.reference(key), customer) for key, customer in customers.items()])
+        stale = [doc.reference for doc in self.db.collection(COLLECTION).stream() if doc.id not in customers]
+        if stale:
+            writer.delete(stale)
+        if result.failed:
+            raise Exception(f'{len(result.failed)} chunks of the returns index failed to save')
+        self.totals_ref.set({
+            'customers': len(customers),
+            'items': sum(customer['total_returned_items'] for customer in customers.values()),
+            'value': sum(customer['total_returned_value'] for customer in customers.values())
+        })
+        return len(customers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild the returned-customers index')
+    parser.add_argument('--rebuild', action='store_true', required=True,
+                        help='recreate the index from returned sales')
+    parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from app import init_firebase
+    db = init_firebase()
+
+    if db is None:
+        print("Firestore is not configured")
+        return 1
+    count = ReturnsIndex(db).rebuild()
+    print(f"Indexed returns for {count} customers")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,7 +5,7 @@ Run script for the Garment Inventory Management System
 
 import os
 import sys
-from app import app
+from app import app, create_app
 
 if __name__ == '__main__':
     # Check if Firebase service account file exists
@@ -40,6 +40,11 @@ if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5003))
     debug_mode = os.environ.get('FLASK_ENV', 'development') != 'production'
     
+    # Under the debug reloader the watching parent only restarts the server;
+    # the child serving requests (WERKZEUG_RUN_MAIN) starts the app
+    if not debug_mode or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        create_app()
+    
     # Run the application
     print("Starting THEO CLOTHING INVENTORY System...")
     print("=" * 50)
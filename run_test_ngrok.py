@@ -12,7 +12,7 @@ import signal
 import threading
 import requests
 import json
-from app import app
+from app import app, create_app
 
 class NgrokTestManager:
     def __init__(self, port=5003):
@@ -243,7 +243,8 @@ def main():
         app.config['TESTING'] = True
         app.config['DEBUG'] = True
         
-        # Start the application
+        # Start the application (no reloader, so this process serves requests)
+        create_app()
         app.run(debug=True, host='0.0.0.0', port=5003, use_reloader=False)
         
     except KeyboardInterrupt:
@@ -12,7 +12,7 @@ import signal
 import threading
 import requests
 import json
-from app import app
+from app import app, create_app
 
 class NgrokManager:
     def __init__(self, port=5003):
@@ -163,7 +163,10 @@ def main():
     print("=" * 60)
     
     try:
-        # Start Flask application
+        # Start Flask application; under the debug reloader only the child
+        # serving requests (WERKZEUG_RUN_MAIN) starts the app
+        if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            create_app()
         app.run(debug=True, host='0.0.0.0', port=5003)
     except KeyboardInterrupt:
         print("\n🛑 Server stopped by user")
@@ -0,0 +1,122 @@
+"""
+Sales grouping engine for THEO Clothing Inventory
+
+Groups sales orders into per-customer buckets in a single pass. Customers are
+keyed by (customer_name, customer_phone); legacy single-item sales recorded
+within LEGACY_GROUP_WINDOW seconds of each other are treated as one visit.
+Each customer keeps its buckets sorted by time, so placing a sale is a binary
+search instead of a scan over every existing group.
+"""
+
+from bisect import bisect_left
+from datetime import datetime
+
+LEGACY_GROUP_WINDOW = 300  # 5 minutes
+
+
+def customer_key(sale):
+    """Key identifying a customer across sales"""
+    return (sale.get('customer_name', ''), sale.get('customer_phone', ''))
+
+
+def _timestamp(value):
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return None
+
+
+def _sort_timestamp(value):
+    timestamp = _timestamp(value)
+    return timestamp if timestamp is not None else float('-inf')
+
+
+class SalesGrouper:
+    """Incrementally groups sales by customer and time
+
+    window: seconds within which legacy sales share a group, or None to put
+        all of a customer's sales in one group (used by the Excel exports).
+    split_multiple_items: keep each consolidated (is_multiple_items) order in
+        its own group, as the sales page does.
+    keep_items: collect each sale in its group's items list. Streaming exports
+        turn this off and fold each sale into the group returned by add().
+    """
+
+    def __init__(self, window=LEGACY_GROUP_WINDOW, split_multiple_items=True, keep_items=True):
+        self.window = window
+        self.split_multiple_items = split_multiple_items
+        self.keep_items = keep_items
+        self._groups = []
+        # customer key -> (sorted anchor timestamps, groups in the same order)
+        self._buckets = {}
+
+    def __len__(self):
+        return len(self._groups)
+
+    def _new_group(self, sale):
+        group = {
+            'customer_name': sale.get('customer_name', ''),
+            'customer_phone': sale.get('customer_phone', ''),
+            'customer_address': sale.get('customer_address', ''),
+            'sold_by': sale.get('sold_by', ''),
+            'created_at': sale.get('created_at'),
+            'delivered_at': sale.get('delivered_at'),
+            'items': []
+        }
+        self._groups.append(group)
+        return group
+
+    def _find_group(self, anchors, groups, timestamp):
+        """Return the group whose anchor is closest to timestamp within the window"""
+        position = bisect_left(anchors, timestamp)
+        best = None
+        for index in (position - 1, position):
+            if 0 <= index < len(anchors):
+                distance = abs(anchors[index] - timestamp)
+                if distance <= self.window and (best is None or distance < best[0]):
+                    best = (distance, index)
+        return (groups[best[1]], position) if best else (None, position)
+
+    def add(self, sale):
+        """Place one sale in its group; returns the group"""
+        if self.split_multiple_items and sale.get('is_multiple_items'):
+            group = self._new_group(sale)
+            if self.keep_items:
+                group['items'].append(sale)
+            return group
+
+        anchors, groups = self._buckets.setdefault(customer_key(sale), ([], []))
+
+        if self.window is None:
+            if not groups:
+                groups.append(self._new_group(sale))
+            group = groups[0]
+        else:
+            timestamp = _timestamp(sale.get('created_at'))
+            if timestamp is None:
+                # Undated sales cannot be matched by time
+                group = self._new_group(sale)
+            else:
+                group, position = self._find_group(anchors, groups, timestamp)
+                if group is None:
+                    group = self._new_group(sale)
+                    anchors.insert(position, timestamp)
+                    groups.insert(position, group)
+
+        if self.keep_items:
+            group['items'].append(sale)
+        return group
+
+    def add_all(self, sales):
+        for sale in sales:
+            self.add(sale)
+        return self
+
+    def groups(self, sort_field='created_at'):
+        """Groups sorted by sort_field, newest first"""
+        return sorted(self._groups, key=lambda group: _sort_timestamp(group.get(sort_field)), reverse=True)
+
+
+def group_sales(sales, window=LEGACY_GROUP_WINDOW, split_multiple_items=True, sort_field='created_at'):
+    """Group an iterable of sales and return the groups newest first"""
+    grouper = SalesGrouper(window=window, split_multiple_items=split_multiple_items)
+    return grouper.add_all(sales).groups(sort_field)
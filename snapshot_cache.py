@@ -0,0 +1,97 @@
+"""
+Listener driven cache for THEO Clothing Inventory
+
+Keeps an in-memory mirror of rarely changing collections (categories, sizes,
+colors, products) up to date with Firestore on_snapshot listeners. After the
+initial snapshot only changed documents are transferred, and reads are served
+from the mirror without touching Firestore. When a listener cannot be started
+or stops, get() returns None and callers fall back to the TTL cache.
+"""
+
+import threading
+
+# Seconds to wait for a listener's initial snapshot before giving up on it
+INITIAL_SNAPSHOT_TIMEOUT = 30
+
+
+class CollectionMirror:
+    """In-memory copy of one collection, maintained from snapshot changes"""
+
+    def __init__(self, collection_id):
+        self.collection_id = collection_id
+        self.watch = None
+        self.failed = False
+        self.ready = threading.Event()
+        self._documents = {}
+        self._list = None
+        self._lock = threading.Lock()
+
+    def on_snapshot(self, docs, changes, read_time):
+        """Apply document-level deltas; called on the listener's thread"""
+        try:
+            with self._lock:
+                for change in changes:
+                    document = change.document
+                    if change.type.name == 'REMOVED':
+                        self._documents.pop(document.id, None)
+                    else:
+                        self._documents[document.id] = document.to_dict()
+                # Rebuilt lazily on the next read
+                self._list = None
+            self.ready.set()
+        except Exception as e:
+            print(f"Error applying snapshot for {self.collection_id}: {e}")
+            self.failed = True
+
+    @property
+    def is_active(self):
+        return (self.ready.is_set() and not self.failed
+                and self.watch is not None and self.watch.is_active)
+
+    def documents(self):
+        """Documents as the list of dicts fetch functions return"""
+        with self._lock:
+            if self._list is None:
+                self._list = [{**data, 'id': doc_id} for doc_id, data in self._documents.items()]
+            return self._list
+
+
+class SnapshotCache:
+    """Set of collection mirrors, started once per worker"""
+
+    def __init__(self):
+        self.mirrors = {}
+
+    def start(self, db, collection_ids, timeout=INITIAL_SNAPSHOT_TIMEOUT):
+        """Subscribe to each collection; failures leave that collection on the TTL cache"""
+        for collection_id in collection_ids:
+            mirror = CollectionMirror(collection_id)
+            try:
+                mirror.watch = db.collection(collection_id).on_snapshot(mirror.on_snapshot)
+            except Exception as e:
+                print(f"Could not start listener for {collection_id}: {e}")
+                continue
+            self.mirrors[collection_id] = mirror
+
+        for collection_id, mirror in self.mirrors.items():
+            if not mirror.ready.wait(timeout):
+                print(f"Listener for {collection_id} produced no snapshot within {timeout}s")
+        active = [collection_id for collection_id, mirror in self.mirrors.items() if mirror.is_active]
+        print(f"Listener cache active for: {', '.join(active) or 'none'}")
+        return active
+
+    def get(self, collection_id):
+        """Mirrored documents, or None when the listener is not usable"""
+        mirror = self.mirrors.get(collection_id)
+        if mirror is None or not mirror.is_active:
+            return None
+        return mirror.documents()
+
+    def stop(self):
+        for mirror in self.mirrors.values():
+            if mirror.watch is not None:
+                try:
+                    mirror.watch.unsubscribe()
+                except Exception as e:
+                    print(f"Error stopping listener for {mirror.collection_id}: {e}")
+        self.mirrors = {}
@@ -0,0 +1,108 @@
+"""
+Startup helpers for THEO Clothing Inventory
+
+once_per_deployment() lets the first gunicorn worker of a deployment run the
+one-off startup checks (default admin, summary documents) while the other
+workers skip them. A deployment is identified by DEPLOYMENT_ID, or the commit
+or deployment id that Render and Railway set. Without one, every process runs
+the checks.
+
+profile_startup() reports how long importing the app and create_app() take,
+and which modules the import time goes to:
+
+    python app.py --profile-startup
+"""
+
+import hashlib
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from contextlib import contextmanager
+
+DEPLOYMENT_ENV_VARS = ['DEPLOYMENT_ID', 'RENDER_GIT_COMMIT', 'RAILWAY_DEPLOYMENT_ID']
+PROFILE_TOP = 25
+
+IMPORT_TIME_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def deployment_id():
+    for name in DEPLOYMENT_ENV_VARS:
+        if os.environ.get(name):
+            return os.environ[name]
+    return None
+
+
+@contextmanager
+def once_per_deployment(task):
+    """Yield True in the one process that should run task for this deployment
+
+    The claim is a marker file shared by the workers on the host. If the task
+    raises, the marker is removed so the next worker to start tries again.
+    """
+    deployment = deployment_id()
+    if deployment is None:
+        yield True
+        return
+    name = hashlib.sha1(f'{task}:{deployment}'.encode('utf-8')).hexdigest()[:16]
+    marker = os.path.join(tempfile.gettempdir(), f'theo-inventory-{name}')
+    try:
+        os.close(os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        yield False
+        return
+    try:
+        yield True
+    except BaseException:
+        os.remove(marker)
+        raise
+
+
+def parse_import_times(output):
+    """[(self_us, cumulative_us, depth, module)] from python -X importtime output"""
+    times = []
+    for line in output.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            times.append((int(self_us), int(cumulative_us), len(indent) // 2, module))
+    return times
+
+
+def profile_startup(top=PROFILE_TOP):
+    """Import the app and run create_app() in a fresh interpreter and print where the time goes"""
+    script = (
+        'import time\n'
+        'start = time.perf_counter()\n'
+        'import app\n'
+        'imported = time.perf_counter()\n'
+        'app.create_app()\n'
+        'print("PROFILE", imported - start, time.perf_counter() - imported)\n'
+    )
+    root = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', script],
+                            cwd=root, capture_output=True, text=True)
+    timings = [line.split() for line in result.stdout.splitlines() if line.startswith('PROFILE ')]
+    if result.returncode != 0 or not timings:
+        print(result.stdout + result.stderr)
+        print("Startup profile failed")
+        return 1
+    import_seconds, create_seconds = float(timings[-1][1]), float(timings[-1][2])
+    times = parse_import_times(result.stderr)
+
+    print(f"import app:    {import_seconds * 1000:8.1f} ms")
+    print(f"create_app():  {create_seconds * 1000:8.1f} ms")
+    print(f"total:         {(import_seconds + create_seconds) * 1000:8.1f} ms")
+
+    print("\nModules imported by app and create_app(), by cumulative time (ms):")
+    # Depth 0 is app itself and anything create_app() imports; depth 1 is what app imports
+    direct = [entry for entry in times if entry[2] <= 1 and entry[3] != 'app']
+    top_level = sorted(direct, key=lambda entry: -entry[1])
+    for self_us, cumulative_us, _, module in top_level[:top]:
+        print(f"  {cumulative_us / 1000:8.1f}  {module}")
+
+    print("\nModules by own import time (ms):")
+    for self_us, cumulative_us, _, module in sorted(times, key=lambda entry: -entry[0])[:top]:
+        print(f"  {self_us / 1000:8.1f}  {module}")
+    return 0
@@ -488,3 +488,20 @@ window.openBarcodeScanner = function(onScan) {
 window.scanBarcode = function(onScan) {
     window.barcodeScanner.showScanner(onScan);
 };
+
+// Look up many scanned barcodes in one request (e.g. a whole box)
+// Resolves to {products: {barcode: product}, missing: [barcode, ...]}
+window.lookupBarcodes = function(barcodes) {
+    return fetch('/lookup_products_by_barcode', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({barcodes: barcodes})
+    })
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) {
+                throw new Error(data.message || 'Barcode lookup failed');
+            }
+            return data;
+        });
+};
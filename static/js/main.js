@@ -264,6 +264,32 @@ function showAlert(message, type = 'info', duration = 5000) {
     }
 }
 
+// Poll a background job until it finishes; onUpdate receives each status
+function pollJob(jobId, onUpdate, interval = 1500) {
+    return new Promise((resolve, reject) => {
+        function check() {
+            fetch(`/jobs/${jobId}`)
+                .then(response => response.json())
+                .then(job => {
+                    if (!job.success) {
+                        reject(new Error(job.message));
+                        return;
+                    }
+                    if (onUpdate) {
+                        onUpdate(job);
+                    }
+                    if (job.status === 'completed' || job.status === 'failed') {
+                        resolve(job);
+                    } else {
+                        setTimeout(check, interval);
+                    }
+                })
+                .catch(reject);
+        }
+        check();
+    });
+}
+
 // Validate email format
 function isValidEmail(email) {
     const emailRegex = /^[^\s@]+@[^\s@]+\.[^\s@]+$/;
@@ -396,6 +422,7 @@ if ('serviceWorker' in navigator) {
 // Export functions for global use
 window.InventoryApp = {
     showAlert,
+    pollJob,
     formatCurrency,
     formatDate,
     generateBarcode,
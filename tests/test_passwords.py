@@ -0,0 +1,25 @@
+from werkzeug.security import generate_password_hash
+
+from passwords import PasswordHasher
+
+
+def test_shorthand_method_hash_is_current():
+    hasher = PasswordHasher('scrypt', max_workers=1)
+    password_hash = hasher.hash('secret')
+    assert password_hash.startswith('scrypt:32768:8:1$')
+    assert not hasher.needs_rehash(password_hash)
+    assert hasher.verify({'password_hash': password_hash}, 'secret') == (True, None)
+
+
+def test_shorthand_pbkdf2_matches_expanded_hash():
+    hasher = PasswordHasher('pbkdf2', max_workers=1)
+    assert not hasher.needs_rehash(generate_password_hash('secret', method='pbkdf2:sha256'))
+    assert hasher.needs_rehash(generate_password_hash('secret', method='pbkdf2:sha256:1000'))
+
+
+def test_other_method_or_cost_needs_rehash():
+    hasher = PasswordHasher('pbkdf2:sha256:1000', max_workers=1)
+    assert not hasher.needs_rehash(generate_password_hash('secret', method='pbkdf2:sha256:1000'))
+    assert hasher.needs_rehash(generate_password_hash('secret', method='pbkdf2:sha256:2000'))
+    assert hasher.needs_rehash(generate_password_hash('secret', method='scrypt'))
+    assert hasher.needs_rehash(None)
@@ -0,0 +1,90 @@
+"""
+Cached user principals for THEO Clothing Inventory
+
+Authorization checks need a user's role, permissions and active flag. Reading
+the users document on every request costs a Firestore round trip per page, so
+each worker keeps the principals it has loaded for up to PRINCIPAL_TTL seconds.
+
+Changes are picked up through a version counter in the shared cache backend
+(see cache_backend.py): update_user, delete_user and
+corporate_users.update_user_role bump it, and every worker reloads its
+principals on the next request. With the per-process 'local' backend a change
+made from another process shows up once the TTL runs out.
+"""
+
+import threading
+import time
+
+VERSION_KEY = 'user_principals'
+PRINCIPAL_TTL = 15  # seconds
+
+
+def principal_from(user_id, user_data):
+    """What authorization needs from a users document, or None without one"""
+    if user_data is None:
+        return None
+    return {
+        'id': user_id,
+        'username': user_data.get('username', ''),
+        'role': user_data.get('role'),
+        'permissions': list(user_data.get('permissions', [])),
+        'active': user_data.get('active', True)
+    }
+
+
+class PrincipalCache:
+    """Per-worker user principals validated against a shared version counter"""
+
+    def __init__(self, db, backend, ttl=PRINCIPAL_TTL):
+        self.db = db
+        self.backend = backend
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = {}  # user id -> (principal, version, loaded_at)
+
+    def _version(self):
+        try:
+            return self.backend.version(VERSION_KEY)
+        except Exception as e:
+            print(f"Cache backend unavailable ({e}); user principals rely on their TTL")
+            return None
+
+    def get(self, user_id):
+        """The user's principal, or None if the user no longer exists"""
+        version = self._version()
+        with self.lock:
+            cached = self.entries.get(user_id)
+        if cached is not None:
+            principal, cached_version, loaded_at = cached
+            if (version is None or cached_version == version) and time.time() - loaded_at <= self.ttl:
+                return principal
+
+        try:
+            user_doc = self.db.collection('users').document(user_id).get()
+        except Exception as e:
+            if cached is None:
+                raise
+            # Keep the last known principal while Firestore is unreachable
+            print(f"Error loading user {user_id}: {e}")
+            return cached[0]
+        principal = principal_from(user_id, user_doc.to_dict() if user_doc.exists else None)
+        with self.lock:
+            self.entries[user_id] = (principal, version, time.time())
+        return principal
+
+    def invalidate(self, user_id=None):
+        """Drop cached principals in this worker and bump the shared version for the others"""
+        with self.lock:
+            if user_id is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(user_id, None)
+        bump_version(self.backend)
+
+
+def bump_version(backend):
+    """Make every worker reload its principals on their next request"""
+    try:
+        backend.invalidate(VERSION_KEY)
+    except Exception as e:
+        print(f"Error invalidating user principals: {e}")